@@ -1,3 +1,5 @@
+import logging
+
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
 from flask_login import LoginManager
@@ -26,6 +28,13 @@ def create_app(config_class=Config):
     login_manager.login_message_category = 'info'
     login_manager.session_protection = 'strong'
 
+    # Pipeline diagnostics and other app.* loggers write to LOG_FILE
+    if not app.testing and app.config.get('LOG_FILE'):
+        handler = logging.FileHandler(app.config['LOG_FILE'])
+        handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s'))
+        app.logger.addHandler(handler)
+        app.logger.setLevel(logging.INFO)
+
     from app.routes import bp as main_bp
     app.register_blueprint(main_bp)
 
@@ -77,6 +77,20 @@ def create_charts(results: dict):
     except Exception as e:
         print(f"Error creating client_volume chart: {e}")
 
+    # 4. A/B Book results per period, one chart per granularity
+    try:
+        rollups = results.get("Rollups", pd.DataFrame())
+        if not rollups.empty:
+            totals = rollups[rollups['Source'].isin(["Total A Book", "Total B Book"])]
+            for granularity, rows in totals.groupby('Granularity', sort=False):
+                fig_periods = px.line(
+                    rows, x='Period', y='Value', color='Source', markers=True,
+                    title=f"{granularity.title()} A/B Book Results",
+                    labels={'Value': 'Result (USD)', 'Period': 'Period', 'Source': ''}
+                )
+                charts[f'{granularity}_results'] = fig_periods.to_html(full_html=False, include_plotlyjs='cdn')
+    except Exception as e:
+        print(f"Error creating rollup charts: {e}")
 
     return charts
 
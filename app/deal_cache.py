@@ -0,0 +1,100 @@
+"""
+Columnar cache of uploaded deal files.
+
+A deals upload is loaded once with the compact profile from app.deal_loading and
+written as Parquet under a name derived from the file's SHA-256, so report runs
+read typed columns instead of re-parsing the CSV or XLSX. Entries are evicted
+least-recently-used first once the folder exceeds its size cap. Any cache problem
+falls back to loading the original file.
+"""
+import hashlib
+import logging
+import os
+from functools import lru_cache
+
+import pandas as pd
+
+from app.deal_loading import load_deals
+from app.file_utils import atomic_write, touch
+
+logger = logging.getLogger(__name__)
+
+# Bump when the load profile changes so stale entries are never read
+CACHE_VERSION = 2
+CACHE_SUFFIX = ".parquet"
+
+def file_digest(path: str, block_size: int = 2**20) -> str:
+    """SHA-256 hex digest of a file's content."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as fh:
+        for block in iter(lambda: fh.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+@lru_cache(maxsize=256)
+def _memo_digest(path: str, size: int, mtime_ns: int) -> str:
+    return file_digest(path)
+
+def upload_digest(path: str) -> str:
+    """file_digest, remembered per process while the file's size and mtime are unchanged."""
+    stat = os.stat(path)
+    return _memo_digest(path, stat.st_size, stat.st_mtime_ns)
+
+def cache_entry(cache_dir: str, digest: str) -> str:
+    return os.path.join(cache_dir, f"deals-v{CACHE_VERSION}-{digest}{CACHE_SUFFIX}")
+
+def cache_entries(cache_dir: str, suffix: str = CACHE_SUFFIX) -> list:
+    """(mtime, size, name) of each entry in `cache_dir`."""
+    entries = []
+    for name in os.listdir(cache_dir):
+        if name.endswith(suffix):
+            try:
+                stat = os.stat(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+    return entries
+
+def evict(cache_dir: str, max_bytes: int, suffix: str = CACHE_SUFFIX) -> int:
+    """Delete least recently used entries until the cache fits in `max_bytes`; returns bytes freed."""
+    entries = cache_entries(cache_dir, suffix)
+    total, freed = sum(size for _, size, _ in entries), 0
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(cache_dir, name))
+        except FileNotFoundError:
+            pass
+        total, freed = total - size, freed + size
+    return freed
+
+def cached_deals(file_path: str, excel: bool, cache_dir: str, max_mb: int) -> tuple[pd.DataFrame, dict, bool]:
+    """
+    Load a deals upload through the cache.
+
+    Returns (deals, load stats, cache hit). Stats travel with the entry, so hits
+    report the same memory savings as the first load.
+    """
+    path = None
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        path = cache_entry(cache_dir, upload_digest(file_path))
+        if os.path.exists(path):
+            df = pd.read_parquet(path)
+            touch(path)
+            return df, df.attrs.pop("load_stats", {}), True
+    except Exception as e:  # unreadable entry, missing pyarrow, ...; rebuilt below
+        logger.warning("deal cache read failed for %s: %s", file_path, e)
+
+    df, stats = load_deals(file_path, excel=excel)
+    if path:
+        try:
+            entry = df.copy(deep=False)
+            entry.attrs = {**df.attrs, "load_stats": stats}
+            with atomic_write(path) as fh:
+                entry.to_parquet(fh, index=False)
+            evict(cache_dir, max_mb * 2**20)
+        except Exception as e:
+            logger.warning("deal cache write failed for %s: %s", file_path, e)
+    return df, stats, False
@@ -0,0 +1,178 @@
+"""
+Precomputed deal cube.
+
+A deals upload is collapsed once, on its first slice query, into one row per (Day,
+Book, Login, Symbol, Chinese) with the six BOOK_AGGREGATES sums. The cube is far smaller
+than the deals, so questions like "B Book volume on EURUSD last week" or "top
+symbols for Chinese clients" are a few masks and one groupby over it (slice_cube)
+instead of a pipeline run. Deals are deduplicated per book as in enrich_and_dedupe;
+amounts are before the exclusion rules, like the partial aggregates.
+"""
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+from app.processing import (
+    BOOK_AGGREGATES, BOOK_NAMES, DAY_NS, DEAL_TIME_COL, MONEY_SCALE, _amounts, _sanitize_book,
+    as_login_array, chinese_deals, classify_deals, convert_money_columns, detect_money_columns,
+    is_fixed, isin_logins, login_keys, normalize_logins, parse_deal_times, period_labels, window_days
+)
+from app.streaming import DealIdSet, deal_keys
+
+CUBE_DIMENSIONS = ["Day", "Book", "Login", "Symbol", "Chinese"]
+CUBE_COLUMNS = [*CUBE_DIMENSIONS, *BOOK_AGGREGATES]
+# Roll-up levels of the Day dimension and their period_labels granularity
+DAY_LEVELS = {"Day": "daily", "Week": "weekly", "Month": "monthly"}
+NAT = np.iinfo(np.int64).min
+
+def _symbols(book: pd.DataFrame) -> pd.Categorical:
+    """Stripped Symbol of each deal ('' when missing), stripping each distinct value once."""
+    if "Symbol" not in book.columns:
+        return pd.Categorical.from_codes(np.zeros(len(book), dtype=np.int8), [""])
+    codes, uniques = pd.factorize(book["Symbol"], use_na_sentinel=False)
+    labels = pd.Series(uniques, dtype=object).map(lambda v: "" if pd.isna(v) else str(v).strip())
+    label_codes, categories = pd.factorize(labels)
+    return pd.Categorical.from_codes(label_codes[codes], categories)
+
+def _cube_rows(book: pd.DataFrame, code: int, rules=None, fixed_point: bool = False,
+               datetime_col="Date & Time (UTC)", chinese: np.ndarray = None) -> pd.DataFrame:
+    """Per-deal cube rows of the sanitized, deduplicated deals of book BOOK_NAMES[code].
+
+    `chinese` is their Chinese segment mask when already known; otherwise it comes from `rules`.
+    """
+    if DEAL_TIME_COL in book.columns:
+        stamps = book[DEAL_TIME_COL].array.asi8
+    elif datetime_col in book.columns:
+        stamps = parse_deal_times(book[datetime_col]).array.asi8
+    else:
+        stamps = np.full(len(book), NAT)
+    # Deals without a deal time stay in the cube with no Day, so totals match the report
+    days = np.where(stamps == NAT, NAT, stamps // DAY_NS * DAY_NS).view("datetime64[ns]").astype("datetime64[s]")
+    keys, valid = login_keys(book["Login"])
+    if chinese is None:
+        chinese = chinese_deals(book, rules)
+    return pd.DataFrame({
+        "Day": days[valid],
+        "Book": pd.Categorical.from_codes(np.full(int(valid.sum()), code), BOOK_NAMES),
+        "Login": keys[valid],
+        "Symbol": _symbols(book)[valid],
+        "Chinese": chinese[valid],
+        **{out: _amounts(book, col, fixed_point)[valid] for out, col in BOOK_AGGREGATES.items()},
+    })
+
+def merge_cubes(frames: list) -> pd.DataFrame:
+    """Fold per-deal rows and earlier cubes into one row per dimension tuple."""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        return pd.DataFrame(columns=CUBE_COLUMNS)
+    # Symbol categories differ between books and chunks; union them so the column stays categorical
+    symbols = union_categoricals([f["Symbol"] for f in frames])
+    d = pd.concat([f.drop(columns="Symbol") for f in frames], ignore_index=True).assign(Symbol=symbols)
+    return d.groupby(CUBE_DIMENSIONS, sort=False, observed=True, dropna=False)[list(BOOK_AGGREGATES)].sum() \
+        .reset_index()[CUBE_COLUMNS]
+
+def build_deal_cube(enriched_books: dict, rules=None, fixed_point: bool = False) -> pd.DataFrame:
+    """The cube of sanitized, deduplicated books (the enriched books of build_report_partials).
+
+    With `fixed_point` the sums are int64 ten-thousandths (see processing.to_fixed).
+    """
+    return merge_cubes([
+        _cube_rows(df, BOOK_NAMES.index(name), rules, fixed_point)
+        for name, df in enriched_books.items() if not df.empty
+    ])
+
+def stream_deal_cube(source, chunk_rows: int, money_columns: list[str] = None, rules=None,
+                     fixed_point: bool = False, datetime_col="Date & Time (UTC)", **read_csv_kwargs) -> pd.DataFrame:
+    """build_deal_cube for a deals CSV read `chunk_rows` rows at a time, deduplicating deals across chunks."""
+    seen = {name: DealIdSet() for name in BOOK_NAMES}
+    cube, pending = [], []
+    with pd.read_csv(source, chunksize=chunk_rows, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            if money_columns is None:
+                money_columns = detect_money_columns(chunk)
+            chunk = convert_money_columns(normalize_logins(chunk)[0], money_columns)
+            if "Processing rule" not in chunk:
+                raise ValueError("Missing 'Processing rule' column in the deals CSV.")
+            book_codes, chinese = classify_deals(chunk, rules)
+            for code, name in enumerate(BOOK_NAMES):
+                positions = np.flatnonzero(book_codes == code)
+                if positions.size == 0:
+                    continue
+                fresh = seen[name].add(deal_keys(chunk.iloc[positions, 0]))
+                if fresh.any():
+                    pending.append(_cube_rows(_sanitize_book(chunk.take(positions[fresh])), code, rules, fixed_point,
+                                              datetime_col, chinese[positions[fresh]]))
+            # As in stream_deal_partials, fold pending rows in once they outgrow the running cube
+            if pending and sum(map(len, pending)) >= max(sum(map(len, cube)), chunk_rows):
+                cube, pending = [merge_cubes(cube + pending)], []
+    return merge_cubes(cube + pending)
+
+def _as_list(value) -> list:
+    return list(value) if isinstance(value, (list, tuple, set)) else [value]
+
+def _filter_mask(cube: pd.DataFrame, filters: dict) -> np.ndarray:
+    mask = np.ones(len(cube), dtype=bool)
+    for dimension, value in filters.items():
+        if dimension == "Day":
+            if not isinstance(value, (list, tuple)) or len(value) != 2:
+                raise ValueError("Filter 'Day' takes a [first, last] pair of dates.")
+            first, last = window_days(*value)
+            # NaT compares false, so deals without a deal time never match a day range
+            days = cube["Day"].to_numpy().astype("datetime64[D]")
+            mask &= (days >= first) & (days <= last)
+        elif dimension == "Login":
+            mask &= isin_logins(cube["Login"].to_numpy(dtype=np.int64), as_login_array(_as_list(value)))
+        elif dimension == "Chinese":
+            if not isinstance(value, bool):
+                raise ValueError("Filter 'Chinese' takes true or false.")
+            mask &= cube["Chinese"].to_numpy(dtype=bool) == value
+        elif dimension in ("Book", "Symbol"):
+            mask &= cube[dimension].isin([str(v) for v in _as_list(value)]).to_numpy()
+        else:
+            raise ValueError(f"Unknown filter '{dimension}'. Use one of: {', '.join(CUBE_DIMENSIONS)}.")
+    return mask
+
+def _group_key(rows: pd.DataFrame, level: str) -> pd.Series:
+    if level in DAY_LEVELS:
+        # Label each distinct day once; deals without a deal time (code -1) get no label
+        codes, days = pd.factorize(rows["Day"], sort=True)
+        label_codes, labels = pd.factorize(period_labels(np.asarray(days), DAY_LEVELS[level]))
+        periods = pd.Categorical.from_codes(np.where(codes < 0, -1, label_codes[codes]), labels)
+        return pd.Series(periods, index=rows.index, name=level)
+    if level not in CUBE_DIMENSIONS:
+        raise ValueError(f"Unknown group '{level}'. Use any of: {', '.join([*CUBE_DIMENSIONS[1:], *DAY_LEVELS])}.")
+    return rows[level]
+
+def slice_cube(cube: pd.DataFrame, filters: dict = None, group_by=(), order_by: str = None, limit: int = None) -> pd.DataFrame:
+    """
+    Sums of the cube rows matching `filters`, rolled up to the `group_by` levels.
+
+    `filters` maps a dimension to the value or list of values kept; 'Day' takes a
+    [first, last] pair of 'dd.mm.yyyy' dates (whole UTC days) and 'Chinese' a bool.
+    `group_by` lists dimensions, with 'Week' (starting Monday) or 'Month' in place of
+    'Day' to roll days up; no groups gives the grand total. `order_by` sorts by a
+    sum, largest first, and `limit` keeps the first rows. Amounts are USD rounded to 4 places.
+    """
+    group_by = list(group_by)
+    if order_by is not None and order_by not in BOOK_AGGREGATES:
+        raise ValueError(f"Unknown order '{order_by}'. Use one of: {', '.join(BOOK_AGGREGATES)}.")
+    if limit is not None and (isinstance(limit, bool) or not isinstance(limit, int) or limit < 0):
+        raise ValueError("Limit must be a non-negative integer.")
+    if len(set(group_by)) != len(group_by) or len(set(group_by) & set(DAY_LEVELS)) > 1:
+        raise ValueError("Group by each dimension once, and by one of Day, Week or Month.")
+
+    rows = cube[_filter_mask(cube, filters or {})] if filters else cube
+    measures = list(BOOK_AGGREGATES)
+    if group_by:
+        keys = [_group_key(rows, level) for level in group_by]
+        result = rows.groupby(keys, sort=True, observed=True, dropna=False)[measures].sum().reset_index()
+    else:
+        result = rows[measures].sum().to_frame().T.reset_index(drop=True)
+    scale = MONEY_SCALE if is_fixed(cube) else 1
+    result[measures] = (result[measures].to_numpy(dtype=float) / scale).round(4)
+
+    if order_by is not None:
+        result = result.sort_values(order_by, ascending=False, kind="stable")
+    if limit is not None:
+        result = result.head(limit)
+    return result.reset_index(drop=True)
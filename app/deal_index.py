@@ -0,0 +1,66 @@
+"""
+Persistent deal-id indexes for the deal store.
+
+Each user's book has a sorted, unique int64 array of the deal keys it has stored
+(see streaming.deal_keys), saved as a .npy file and memory-mapped when read. An
+upload is checked against millions of stored deals with one vectorized
+searchsorted that only touches the pages it needs, instead of a database scan.
+The stored_deals table stays the source of truth: deal_store rebuilds an index
+whose length no longer matches the stored count (a crash between commit and
+index write, a concurrent upload, a lost file).
+"""
+import os
+
+import numpy as np
+
+from app.file_utils import atomic_write
+
+INDEX_SUFFIX = ".npy"
+
+def sorted_unique(keys) -> np.ndarray:
+    """Sorted distinct int64 keys (a sort and one comparison pass, cheaper than np.unique on large arrays)."""
+    keys = np.sort(np.asarray(keys, dtype=np.int64))
+    return keys[np.concatenate([[True], keys[1:] != keys[:-1]])] if keys.size else keys
+
+def deal_index_path(index_dir: str, user_id: int, book: str) -> str:
+    return os.path.join(index_dir, f"deal-ids-u{user_id}-{book.lower().replace(' ', '-')}{INDEX_SUFFIX}")
+
+class DealIdIndex:
+    """Sorted int64 deal keys in a memory-mapped .npy file; a missing file is an empty index."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def keys(self) -> np.ndarray:
+        if not os.path.exists(self.path):
+            return np.empty(0, dtype=np.int64)
+        return np.load(self.path, mmap_mode="r")
+
+    def __len__(self):
+        return len(self.keys())
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Mask of the `keys` already in the index."""
+        keys = np.asarray(keys, dtype=np.int64)
+        stored = self.keys()
+        if stored.size == 0:
+            return np.zeros(len(keys), dtype=bool)
+        pos = np.minimum(np.searchsorted(stored, keys), len(stored) - 1)
+        return stored[pos] == keys
+
+    def add(self, keys: np.ndarray):
+        """Merge new `keys` into the index (one linear pass over the stored keys)."""
+        keys = sorted_unique(keys)
+        stored = self.keys()
+        keys = keys[~self.contains(keys)] if stored.size else keys
+        if keys.size:
+            self._write(np.insert(stored, np.searchsorted(stored, keys), keys))
+
+    def rebuild(self, keys: np.ndarray):
+        """Replace the index with `keys`."""
+        self._write(sorted_unique(keys))
+
+    def _write(self, keys: np.ndarray):
+        # Readers never map a partial index
+        with atomic_write(self.path) as fh:
+            np.save(fh, keys)
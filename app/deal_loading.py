@@ -0,0 +1,86 @@
+"""
+Compact loading profile for MT5 deal exports.
+
+Only the columns the report reads are loaded: the first POSITIONAL_COLUMNS (which
+enrich_and_dedupe reads by position) plus the named report columns. Repetitive
+text columns become categoricals, ids int64, and monetary text is parsed into
+float64 USD at load time, so the pipeline never sees the raw strings.
+"""
+import logging
+
+import pandas as pd
+
+from app.processing import BOOK_AGGREGATES, convert_money_columns, detect_money_columns, login_keys
+
+logger = logging.getLogger(__name__)
+
+# enrich_and_dedupe reads the deal id, profit and deal time as columns 0, 6 and 7
+POSITIONAL_COLUMNS = 8
+REPORT_COLUMNS = ["Login", "Processing rule", "Group", "Symbol", "Date & Time (UTC)", *BOOK_AGGREGATES.values()]
+CATEGORY_COLUMNS = ["Symbol", "Group", "Processing rule"]
+ID_COLUMNS = ["Deal", "Login"]
+# Text columns that rarely repeat and gain nothing from a categorical; other text
+# columns become categoricals when at most half of the sampled values are distinct
+TEXT_COLUMNS = ["Date & Time (UTC)"]
+SAMPLE_ROWS = 1000
+
+def report_columns(header) -> list:
+    """The columns of `header` the deal report reads, in file order."""
+    header = list(header)
+    wanted = set(header[:POSITIONAL_COLUMNS]) | set(REPORT_COLUMNS)
+    return [c for c in header if c in wanted]
+
+def csv_report_columns(path) -> list:
+    """report_columns of a deals CSV, read from its header row only."""
+    return report_columns(pd.read_csv(path, nrows=0).columns)
+
+def _read(source, excel: bool, **kwargs) -> pd.DataFrame:
+    if hasattr(source, "seek"):
+        source.seek(0)
+    return pd.read_excel(source, **kwargs) if excel else pd.read_csv(source, **kwargs)
+
+def _frame_mb(df: pd.DataFrame) -> float:
+    return df.memory_usage(deep=True).sum() / 2**20
+
+def load_deals(source, excel: bool = False) -> tuple[pd.DataFrame, dict]:
+    """
+    Load a deals export with the compact profile.
+
+    Returns the frame and load stats; 'Default MB' is the footprint of a plain
+    pd.read_csv of every column, estimated from a sample of SAMPLE_ROWS rows.
+    """
+    sample = _read(source, excel, nrows=SAMPLE_ROWS)
+    columns = report_columns(sample.columns)
+    money_columns = detect_money_columns(sample[columns])
+
+    dtypes = {}
+    for col in columns:
+        if col in money_columns or col in CATEGORY_COLUMNS:
+            # Exports repeat amounts and labels heavily; money is parsed per category below
+            dtypes[col] = "category"
+        elif col not in ID_COLUMNS + TEXT_COLUMNS and not pd.api.types.is_numeric_dtype(sample[col]) \
+                and sample[col].nunique() * 2 <= len(sample):
+            dtypes[col] = "category"
+    df = convert_money_columns(_read(source, excel, usecols=columns, dtype=dtypes), money_columns)
+
+    # Ids become int64 when every value is an integer; otherwise normalize_logins reports the bad ones
+    for col in ID_COLUMNS:
+        if col in df.columns and not pd.api.types.is_integer_dtype(df[col]):
+            keys, valid = login_keys(df[col])
+            if valid.all():
+                df[col] = keys
+
+    default_mb = float(_frame_mb(sample) / max(len(sample), 1) * len(df))
+    compact_mb = float(_frame_mb(df))
+    stats = {
+        "Rows": len(df),
+        "Columns Loaded": len(columns),
+        "Columns Skipped": len(sample.columns) - len(columns),
+        "Default MB": round(default_mb, 2),
+        "Compact MB": round(compact_mb, 2),
+        "Saved MB": round(default_mb - compact_mb, 2),
+        "Ratio": round(default_mb / compact_mb, 2) if compact_mb else None,
+    }
+    logger.info("deals load rows=%s default_mb=%.2f compact_mb=%.2f ratio=%s",
+                stats["Rows"], default_mb, compact_mb, stats["Ratio"])
+    return df, stats
@@ -0,0 +1,285 @@
+"""
+Persistent deal store.
+
+Deals uploads are appended to the stored_deals table, keyed per user by book and
+Deal id, so re-uploading an overlapping export only inserts the deals not seen
+before (the first stored copy of a deal wins, as in enrich_and_dedupe). Each
+append also folds the new deals into per-(day, book, login, Chinese) rows of
+deal_daily_aggregates, and reports read their partial aggregates from those rows
+instead of re-parsing the last upload. Amounts are stored as integer ten-thousandths
+of a USD (processing.MONEY_SCALE), so the sums do not depend on upload order and
+reports read them back as fixed-point or float partials. With an index folder, stored deal ids are
+looked up in memory-mapped per-book indexes (app.deal_index) instead of the table.
+
+A deal's book and Chinese flag are fixed when it is stored, together with the version
+of the deal rules that set them; check_stored_rules refuses to mix in or report under
+other rules, since the stored deals cannot be reclassified.
+"""
+import logging
+
+import numpy as np
+import pandas as pd
+
+from app import db
+from app.deal_index import DealIdIndex, deal_index_path
+from app.models import DealDailyAggregate, StoredDeal
+from app.processing import (
+    BOOK_NAMES, DAILY_KEYS, MONEY_SCALE, PARTIAL_COLUMNS, classify_deals, convert_money_columns, deal_rules,
+    detect_money_columns, normalize_logins
+)
+from app.streaming import deal_keys, deal_partial_rows, rank_partials
+
+logger = logging.getLogger(__name__)
+
+# Report aggregate -> column of StoredDeal and DealDailyAggregate
+STORE_COLUMNS = {
+    "Total Volume": "total_volume",
+    "Trader Profit": "trader_profit",
+    "Swaps": "swaps",
+    "Commission": "commission",
+    "TP Profit": "tp_profit",
+    "Broker Profit": "broker_profit",
+}
+AGGREGATE_KEYS = ["day", "book", "login", "chinese"]
+
+def deal_rows(deals_df: pd.DataFrame, money_columns: list[str] = None, rules=None,
+              datetime_col="Date & Time (UTC)") -> tuple[pd.DataFrame, int]:
+    """
+    One store row per distinct deal of each book in `deals_df` (first occurrence wins),
+    with sanitized amounts in ten-thousandths. Returns (rows, malformed logins).
+    """
+    rules = rules or deal_rules()
+    deals_df, malformed_logins = normalize_logins(deals_df)
+    deals_df = convert_money_columns(deals_df, money_columns)
+    if "Processing rule" not in deals_df:
+        raise ValueError("Missing 'Processing rule' column in the deals CSV.")
+    codes, chinese = classify_deals(deals_df, rules)
+
+    frames = []
+    for code in range(len(BOOK_NAMES)):
+        positions = np.flatnonzero(codes == code)
+        if positions.size == 0:
+            continue
+        book = deals_df.take(positions)
+        keys = deal_keys(book.iloc[:, 0])
+        first = np.sort(np.unique(keys, return_index=True)[1])
+        # The deal key rides along as the index, which deal_partial_rows returns as 'First Row'
+        rows = deal_partial_rows(book.take(first).set_axis(keys[first]), code, None, rules, datetime_col,
+                                 fixed_point=True, chinese=chinese[positions[first]])
+        frames.append(pd.DataFrame({
+            "book": BOOK_NAMES[code],
+            "deal_key": rows["First Row"].to_numpy(),
+            "login": rows["Login"].to_numpy(),
+            "chinese": rows["Chinese"].to_numpy(),
+            "rules_version": rules.version,
+            "deal_time": rows["First Time"].to_numpy().view("datetime64[ns]"),
+            **{col: rows[name].to_numpy() for name, col in STORE_COLUMNS.items()},
+        }))
+    if not frames:
+        columns = ["book", "deal_key", "login", "chinese", "rules_version", "deal_time", *STORE_COLUMNS.values()]
+        return pd.DataFrame(columns=columns), malformed_logins
+    return pd.concat(frames, ignore_index=True), malformed_logins
+
+def _stored_keys(user_id: int, book: str, keys: np.ndarray) -> np.ndarray:
+    """Stored deal keys of `book` within the range of `keys` (one indexed range scan)."""
+    rows = db.session.execute(
+        db.select(StoredDeal.deal_key).where(
+            StoredDeal.user_id == user_id, StoredDeal.book == book,
+            StoredDeal.deal_key.between(int(keys.min()), int(keys.max()))
+        )
+    ).scalars().all()
+    return np.asarray(rows, dtype=np.int64)
+
+def _deal_indexes(user_id: int, index_dir: str) -> dict:
+    """The user's per-book DealIdIndex, rebuilt from stored_deals where its size disagrees with the table."""
+    counts = dict(db.session.execute(
+        db.select(StoredDeal.book, db.func.count()).where(StoredDeal.user_id == user_id).group_by(StoredDeal.book)
+    ).all())
+    indexes = {}
+    for book in BOOK_NAMES:
+        index = DealIdIndex(deal_index_path(index_dir, user_id, book))
+        if len(index) != counts.get(book, 0):
+            logger.info("deal index rebuild user=%s book=%s", user_id, book)
+            index.rebuild(db.session.execute(
+                db.select(StoredDeal.deal_key).where(StoredDeal.user_id == user_id, StoredDeal.book == book)
+            ).scalars().all())
+        indexes[book] = index
+    return indexes
+
+def _records(frame: pd.DataFrame) -> list[dict]:
+    """DataFrame rows as dicts of Python values, with None for missing ones."""
+    return frame.astype(object).where(frame.notna(), None).to_dict("records")
+
+def _stored_amounts(daily: pd.DataFrame, fixed_point: bool) -> dict:
+    """The stored ten-thousandths of `daily` as partial-aggregate columns: int64 with `fixed_point`, else USD."""
+    amounts = {name: daily[col].to_numpy(dtype=np.int64) for name, col in STORE_COLUMNS.items()}
+    return amounts if fixed_point else {name: values / MONEY_SCALE for name, values in amounts.items()}
+
+def _update_daily(user_id: int, new: pd.DataFrame):
+    """Add the sums of newly stored deals to their (day, book, login, Chinese) rows."""
+    new = new.assign(day=new["deal_time"].dt.normalize())
+    daily = new.groupby(AGGREGATE_KEYS, dropna=False, sort=False).agg(
+        deals=("deal_key", "size"), first_deal_time=("deal_time", "min"),
+        **{col: (col, "sum") for col in STORE_COLUMNS.values()}
+    ).reset_index()
+
+    days = daily["day"].dropna().dt.date.unique().tolist()
+    day_filter = DealDailyAggregate.day.in_(days)
+    if daily["day"].isna().any():
+        day_filter = day_filter | DealDailyAggregate.day.is_(None)
+    columns = ["id", *AGGREGATE_KEYS, "deals", "first_deal_time", *STORE_COLUMNS.values()]
+    existing = pd.DataFrame(db.session.execute(
+        db.select(*(getattr(DealDailyAggregate, c) for c in columns)).where(
+            DealDailyAggregate.user_id == user_id, day_filter
+        )
+    ).all(), columns=columns)
+    # Nullable integers keep the stored sums exact through the left merge below
+    existing = existing.astype({"login": np.int64, "chinese": bool, **dict.fromkeys(STORE_COLUMNS.values(), "Int64")}).assign(
+        day=pd.to_datetime(existing["day"]).astype("datetime64[ns]"),
+        first_deal_time=pd.to_datetime(existing["first_deal_time"]).astype("datetime64[ns]"),
+    )
+
+    merged = daily.merge(existing, on=AGGREGATE_KEYS, how="left", suffixes=("", "_stored"))
+    found = merged["id"].notna().to_numpy()
+    if found.any():
+        stored = merged[found]
+        updates = pd.DataFrame({
+            "id": stored["id"].astype(np.int64),
+            "deals": (stored["deals"] + stored["deals_stored"]).astype(np.int64),
+            "first_deal_time": stored[["first_deal_time", "first_deal_time_stored"]].min(axis=1),
+            **{col: (stored[col] + stored[f"{col}_stored"]).astype(np.int64) for col in STORE_COLUMNS.values()},
+        })
+        db.session.execute(db.update(DealDailyAggregate), _records(updates))
+    inserts = daily[~found].assign(user_id=user_id, day=daily.loc[~found, "day"].dt.date)
+    if not inserts.empty:
+        db.session.execute(db.insert(DealDailyAggregate), _records(inserts))
+
+def ingest_deals(user_id: int, deals_df: pd.DataFrame, money_columns: list[str] = None, rules=None,
+                 datetime_col="Date & Time (UTC)", index_dir: str = None) -> dict:
+    """
+    Append the deals of `deals_df` that `user_id` has not stored yet and update the
+    daily aggregates, in one transaction. Returns counts for the upload summary.
+
+    With `index_dir`, stored deals are found through the user's deal-id indexes there.
+    Raises ValueError when the stored deals were classified with other rules.
+    """
+    rules = rules or deal_rules()
+    check_stored_rules(user_id, rules)
+    rows, malformed_logins = deal_rows(deals_df, money_columns, rules, datetime_col)
+    indexes = _deal_indexes(user_id, index_dir) if index_dir else {}
+    fresh = np.ones(len(rows), dtype=bool)
+    for book in BOOK_NAMES:
+        positions = np.flatnonzero((rows["book"] == book).to_numpy())
+        if positions.size:
+            keys = rows["deal_key"].to_numpy(dtype=np.int64)[positions]
+            if book in indexes:
+                fresh[positions] = ~indexes[book].contains(keys)
+            else:
+                fresh[positions] = ~np.isin(keys, _stored_keys(user_id, book, keys))
+    new = rows[fresh]
+
+    try:
+        if not new.empty:
+            db.session.execute(db.insert(StoredDeal), _records(new.assign(user_id=user_id)))
+            _update_daily(user_id, new)
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    for book, index in indexes.items():
+        added = new.loc[(new["book"] == book).to_numpy(), "deal_key"].to_numpy(dtype=np.int64)
+        try:
+            index.add(added)
+        except OSError as e:
+            # The next upload sees the size mismatch and rebuilds the index
+            logger.warning("deal index update failed for user %s: %s", user_id, e)
+
+    stats = {
+        "Rows": len(deals_df),
+        "New Deals": len(new),
+        "Already Stored": len(rows) - len(new),
+        "Malformed Logins": malformed_logins,
+    }
+    logger.info("deal store user=%s rows=%s new=%s already_stored=%s",
+                user_id, stats["Rows"], stats["New Deals"], stats["Already Stored"])
+    return stats
+
+def ingest_deals_csv(user_id: int, source, chunk_rows: int, rules=None, index_dir: str = None,
+                     **read_csv_kwargs) -> dict:
+    """ingest_deals for a deals CSV read `chunk_rows` rows at a time; each chunk commits on its own."""
+    totals, money_columns = {}, None
+    with pd.read_csv(source, chunksize=chunk_rows, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            if money_columns is None:
+                money_columns = detect_money_columns(chunk)
+            for key, value in ingest_deals(user_id, chunk, money_columns, rules, index_dir=index_dir).items():
+                totals[key] = totals.get(key, 0) + value
+    return totals
+
+def check_stored_rules(user_id: int, rules=None):
+    """
+    Raise ValueError when deals of `user_id` were stored under deal rules other than
+    `rules` (deal_rules() by default). Deals stored before the rules version was
+    recorded have none and are taken as they are.
+    """
+    version = (rules or deal_rules()).version
+    other = db.session.execute(
+        db.select(StoredDeal.rules_version).where(
+            StoredDeal.user_id == user_id, StoredDeal.rules_version.is_not(None), StoredDeal.rules_version != version
+        ).limit(1)
+    ).scalar()
+    if other is not None:
+        raise ValueError("The deal store was filled under other deal rules (CHINESE_GROUP_PREFIXES or DEAL_RULES_FILE "
+                         "changed) and keeps each deal's book and Chinese flag from then; restore those rules, or "
+                         "clear the stored deals and upload them again.")
+
+def stored_deal_count(user_id: int) -> int:
+    """Deals stored for `user_id`; it only grows, so it identifies the store's contents."""
+    return db.session.execute(
+        db.select(db.func.count()).select_from(StoredDeal).where(StoredDeal.user_id == user_id)
+    ).scalar_one()
+
+def store_partials(user_id: int, first_day=None, last_day=None, fixed_point: bool = False) -> pd.DataFrame:
+    """
+    Partial-aggregate table of build_deal_partials over the stored deals of `user_id`,
+    optionally limited to whole days from `first_day` to `last_day` (dates, inclusive).
+    With `fixed_point` the amounts are int64 ten-thousandths, as stored.
+
+    Keys are ranked by book and the order their rows were stored.
+    """
+    query = db.select(
+        DealDailyAggregate.id, DealDailyAggregate.book, DealDailyAggregate.login, DealDailyAggregate.chinese,
+        *(getattr(DealDailyAggregate, c) for c in STORE_COLUMNS.values())
+    ).where(DealDailyAggregate.user_id == user_id)
+    if first_day is not None:
+        query = query.where(DealDailyAggregate.day >= first_day)
+    if last_day is not None:
+        query = query.where(DealDailyAggregate.day <= last_day)
+    daily = pd.DataFrame(db.session.execute(query).all(),
+                         columns=["id", "book", "login", "chinese", *STORE_COLUMNS.values()])
+    if daily.empty:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+
+    return rank_partials([pd.DataFrame({
+        "Book": pd.Categorical(daily["book"], categories=BOOK_NAMES),
+        "Login": daily["login"].to_numpy(dtype=np.int64),
+        "Chinese": daily["chinese"].to_numpy(dtype=bool),
+        **_stored_amounts(daily, fixed_point),
+        "First Row": daily["id"].to_numpy(dtype=np.int64),
+    })])
+
+def store_daily_partials(user_id: int, fixed_point: bool = False) -> pd.DataFrame:
+    """The per-day table of build_daily_partials over the stored deals of `user_id`, for time rollups and windows."""
+    daily = pd.DataFrame(db.session.execute(
+        db.select(DealDailyAggregate.day, DealDailyAggregate.book, DealDailyAggregate.login, DealDailyAggregate.chinese,
+                  *(getattr(DealDailyAggregate, c) for c in STORE_COLUMNS.values()))
+        .where(DealDailyAggregate.user_id == user_id, DealDailyAggregate.day.is_not(None))
+    ).all(), columns=[*AGGREGATE_KEYS, *STORE_COLUMNS.values()])
+    return pd.DataFrame({
+        "Day": pd.to_datetime(daily["day"]).astype("datetime64[s]"),
+        "Book": pd.Categorical(daily["book"], categories=BOOK_NAMES),
+        "Login": daily["login"].to_numpy(dtype=np.int64),
+        "Chinese": daily["chinese"].to_numpy(dtype=bool),
+        **_stored_amounts(daily, fixed_point),
+    })[[*DAILY_KEYS, *STORE_COLUMNS]]
@@ -0,0 +1,67 @@
+import logging
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+STAGE_FIELDS = ("Stage", "Rows In", "Rows Out", "Seconds", "Peak MB")
+
+class PipelineDiagnostics:
+    """
+    Collects wall time, row counts and (optionally) peak traced memory for each
+    stage of a deal report run. A disabled instance records nothing.
+    """
+
+    def __init__(self, enabled=True, trace_memory=False):
+        self.enabled = enabled
+        self.trace_memory = enabled and trace_memory
+        self.stages = []
+        self._depth = 0
+        self._started_tracing = False
+
+    def __enter__(self):
+        # Re-entrant: only the outermost block starts and stops tracing
+        if self._depth == 0 and self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracing = True
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc):
+        self._depth -= 1
+        if self._depth == 0 and self._started_tracing:
+            tracemalloc.stop()
+            self._started_tracing = False
+        return False
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        """Time the wrapped block; the yielded dict takes an optional 'Rows Out'."""
+        record = {"Stage": name, "Rows In": rows_in, "Rows Out": None, "Seconds": 0.0, "Peak MB": None}
+        if not self.enabled:
+            yield record
+            return
+        tracing = self.trace_memory and tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["Seconds"] = round(time.perf_counter() - start, 4)
+            if tracing:
+                record["Peak MB"] = round(tracemalloc.get_traced_memory()[1] / 2**20, 2)
+            self.stages.append(record)
+
+    def log(self, label="deal report"):
+        """Write one line per stage to the application log, with any extra counters a stage recorded."""
+        for record in self.stages:
+            extra = "".join(
+                f" {key.lower().replace(' ', '_')}={value}" for key, value in record.items() if key not in STAGE_FIELDS
+            )
+            logger.info(
+                "%s stage=%s rows_in=%s rows_out=%s seconds=%.4f peak_mb=%s%s",
+                label, record["Stage"], record["Rows In"], record["Rows Out"],
+                record["Seconds"], record["Peak MB"], extra
+            )
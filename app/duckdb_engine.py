@@ -0,0 +1,219 @@
+"""
+DuckDB execution engine for deal reports.
+
+Login normalization, book split, per-book dedupe on the deal id, the date window,
+money parsing, the Chinese segment and the per-(Book, Login, Chinese) aggregation
+run as one SQL query inside DuckDB, over a deals DataFrame or straight over a CSV
+or Parquet file. DuckDB runs in-process, uses every core and spills to disk, so the
+deals never have to fit in pandas. The small partial-aggregate table it returns
+feeds the same report_from_partials as the pandas engine.
+
+Amounts are always summed as fixed-point int64 ten-thousandths (processing.to_fixed),
+so results do not depend on DuckDB's parallel summation order and match the pandas
+engine run with fixed_point=True exactly.
+"""
+import os
+
+import numpy as np
+import pandas as pd
+
+from app.diagnostics import PipelineDiagnostics
+from app.processing import (
+    BOOK_AGGREGATES, BOOK_NAMES, CHINESE_SEGMENT, MONEY_SCALE, PARTIAL_COLUMNS,
+    deal_rules, detect_money_columns, run_report_processing
+)
+from app.streaming import date_window
+
+try:
+    import duckdb
+except ImportError:  # optional: only engine="duckdb" needs it
+    duckdb = None
+
+NUMERIC_TYPES = ("TINYINT", "SMALLINT", "INTEGER", "BIGINT", "HUGEINT", "UTINYINT", "USMALLINT",
+                 "UINTEGER", "UBIGINT", "FLOAT", "DOUBLE")
+MONEY_REGEX = r"^\s*([-+]?[\d,]*\.?\d+)\s*([A-Za-z]*)\s*$"
+
+def _quote(name: str) -> str:
+    return '"' + str(name).replace('"', '""') + '"'
+
+def _literal(text: str) -> str:
+    return "'" + str(text).replace("'", "''") + "'"
+
+def _number(text: str) -> str:
+    """SQL for pd.to_numeric(errors='coerce') of a VARCHAR: NULL where pandas gives NaN."""
+    # DuckDB also reads '1_000' and 'nan', which pandas rejects or turns into NaN
+    return (f"(CASE WHEN contains({text}, '_') THEN NULL "
+            f"ELSE nullif(TRY_CAST({text} AS DOUBLE), 'nan'::DOUBLE) END)")
+
+def _money(text: str) -> str:
+    """SQL for processing.parse_money_series of a stripped VARCHAR: USD amount or NULL."""
+    def usd(amount, unit):
+        # np.round(x / 100, 4) is rint(x / 100 * 1e4) / 1e4
+        return f"(CASE WHEN {unit} = 'USC' THEN round_even({amount} / 100 * 10000.0, 0) / 10000.0 ELSE {amount} END)"
+
+    unit = f"upper(right({text}, 3))"
+    stripped = f"trim(CASE WHEN {unit} IN ('USD', 'USC') THEN left({text}, length({text}) - 3) ELSE {text} END)"
+    fast = _number(stripped)
+    # Only values the fast path could not read (thousand separators, other units) go through the regex,
+    # and values it does not match either are coerced like sanitize_numeric_series
+    parts = f"regexp_extract({text}, {_literal(MONEY_REGEX)}, ['amount', 'unit'])"
+    without_commas = f"replace({parts}.amount, ',', '')"
+    return (f"(CASE WHEN {fast} IS NOT NULL THEN {usd(fast, unit)} "
+            f"WHEN {parts}.amount <> '' THEN {usd(_number(without_commas), f'upper({parts}.unit)')} "
+            f"ELSE {usd(_sanitized(stripped), unit)} END)")
+
+def _sanitized(text: str) -> str:
+    """SQL for processing.sanitize_numeric_series of a VARCHAR (NULL where it gives 0)."""
+    cleaned = f"regexp_replace({text}, '[^\\d\\.\\-]', '', 'g')"
+    return f"(CASE WHEN {text} IS NULL THEN NULL ELSE coalesce({_number(text)}, {_number(cleaned)}) END)"
+
+def _amount(column: str, column_type: str, money: bool) -> str:
+    """Fixed-point int64 SQL for one aggregate column, parsed the way the pandas engine parses it."""
+    col = _quote(column)
+    if column_type in NUMERIC_TYPES:
+        value = f"nullif({col}::DOUBLE, 'nan'::DOUBLE)"
+    elif money:
+        value = _money(f"trim({col}::VARCHAR)")
+    else:
+        value = _sanitized(f"{col}::VARCHAR")
+    return f"coalesce(TRY_CAST(round_even({value} * {float(MONEY_SCALE)}, 0) AS BIGINT), 0)"
+
+def _login(column_type: str) -> tuple[str, str]:
+    """(valid, int64 key) SQL for the Login column, as processing.login_keys reads it."""
+    if column_type in NUMERIC_TYPES:
+        value = '"Login"::DOUBLE'
+    else:
+        value = _number('trim("Login"::VARCHAR)')
+    valid = f"coalesce(isfinite({value}) AND {value} = floor({value}), false)"
+    return valid, f"(CASE WHEN {valid} THEN {value}::BIGINT END)"
+
+def _deal_key(column: str, column_type: str) -> str:
+    """Dedupe key of the deal id column: numbers by value, other text stripped (as streaming.deal_keys)."""
+    col = _quote(column)
+    if column_type in NUMERIC_TYPES:
+        return f"{col}::VARCHAR" if "INT" in column_type else f"CAST({col} AS DOUBLE)::VARCHAR"
+    number = _number(f"trim({col}::VARCHAR)")
+    return (f"(CASE WHEN isfinite({number}) AND {number} = floor({number}) AND abs({number}) < 9.2e18 "
+            f"THEN {number}::BIGINT::VARCHAR ELSE trim({col}::VARCHAR) END)")
+
+def _rule_test(rule) -> str:
+    """SQL condition for one rule of app.rules (values compared stripped)."""
+    value = f"trim({_quote(rule.column)}::VARCHAR)"
+    pattern = _literal(str(rule.pattern).strip())
+    return f"{value} = {pattern}" if rule.match == "exact" else f"starts_with({value}, {pattern})"
+
+def _book(rules, columns) -> str:
+    """BOOK_NAMES position for each deal: the first matching book rule, else the default book."""
+    cases = " ".join(
+        f"WHEN coalesce({_rule_test(r)}, false) THEN {rules.books.index(r.value)}"
+        for r in rules.rules if r.target == "book" and r.column in columns
+    )
+    return f"(CASE {cases} ELSE {rules.default_book} END)" if cases else str(rules.default_book)
+
+def _segment(rules, columns, segment: str) -> str:
+    """Whether each deal matches one of `segment`'s rules."""
+    tests = [_rule_test(r) for r in rules.rules if r.target == "segment" and r.value == segment and r.column in columns]
+    return f"coalesce({' OR '.join(tests)}, false)" if tests else "false"
+
+def connect(threads: int = None):
+    """In-memory DuckDB connection; `threads` defaults to every core."""
+    if duckdb is None:
+        raise ImportError("engine='duckdb' needs the duckdb package (pip install duckdb).")
+    con = duckdb.connect()
+    con.execute(f"SET threads = {int(threads or os.cpu_count() or 1)}")
+    return con
+
+def _load_source(con, source, datetime_col, rule_columns=()) -> tuple[dict, int]:
+    """
+    Copy the report's columns of `source` (DataFrame, CSV or Parquet path) into the
+    'deals' table, whose rowid is the row order. Returns ({column: type}, rows).
+    """
+    if isinstance(source, pd.DataFrame):
+        con.register("deals_source", source)
+        relation = "deals_source"
+    elif str(source).lower().endswith(".parquet"):
+        relation = f"read_parquet({_literal(os.fspath(source))})"
+    else:
+        # Read as text so every value goes through the same parsing as the pandas engine
+        relation = f"read_csv({_literal(os.fspath(source))}, header = true, all_varchar = true)"
+
+    names = [row[0] for row in con.execute(f"DESCRIBE SELECT * FROM {relation}").fetchall()]
+    wanted = {names[0], "Login", "Processing rule", datetime_col, *rule_columns, *BOOK_AGGREGATES.values()}
+    columns = ", ".join(_quote(c) for c in names if c in wanted)
+    con.execute(f"CREATE TEMP TABLE deals AS SELECT {columns} FROM {relation}")
+    types = {row[0]: row[1] for row in con.execute("DESCRIBE deals").fetchall()}
+    return types, con.execute("SELECT count(*) FROM deals").fetchone()[0]
+
+def _money_sample(con, source, sample_rows: int = 1000) -> list[str]:
+    """detect_money_columns over the deals, or over their first rows when read from a file."""
+    if isinstance(source, pd.DataFrame):
+        return detect_money_columns(source)
+    return detect_money_columns(con.execute(f"SELECT * FROM deals ORDER BY rowid LIMIT {sample_rows}").df())
+
+def duckdb_deal_partials(source, start_date=None, end_date=None, money_columns: list[str] = None, rules=None,
+                         threads: int = None, datetime_col="Date & Time (UTC)") -> tuple[pd.DataFrame, int, int]:
+    """
+    The partial-aggregate table of build_report_partials computed by DuckDB over a deals
+    DataFrame or a CSV or Parquet path, with fixed-point sums. Keys are ranked by book
+    and row like rank_partials. Returns (partials, rows read, malformed logins).
+    """
+    window = date_window(start_date, end_date)
+    rules = rules or deal_rules()
+    con = connect(threads)
+    try:
+        types, rows_read = _load_source(con, source, datetime_col, rules.columns)
+        if "Processing rule" not in types:
+            raise ValueError("Missing 'Processing rule' column in the deals CSV.")
+        if money_columns is None:
+            money_columns = _money_sample(con, source)
+        first_column = next(iter(types))
+        valid, login = _login(types["Login"])
+        if datetime_col in types:
+            stamp = f"epoch_ns(try_strptime(trim({_quote(datetime_col)}::VARCHAR), '%d.%m.%Y %H:%M:%S'))"
+        else:
+            stamp = "NULL::BIGINT"
+        amounts = ", ".join(
+            f"{_amount(col, types[col], col in money_columns) if col in types else '0::BIGINT'} AS {_quote(name)}"
+            for name, col in BOOK_AGGREGATES.items()
+        )
+        sums = ", ".join(f"sum({_quote(name)})::BIGINT AS {_quote(name)}" for name in BOOK_AGGREGATES)
+        # As in filter_by_date_range, deals without a valid time only count when there is no window
+        in_window = f"stamp BETWEEN {window[0]} AND {window[1]}" if window and datetime_col in types else "true"
+
+        partials = con.execute(f"""
+            WITH fresh AS (
+                SELECT rowid AS row, {_book(rules, types)} AS book, {login} AS login,
+                       {_segment(rules, types, CHINESE_SEGMENT)} AS chinese,
+                       {_deal_key(first_column, types[first_column])} AS deal, {stamp} AS stamp, {amounts}
+                FROM deals
+                WHERE {valid}
+                QUALIFY row_number() OVER (PARTITION BY book, deal ORDER BY rowid) = 1
+            )
+            SELECT book, login AS "Login", chinese AS "Chinese", {sums},
+                   min(row) AS first
+            FROM fresh
+            WHERE {in_window}
+            GROUP BY book, login, chinese
+            ORDER BY book, first
+        """).df()
+        malformed_logins = con.execute(f"SELECT count(*) FROM deals WHERE NOT {valid}").fetchone()[0]
+    finally:
+        con.close()
+
+    if partials.empty:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS), rows_read, malformed_logins
+    partials = partials.assign(
+        Book=pd.Categorical.from_codes(partials["book"].to_numpy(dtype=np.int8), BOOK_NAMES),
+        Login=partials["Login"].to_numpy(dtype=np.int64),
+        Chinese=partials["Chinese"].to_numpy(dtype=bool),
+        **{name: partials[name].to_numpy(dtype=np.int64) for name in BOOK_AGGREGATES},
+        **{"First Row": np.arange(len(partials))},
+    )
+    return partials[PARTIAL_COLUMNS], rows_read, malformed_logins
+
+def duckdb_report_processing(source, excluded_df: pd.DataFrame, vip_df: pd.DataFrame, start_date: str = None, end_date: str = None,
+                             money_columns: list[str] = None, rules=None, threads: int = None,
+                             diagnostics: PipelineDiagnostics = None):
+    """run_report_processing with engine="duckdb": the deals-side work is done by DuckDB."""
+    return run_report_processing(source, excluded_df, vip_df, start_date, end_date, money_columns, rules, diagnostics,
+                                 workers=threads, engine="duckdb")
@@ -0,0 +1,27 @@
+"""
+File helpers shared by the on-disk caches and indexes (deal_cache, deal_index, result_cache).
+"""
+import os
+import tempfile
+from contextlib import contextmanager
+
+@contextmanager
+def atomic_write(path: str, mode: str = "wb"):
+    """
+    Open a temporary file next to `path` and rename it over `path` when the block
+    finishes, so readers in any process see the old file or the whole new one.
+    """
+    folder = os.path.dirname(path) or "."
+    os.makedirs(folder, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=folder, suffix=".tmp")
+    try:
+        with os.fdopen(fd, mode) as fh:
+            yield fh
+        os.replace(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+def touch(path: str):
+    """Mark a cache entry as recently used; eviction removes the oldest mtimes first."""
+    os.utime(path)
@@ -125,6 +125,44 @@ class UploadedFiles(db.Model):
     upload_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
     processed = db.Column(db.Boolean, default=False)
 
+# Deal store: every deal uploaded so far, deduplicated per book, with per-day rollups.
+# Amounts are integer ten-thousandths of a USD (processing.MONEY_SCALE), so sums are exact
+
+class StoredDeal(db.Model):
+    __tablename__ = 'stored_deals'
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), primary_key=True)
+    book = db.Column(db.String(16), primary_key=True)  # A Book, B Book, Multi Book
+    deal_key = db.Column(db.BigInteger, primary_key=True)  # Deal id (app.streaming.deal_keys)
+    login = db.Column(db.BigInteger, index=True)
+    chinese = db.Column(db.Boolean, default=False)
+    rules_version = db.Column(db.String(16), nullable=True)  # RuleSet.version that set book and chinese
+    deal_time = db.Column(db.DateTime, nullable=True)
+    total_volume = db.Column(db.BigInteger)
+    trader_profit = db.Column(db.BigInteger)
+    swaps = db.Column(db.BigInteger)
+    commission = db.Column(db.BigInteger)
+    tp_profit = db.Column(db.BigInteger)
+    broker_profit = db.Column(db.BigInteger)
+    upload_timestamp = db.Column(db.DateTime, default=datetime.utcnow)
+
+class DealDailyAggregate(db.Model):
+    __tablename__ = 'deal_daily_aggregates'
+    __table_args__ = (db.UniqueConstraint('user_id', 'day', 'book', 'login', 'chinese'),)
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('users.id'), index=True)
+    day = db.Column(db.Date, nullable=True)  # None for deals without a deal time
+    book = db.Column(db.String(16))
+    login = db.Column(db.BigInteger)
+    chinese = db.Column(db.Boolean, default=False)
+    deals = db.Column(db.Integer, default=0)
+    first_deal_time = db.Column(db.DateTime, nullable=True)
+    total_volume = db.Column(db.BigInteger, default=0)
+    trader_profit = db.Column(db.BigInteger, default=0)
+    swaps = db.Column(db.BigInteger, default=0)
+    commission = db.Column(db.BigInteger, default=0)
+    tp_profit = db.Column(db.BigInteger, default=0)
+    broker_profit = db.Column(db.BigInteger, default=0)
+
 @login_manager.user_loader
 def load_user(id):
     return User.query.get(int(id))
\ No newline at end of file
@@ -2,6 +2,9 @@ import pandas as pd
 import numpy as np
 from datetime import datetime
 
+from app.diagnostics import PipelineDiagnostics
+from app.rules import Rule, RuleSet, compile_rules
+
 # ─── Helpers ────────────────────────────────────────────────────────────────
 
 def round4(x):
@@ -18,15 +21,64 @@ def parse_custom_datetime(s: str):
     except (ValueError, TypeError):
         return pd.NaT
 
-def sanitize_numeric_series(sr: pd.Series) -> pd.Series:
-    """Clean a pandas Series to ensure it contains only numeric values."""
-    return (
-        sr.astype(str)
-          .str.replace(r"[^\d\.\-]", "", regex=True)
-          .replace(r"^\s*$", "0", regex=True)
-          .astype(float)
-          .fillna(0.0)
-    )
+SANITIZE_TIERS = ("numeric", "parsed", "coerced", "rejected", "missing")
+MISSING_TIER = SANITIZE_TIERS.index("missing")
+
+def _sanitize_values(sr: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """float64 values (NaN where missing or unparseable) and the SANITIZE_TIERS position of each value.
+
+    Missing values and text with nothing left after the cleanup (e.g. '' or 'n/a') are 'missing'.
+    """
+    if isinstance(sr.dtype, pd.CategoricalDtype):
+        # Each distinct label is parsed once
+        values, tiers = _sanitize_values(pd.Series(sr.cat.categories))
+        codes = sr.cat.codes.to_numpy()
+        missing = codes < 0
+        return np.where(missing, np.nan, values[codes]), np.where(missing, MISSING_TIER, tiers[codes]).astype(np.int8)
+    if pd.api.types.is_numeric_dtype(sr):
+        values = sr.to_numpy(dtype=float, na_value=np.nan)
+        return values, np.where(np.isnan(values), MISSING_TIER, 0).astype(np.int8)
+
+    values = pd.to_numeric(sr, errors="coerce").to_numpy(dtype=float, na_value=np.nan, copy=True)
+    missing = sr.isna().to_numpy()
+    tiers = np.where(missing, MISSING_TIER, 1).astype(np.int8)
+    failed = np.flatnonzero(np.isnan(values) & ~missing)
+    if failed.size:
+        # Only the distinct values pd.to_numeric rejected get the regex cleanup
+        codes, uniques = pd.factorize(sr.iloc[failed])
+        cleaned = pd.Series(uniques, dtype=object).astype(str).str.replace(r"[^\d\.\-]", "", regex=True)
+        blank = (cleaned == "").to_numpy()[codes]
+        retried = pd.to_numeric(cleaned, errors="coerce").to_numpy(dtype=float, na_value=np.nan)[codes]
+        values[failed] = retried
+        tiers[failed] = np.where(blank, MISSING_TIER, np.where(np.isnan(retried), 3, 2))
+    return values, tiers
+
+def sanitize_numeric_series(sr: pd.Series, counters: dict = None) -> pd.Series:
+    """Clean a pandas Series to ensure it contains only numeric values.
+
+    Numeric columns pass through, other values go through pd.to_numeric, and only
+    the ones it rejects are stripped to digits, '.' and '-' and parsed again.
+    Missing and unparseable values become 0. `counters`, when given, accumulates how
+    many values each SANITIZE_TIERS step handled ('rejected' and 'missing' ones became 0).
+    """
+    values, tiers = _sanitize_values(sr)
+    if counters is not None:
+        for tier, count in zip(SANITIZE_TIERS, np.bincount(tiers, minlength=len(SANITIZE_TIERS))):
+            counters[tier] = counters.get(tier, 0) + int(count)
+    return pd.Series(np.where(np.isnan(values), 0.0, values), index=sr.index, name=sr.name)
+
+def parse_deal_times(sr: pd.Series) -> pd.Series:
+    """Parse a whole column of 'dd.mm.yyyy hh:mm:ss' strings into datetime64[ns, UTC] (NaT if invalid)."""
+    return pd.to_datetime(
+        sr.map(str).str.strip(), format="%d.%m.%Y %H:%M:%S", utc=True, errors="coerce"
+    ).astype("datetime64[ns, UTC]")
+
+def _as_utc(value):
+    """Turn a 'dd.mm.yyyy hh:mm:ss' string or datetime into a UTC Timestamp (NaT if invalid)."""
+    ts = parse_custom_datetime(value) if isinstance(value, str) else pd.Timestamp(value)
+    if pd.isna(ts):
+        return pd.NaT
+    return ts.tz_localize("UTC") if ts.tzinfo is None else ts.tz_convert("UTC")
 
 def filter_by_date_range(df: pd.DataFrame, start_date, end_date, datetime_col="Date & Time (UTC)"):
     """Filter a DataFrame by a given date range."""
@@ -34,205 +86,518 @@ def filter_by_date_range(df: pd.DataFrame, start_date, end_date, datetime_col="D
         return df
 
     if start_date and end_date:
-        mask = pd.Series([True] * len(df))
-
-        start_dt = parse_custom_datetime(start_date) if isinstance(start_date, str) else start_date
-        end_dt = parse_custom_datetime(end_date) if isinstance(end_date, str) else end_date
+        start_dt = _as_utc(start_date)
+        end_dt = _as_utc(end_date)
 
         if pd.isna(start_dt) or pd.isna(end_dt):
              raise ValueError("Invalid start or end date format. Please use 'dd.mm.yyyy hh:mm:ss'")
 
-        # This is more efficient than iterating row-by-row
-        parsed_dts = df[datetime_col].apply(lambda x: parse_custom_datetime(str(x)))
+        # Enriched books carry the default column's parsed times, so nothing is re-parsed; a book
+        # enrich_and_dedupe found sorted by them (NaT, the smallest int64, first) is sliced
+        # instead of masked, as long as its rows have not been reordered since
+        if datetime_col == "Date & Time (UTC)" and DEAL_TIME_COL in df.columns:
+            stamps = df[DEAL_TIME_COL].array.asi8
+            if df.attrs.get("deal_times_sorted") and df.index.is_monotonic_increasing:
+                lo = np.searchsorted(stamps, start_dt.value, side="left")
+                hi = np.searchsorted(stamps, end_dt.value, side="right")
+                return df.iloc[lo:hi]
+            # NaT never falls inside the window
+            return df[(stamps >= start_dt.value) & (stamps <= end_dt.value)].copy()
+
+        parsed_dts = parse_deal_times(df[datetime_col])
         mask = (parsed_dts >= start_dt) & (parsed_dts <= end_dt)
 
         return df[mask].copy()
     return df
 
+# ─── Logins ──────────────────────────────────────────────────────────────────
+
+def login_keys(sr) -> tuple[np.ndarray, np.ndarray]:
+    """Return (int64 keys, valid mask) for a login column; missing or non-integer logins are invalid."""
+    sr = pd.Series(sr, dtype=object) if not isinstance(sr, pd.Series) else sr
+    if pd.api.types.is_integer_dtype(sr) and not sr.hasnans:
+        return sr.to_numpy(dtype=np.int64), np.ones(len(sr), dtype=bool)
+    if pd.api.types.is_numeric_dtype(sr):
+        numbers = pd.to_numeric(sr, errors="coerce")
+    else:
+        numbers = _apply_to_distinct(sr, lambda values: pd.to_numeric(values, errors="coerce"))
+    values = numbers.to_numpy(dtype=float, na_value=np.nan)
+    valid = np.isfinite(values) & (values == np.floor(values))
+    keys = np.zeros(len(values), dtype=np.int64)
+    keys[valid] = values[valid]
+    return keys, valid
+
+def normalize_logins(df: pd.DataFrame) -> tuple[pd.DataFrame, int]:
+    """Make 'Login' a canonical int64 column, dropping rows whose login is malformed.
+
+    Returns the normalized frame and the number of rows dropped.
+    """
+    if "Login" not in df.columns:
+        return df, 0
+    keys, valid = login_keys(df["Login"])
+    malformed = int(len(valid) - valid.sum())
+    d = df[valid] if malformed else df
+    return d.assign(Login=keys[valid]), malformed
+
+def as_login_array(logins) -> np.ndarray:
+    """Sorted, unique int64 array from any collection of logins (strings or numbers)."""
+    if isinstance(logins, np.ndarray) and logins.dtype == np.int64:
+        return np.unique(logins)
+    keys, valid = login_keys(list(logins) if isinstance(logins, (set, frozenset)) else logins)
+    return np.unique(keys[valid])
+
+def list_logins(list_df: pd.DataFrame) -> np.ndarray:
+    """as_login_array of a headerless excluded or VIP list (its first column)."""
+    return as_login_array(list_df.iloc[:, 0] if not list_df.empty else [])
+
+def isin_logins(keys: np.ndarray, sorted_logins: np.ndarray) -> np.ndarray:
+    """Vectorized membership of int64 `keys` in a login array from as_login_array."""
+    if sorted_logins.size == 0:
+        return np.zeros(len(keys), dtype=bool)
+    # For int64 arrays np.isin picks a lookup-table method, which beats per-key binary search
+    return np.isin(keys, sorted_logins)
+
+# ─── Money Parsing ───────────────────────────────────────────────────────────
+
+MONEY_PATTERN = r"^\s*(?P<amount>[-+]?[\d,]*\.?\d+)\s*(?P<unit>[A-Za-z]*)\s*$"
+
+def detect_money_columns(df: pd.DataFrame, sample_size: int = 1000) -> list[str]:
+    """Return the text columns where any sampled value looks like '<amount> USD' or '<amount> USC'.
+
+    One odd value must not turn off USC conversion for a whole column, so the other
+    values are left to parse_money_series to coerce.
+    """
+    found = []
+    for col in df.columns:
+        sr = df[col]
+        if not (pd.api.types.is_object_dtype(sr) or pd.api.types.is_string_dtype(sr)):
+            continue
+        sample = sr.dropna().head(sample_size).astype(str)
+        if sample.empty:
+            continue
+        parts = sample.str.extract(MONEY_PATTERN)
+        units = parts["unit"].str.upper()
+        if (parts["amount"].notna() & units.isin(["USD", "USC"])).any():
+            found.append(col)
+    return found
+
+def parse_money_series(sr: pd.Series) -> pd.Series:
+    """Parse '<amount> <unit>' strings into float amounts in USD (USC is divided by 100).
+
+    Values that do not match MONEY_PATTERN (e.g. '1 234.50 USD') are coerced like
+    sanitize_numeric_series, keeping a trailing USD/USC unit.
+    """
+    # Exports repeat the same amounts a lot, so only the distinct strings are parsed
+    codes, uniques = pd.factorize(sr)
+    text = pd.Series(uniques, dtype=object).astype(str).str.strip()
+    unit = text.str[-3:].str.upper()
+    has_unit = unit.isin(["USD", "USC"])
+    amount = pd.to_numeric(text.where(~has_unit, text.str[:-3]).str.strip(), errors="coerce")
+
+    # Only values the fast path could not read (thousand separators, other units) go through the regex
+    retry = amount.isna()
+    if retry.any():
+        parts = text[retry].str.extract(MONEY_PATTERN)
+        amount[retry] = pd.to_numeric(parts["amount"].str.replace(",", "", regex=False), errors="coerce")
+        matched = retry & parts["amount"].notna().reindex(text.index, fill_value=False)
+        unit[matched] = parts["unit"].str.upper()[matched[retry]]
+        unmatched = retry & ~matched
+        if unmatched.any():
+            amount[unmatched] = _sanitize_values(text[unmatched].where(~has_unit[unmatched], text.str[:-3]))[0]
+
+    usc = unit.eq("USC").fillna(False).to_numpy(dtype=bool)
+    values = amount.to_numpy(dtype=float, copy=True)
+    values[usc] = np.round(values[usc] / 100, 4)
+    # factorize marks missing values with -1, which picks the trailing NaN
+    return pd.Series(np.append(values, np.nan)[codes], index=sr.index, name=sr.name)
+
+def convert_money_columns(df: pd.DataFrame, columns: list[str] = None) -> pd.DataFrame:
+    """Parse the monetary columns (given, or detected from a sample) into float USD columns."""
+    if columns is None:
+        columns = detect_money_columns(df)
+    columns = [c for c in columns if c in df.columns and not pd.api.types.is_numeric_dtype(df[c])]
+    d = df.assign(**{col: parse_money_series(df[col]) for col in columns})
+    # Columns parsed by an earlier call (e.g. at load time) stay marked as USD
+    d.attrs["money_columns"] = list(dict.fromkeys([*df.attrs.get("money_columns", ()), *columns]))
+    return d
+
 # ─── Core Processing ─────────────────────────────────────────────────────────
 
-def process_and_split(df: pd.DataFrame) -> dict[str, pd.DataFrame]:
+DEAL_TIME_COL = "Deal Time (UTC)"
+
+BOOK_NAMES = ("A Book", "B Book", "Multi Book")
+BOOK_RULES = {"Pipwise": "A Book", "Retail B-book": "B Book"}
+
+def classify_books(deals: pd.DataFrame, rules=None) -> np.ndarray:
+    """Map each deal to a position in BOOK_NAMES by the book rules of `rules` (deal_rules() by default)."""
+    return (rules or deal_rules()).classify(deals)
+
+def process_and_split(df: pd.DataFrame, money_columns: list[str] = None) -> dict[str, pd.DataFrame]:
     """Convert USC to USD and split the DataFrame by 'Processing rule' into A/B/Multi books."""
-    d = df.copy()
-    # USC → USD conversion
-    for col in d.select_dtypes(include="object"):
-        d[col] = d[col].astype(str).str.replace(
-            r"(?i)(\d[\d\.\-]*)\s*usc",
-            lambda m: f"{round4(float(m.group(1)) / 100):.4f} USD",
-            regex=True
-        )
+    return split_books(convert_money_columns(df, money_columns))
+
+def classify_deals(deals: pd.DataFrame, rules=None) -> tuple[np.ndarray, np.ndarray]:
+    """classify_books and the chinese_deals mask of `deals` from one pass over the rule columns."""
+    books, segments = (rules or deal_rules()).apply(deals)
+    return books, segments.get(CHINESE_SEGMENT, np.zeros(len(deals), dtype=bool))
 
+def split_books(d: pd.DataFrame, rules=None) -> dict[str, pd.DataFrame]:
+    """Split an already converted DataFrame into A/B/Multi books by the book rules of `rules`."""
     if "Processing rule" not in d:
         raise ValueError("Missing 'Processing rule' column in the deals CSV.")
 
-    books = {"A Book": [], "B Book": [], "Multi Book": []}
-    for _, row in d.iterrows():
-        rule = str(row["Processing rule"]).strip()
-        bucket = (
-            "A Book" if rule == "Pipwise"
-            else "B Book" if rule == "Retail B-book"
-            else "Multi Book"
-        )
-        books[bucket].append(row)
-    return {name: pd.DataFrame(rows, columns=d.columns) for name, rows in books.items()}
+    book_codes = classify_books(d, rules)
+    return {
+        name: d.take(np.flatnonzero(book_codes == code))
+        for code, name in enumerate(BOOK_NAMES)
+    }
+
+def _apply_to_distinct(sr: pd.Series, fn):
+    """Run a vectorized `fn` over the distinct values of `sr` only and broadcast the result back."""
+    codes, uniques = pd.factorize(sr)
+    values = list(uniques)
+    missing = np.flatnonzero(codes < 0)
+    if missing.size:
+        # factorize treats None, NaN and NaT as one value, but their text differs ('None', 'nan', ...)
+        null_codes, _ = pd.factorize(np.array([str(v) for v in sr.iloc[missing]], dtype=object))
+        first = np.unique(null_codes, return_index=True)[1]
+        codes[missing] = len(values) + null_codes
+        values.extend(sr.iloc[missing[first]])
+    result = fn(pd.Series(values, dtype=object))
+    return result.take(codes).set_axis(sr.index)
+
+def _split_profit_text(raw: pd.Series) -> pd.DataFrame:
+    """Split profit strings into numeric value (digits, '.', '-') and upper-cased unit text."""
+    text = raw.map(str)
+    return pd.DataFrame({
+        "Profit Value": pd.to_numeric(text.str.replace(r"[^\d\.\-]", "", regex=True), errors="coerce").round(4).fillna(0.0),
+        "Profit Unit": text.str.replace(r"[\d\.\-]", "", regex=True).str.strip().str.upper(),
+    })
+
+def _format_date_time(dt: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """Format UTC datetimes as 'YYYY-MM-DD' and 'HH:MM:SS' arrays ('' for NaT) without strftime."""
+    stamps = np.datetime_as_string(dt.dt.tz_localize(None).to_numpy(dtype="datetime64[s]"), unit="s")
+    # 'YYYY-MM-DDTHH:MM:SS' is fixed width, so both parts are plain character slices
+    chars = stamps.astype("U19").view("U1").reshape(-1, 19)
+    dates = np.ascontiguousarray(chars[:, :10]).view("U10").ravel()
+    times = np.ascontiguousarray(chars[:, 11:]).view("U8").ravel()
+    missing = dt.isna().to_numpy()
+    dates[missing] = ""
+    times[missing] = ""
+    return dates, times
 
-def enrich_and_dedupe(df: pd.DataFrame) -> pd.DataFrame:
-    """Add calculated columns and remove duplicate deals based on the first column."""
+def first_deals(df: pd.DataFrame) -> np.ndarray:
+    """Mask of the first row of each deal id (first column); numbers compare by value, text stripped."""
+    deal = df.iloc[:, 0]
+    if not pd.api.types.is_numeric_dtype(deal):
+        deal = deal.map(str).str.strip()
+    return ~deal.duplicated(keep="first").to_numpy()
+
+def enrich_and_dedupe(df: pd.DataFrame, datetime_col="Date & Time (UTC)") -> pd.DataFrame:
+    """Add calculated columns and remove duplicate deals based on the first column.
+
+    When `datetime_col` is present it is parsed once into DEAL_TIME_COL, so
+    filter_by_date_range and the time rollups do not parse it again. Row order is kept;
+    attrs["deal_times_sorted"] records whether it is also deal-time order.
+    """
     if df.empty:
         return df
-    output, seen = [], set()
-    for _, row in df.iterrows():
-        deal = str(row.iloc[0]).strip()
-        if deal in seen:
-            continue
-        seen.add(deal)
-        raw = str(row.iloc[6] if len(row) > 6 else "")
-        val = round4("".join(ch for ch in raw if ch.isdigit() or ch in ".-"))
-        unit = "".join(ch for ch in raw if not (ch.isdigit() or ch in ".-")).strip().upper()
-        dt_raw = str(row.iloc[7] if len(row) > 7 else "").strip()
-        dt = parse_custom_datetime(dt_raw)
-        date_str = dt.strftime("%Y-%m-%d") if not pd.isna(dt) else ""
-        time_str = dt.strftime("%H:%M:%S") if not pd.isna(dt) else ""
-        output.append(list(row) + [val, unit, date_str, time_str])
-    headers = list(df.columns) + ["Profit Value", "Profit Unit", "Date", "Time"]
-    return pd.DataFrame(output, columns=headers)
 
-def aggregate_book(df: pd.DataFrame, excluded: set[str], book_type: str) -> pd.DataFrame:
-    """Aggregate book data, applying specific exclusion logic based on book type."""
-    if df.empty:
-        return pd.DataFrame()
+    d = df[first_deals(df)]
+
+    # Profit Value / Profit Unit come from the 7th column, Date / Time from the 8th
+    if d.shape[1] > 6:
+        raw = d.iloc[:, 6]
+        if pd.api.types.is_numeric_dtype(raw):
+            missing = raw.isna().to_numpy()
+            value = raw.astype(float).round(4).fillna(0.0)
+            # Columns parsed by convert_money_columns are already floats in USD
+            if d.columns[6] in d.attrs.get("money_columns", ()):
+                unit = np.where(missing, "", "USD")
+            else:
+                unit = np.where(missing, "NAN", "")
+        else:
+            profit = _apply_to_distinct(raw, _split_profit_text)
+            value, unit = profit["Profit Value"].to_numpy(), profit["Profit Unit"].to_numpy()
+    else:
+        value, unit = 0.0, ""
+
+    dt_col = d.columns[7] if d.shape[1] > 7 else None
+    if dt_col is not None:
+        dt = parse_deal_times(d.iloc[:, 7])
+        dates, times = _format_date_time(dt)
+    else:
+        dates, times = "", ""
+
+    d = d.assign(**{
+        "Profit Value": value,
+        "Profit Unit": unit,
+        "Date": dates,
+        "Time": times,
+    })
+    if datetime_col not in d.columns:
+        return d.reset_index(drop=True)
+
+    # Parse the deal time once for date filtering and the time rollups
+    d[DEAL_TIME_COL] = dt if dt_col == datetime_col else parse_deal_times(d[datetime_col])
+    d = d.reset_index(drop=True)
+    # Checked once here, so every date window of a time-ordered book is a binary search
+    stamps = d[DEAL_TIME_COL].array.asi8
+    d.attrs["deal_times_sorted"] = bool((stamps[1:] >= stamps[:-1]).all())
+    return d
+
+CHINESE_GROUP_PREFIXES = ("real\\Chines", "BBOOK\\Chines")
+CHINESE_SEGMENT = "Chinese"
+
+# Book routing and the Chinese client segment as one versioned rule table (see app.rules);
+# the DEAL_RULES_FILE setting replaces it
+DEAL_RULES = (
+    *(Rule("book", "Processing rule", "exact", rule, book) for rule, book in BOOK_RULES.items()),
+    *(Rule("segment", "Group", "prefix", prefix, CHINESE_SEGMENT) for prefix in CHINESE_GROUP_PREFIXES),
+)
+
+def deal_rules(prefixes=None, table=None) -> RuleSet:
+    """
+    DEAL_RULES, or the rule table `table` (see app.rules.load_rules), compiled once per
+    version, with `prefixes` as the Chinese segment's Group prefixes when given.
+    Unmatched deals go to Multi Book.
+    """
+    rules = DEAL_RULES if table is None else table
+    if prefixes:
+        rules = (*(r for r in rules if r.value != CHINESE_SEGMENT),
+                 *(Rule("segment", "Group", "prefix", prefix, CHINESE_SEGMENT) for prefix in prefixes))
+    return compile_rules(rules, BOOK_NAMES, "Multi Book")
+
+BOOK_AGGREGATES = {
+    "Total Volume": "Notional volume in USD",
+    "Trader Profit": "Trader profit",
+    "Swaps": "Swaps",
+    "Commission": "Commission",
+    "TP Profit": "TP broker profit",
+    "Broker Profit": "Total broker profit",
+}
+
+# Fixed-point money: int64 ten-thousandths of a USD, so sums are exact in any order
+MONEY_SCALE = 10_000
+
+def to_fixed(values) -> np.ndarray:
+    """USD amounts as int64 ten-thousandths (rounded half to even)."""
+    return np.rint(np.asarray(values, dtype=float) * MONEY_SCALE).astype(np.int64)
+
+def is_fixed(partials: pd.DataFrame) -> bool:
+    """Whether a partial-aggregate table carries fixed-point amounts."""
+    return pd.api.types.is_integer_dtype(partials["Total Volume"]) if "Total Volume" in partials else False
+
+def _amounts(df: pd.DataFrame, col: str, fixed_point: bool) -> np.ndarray:
+    values = df[col].to_numpy(dtype=float)
+    return to_fixed(values) if fixed_point else values
 
-    required = ["Login", "Notional volume in USD", "Trader profit", "Swaps", "Commission", "TP broker profit", "Total broker profit"]
-    for col in required:
+def _append_summary_row(df_out: pd.DataFrame) -> pd.DataFrame:
+    """Append the 'Summary' row (rounded column totals) used by the templates and charts."""
+    summary = {c: round4(df_out[c].sum()) for c in df_out.columns if c != "Login"}
+    summary["Login"] = "Summary"
+    return pd.concat([df_out, pd.DataFrame([summary])], ignore_index=True)
+
+def _sanitize_book(df: pd.DataFrame, counters: dict = None) -> pd.DataFrame:
+    """Check that a book has the aggregate columns and return it with them coerced to numbers."""
+    for col in ["Login", *BOOK_AGGREGATES.values()]:
         if col not in df:
             raise ValueError(f"Missing required column '{col}' in the deals CSV.")
-        if col != "Login":
-            df[col] = sanitize_numeric_series(df[col])
-
-    rows = []
-    for login, group in df.groupby("Login", dropna=False):
-        if pd.isna(login):
-            continue
+    return df.assign(**{col: sanitize_numeric_series(df[col], counters) for col in BOOK_AGGREGATES.values()})
 
-        login_str = str(int(login)).strip() if pd.notna(login) else ""
-        is_excluded = login_str in excluded
+def _finish_book(df_out: pd.DataFrame, excluded, book_type: str, fixed_point: bool = False) -> pd.DataFrame:
+    """Apply the book's exclusion rule to per-login sums (int64 Login) and add Net and the Summary row.
 
-        if book_type == "B Book" and is_excluded:
-            continue
+    With `fixed_point` the sums are int64 ten-thousandths; Net and the Summary row are
+    computed exactly and the table is returned in USD.
+    """
+    is_excluded = isin_logins(df_out["Login"].to_numpy(dtype=np.int64), as_login_array(excluded))
+    df_out["Login"] = df_out["Login"].astype(str)
+    if book_type == "B Book":
+        df_out = df_out[~is_excluded].reset_index(drop=True)
+    elif book_type in ["A Book", "Multi Book"]:
+        df_out.loc[is_excluded, ["Commission", "TP Profit", "Broker Profit"]] = 0
+    df_out["Net"] = df_out["Trader Profit"] + df_out["Swaps"] - df_out["Commission"]
 
-        comm, tp, bk = (0, 0, 0) if is_excluded and book_type in ["A Book", "Multi Book"] else (group["Commission"].sum(), group["TP broker profit"].sum(), group["Total broker profit"].sum())
-
-        rec = {
-            "Login": login_str,
-            "Total Volume": group["Notional volume in USD"].sum(),
-            "Trader Profit": group["Trader profit"].sum(),
-            "Swaps": group["Swaps"].sum(),
-            "Commission": comm,
-            "TP Profit": tp,
-            "Broker Profit": bk
-        }
-        rec["Net"] = rec["Trader Profit"] + rec["Swaps"] - rec["Commission"]
-        rows.append(rec)
-
-    df_out = pd.DataFrame(rows)
     if not df_out.empty:
-        summary = {c: round4(df_out[c].sum()) for c in df_out.columns if c != "Login"}
-        summary["Login"] = "Summary"
-        return pd.concat([df_out, pd.DataFrame([summary])], ignore_index=True)
-    return df_out
+        return _from_fixed(_append_summary_row(df_out)) if fixed_point else _append_summary_row(df_out)
+    return pd.DataFrame()
 
-def generate_chinese_clients(enriched_books: dict, excluded: set) -> pd.DataFrame:
-    """Generate analysis for Chinese clients, excluding specified accounts."""
-    chinese_prefixes = ['real\\Chines', 'BBOOK\\Chines']
-    chinese_summary = {}
+def _finish_chinese(df_chinese: pd.DataFrame, fixed_point: bool = False) -> pd.DataFrame:
+    """Round per-login Chinese client sums (int64 Login) and add Net and the Summary row."""
+    if df_chinese.empty:
+        return pd.DataFrame(columns=["Login", *BOOK_AGGREGATES, "Net"])
+    df_chinese["Login"] = df_chinese["Login"].astype(str)
+    df_chinese["Net"] = df_chinese["Trader Profit"] + df_chinese["Swaps"] - df_chinese["Commission"]
+    values = list(BOOK_AGGREGATES) + ["Net"]
+    if fixed_point:
+        return _from_fixed(_append_summary_row(df_chinese.reset_index(drop=True)))
+    df_chinese[values] = df_chinese[values].round(4)
+    return _append_summary_row(df_chinese.reset_index(drop=True))
 
-    for book_name, df in enriched_books.items():
-        if df.empty:
-            continue
-
-        required_cols = ["Login", "Group", "Notional volume in USD", "Trader profit", "Swaps", "Commission", "TP broker profit", "Total broker profit"]
-        if not all(col in df.columns for col in required_cols):
-            continue
+def _from_fixed(df_out: pd.DataFrame) -> pd.DataFrame:
+    """Turn the int64 ten-thousandths of a result table (Summary row included) into USD."""
+    values = [c for c in [*BOOK_AGGREGATES, "Net"] if c in df_out.columns]
+    return df_out.assign(**{c: df_out[c].to_numpy(dtype=float) / MONEY_SCALE for c in values})
 
-        for _, row in df.iterrows():
-            login = str(int(row["Login"])).strip() if pd.notna(row["Login"]) else ""
-            group = str(row["Group"]).strip()
+def aggregate_book(df: pd.DataFrame, excluded: set[str], book_type: str) -> pd.DataFrame:
+    """Aggregate book data, applying specific exclusion logic based on book type."""
+    if df.empty:
+        return pd.DataFrame()
 
-            if not login or login in excluded or not any(group.startswith(prefix) for prefix in chinese_prefixes):
-                continue
+    # The numeric columns are cleaned in place, as callers have always relied on
+    sanitized = _sanitize_book(df)
+    for col in BOOK_AGGREGATES.values():
+        df[col] = sanitized[col]
 
-            if login not in chinese_summary:
-                chinese_summary[login] = {"Total Volume": 0, "Trader Profit": 0, "Swaps": 0, "Commission": 0, "TP Profit": 0, "Broker Profit": 0}
+    keys, valid = login_keys(df["Login"])
+    df_out = df[valid].groupby(pd.Series(keys[valid], index=df.index[valid], name="Login")).agg(
+        **{name: (col, "sum") for name, col in BOOK_AGGREGATES.items()}
+    ).reset_index()
+    return _finish_book(df_out, excluded, book_type)
 
-            chinese_summary[login]["Total Volume"] += float(row["Notional volume in USD"] or 0)
-            chinese_summary[login]["Trader Profit"] += float(row["Trader profit"] or 0)
-            chinese_summary[login]["Swaps"] += float(row["Swaps"] or 0)
-            chinese_summary[login]["Commission"] += float(row["Commission"] or 0)
-            chinese_summary[login]["TP Profit"] += float(row["TP broker profit"] or 0)
-            chinese_summary[login]["Broker Profit"] += float(row["Total broker profit"] or 0)
+def is_chinese_group(groups: pd.Series, rules=None) -> np.ndarray:
+    """Boolean mask of the Group values in the Chinese segment of `rules` (deal_rules() by default)."""
+    return chinese_deals(groups.to_frame("Group"), rules)
 
-    if not chinese_summary:
-        return pd.DataFrame(columns=["Login", "Total Volume", "Trader Profit", "Swaps", "Commission", "TP Profit", "Broker Profit", "Net"])
+def chinese_deals(deals: pd.DataFrame, rules=None) -> np.ndarray:
+    """Boolean mask of the deals in the Chinese segment of `rules` (deal_rules() by default)."""
+    return (rules or deal_rules()).segment_mask(deals, CHINESE_SEGMENT)
 
-    rows = []
-    for login, data in chinese_summary.items():
-        net = data["Trader Profit"] + data["Swaps"] - data["Commission"]
-        rows.append({"Login": login, **{k: round4(v) for k, v in data.items()}, "Net": round4(net)})
+def generate_chinese_clients(enriched_books: dict, excluded: set, rules=None) -> pd.DataFrame:
+    """Generate analysis for Chinese clients, excluding specified accounts.
 
-    df_chinese = pd.DataFrame(rows)
+    A deal belongs to a Chinese client when it is in the Chinese segment of `rules`
+    (a RuleSet; deal_rules() by default).
+    """
+    rules = rules or deal_rules()
+    required_cols = ["Login", *BOOK_AGGREGATES.values()]
+    frames = [
+        df[[*required_cols, *(c for c in rules.columns if c in df.columns and c not in required_cols)]]
+        for df in enriched_books.values()
+        if not df.empty and all(col in df.columns for col in required_cols)
+    ]
+    if not frames:
+        return _finish_chinese(pd.DataFrame())
+    deals = pd.concat(frames, ignore_index=True)
 
-    if not df_chinese.empty:
-        summary = {col: round4(df_chinese[col].sum()) for col in df_chinese.columns if col != "Login"}
-        summary["Login"] = "Summary"
-        df_chinese = pd.concat([df_chinese, pd.DataFrame([summary])], ignore_index=True)
+    keys, valid = login_keys(deals["Login"])
+    mask = chinese_deals(deals, rules) & valid & ~isin_logins(keys, as_login_array(excluded))
 
-    return df_chinese
+    # groupby(sort=False) keeps logins in order of first appearance across the books
+    df_chinese = deals.loc[mask, list(BOOK_AGGREGATES.values())].astype(float).groupby(
+        pd.Series(keys[mask], index=deals.index[mask], name="Login"), sort=False
+    ).agg(**{name: (col, "sum") for name, col in BOOK_AGGREGATES.items()}).reset_index()
+    return _finish_chinese(df_chinese)
 
 def generate_client_summary(results: dict) -> pd.DataFrame:
     """Generate a consolidated client summary across all books."""
-    all_clients = {}
-    for book_name, df in results.items():
-        if df.empty:
-            continue
-        client_data = df[df["Login"] != "Summary"].copy()
-        for _, row in client_data.iterrows():
-            login = row["Login"]
-            if login not in all_clients:
-                all_clients[login] = {"Total Volume": 0, "Trader Profit": 0, "Swaps": 0, "Commission": 0, "TP Profit": 0, "Broker Profit": 0, "Net": 0}
-            for col in all_clients[login]:
-                all_clients[login][col] += float(row.get(col, 0) or 0)
-
-    if not all_clients:
+    frames = [df[df["Login"] != "Summary"] for df in results.values() if not df.empty]
+    if not frames:
         return pd.DataFrame()
 
-    df_summary = pd.DataFrame([{ "Login": login, **{k: round4(v) for k, v in data.items()} } for login, data in all_clients.items()])
-
-    if not df_summary.empty:
-        summary = {col: round4(df_summary[col].sum()) for col in df_summary.columns if col != "Login"}
-        summary["Login"] = "Summary"
-        df_summary = pd.concat([df_summary, pd.DataFrame([summary])], ignore_index=True)
-
-    return df_summary
+    values = [*BOOK_AGGREGATES, "Net"]
+    clients = pd.concat(frames, ignore_index=True).reindex(columns=["Login", *values], fill_value=0)
+    df_summary = clients.groupby("Login", sort=False)[values].sum().round(4).reset_index()
+    return _append_summary_row(df_summary)
 
 def calculate_vip_volume(enriched_books: dict, vip_clients: set, excluded: set) -> float:
     """Calculate the total volume for VIP clients, excluding specified accounts."""
-    total_vip_volume = 0
-    for book_name, df in enriched_books.items():
+    vip_logins, excluded_logins = as_login_array(vip_clients), as_login_array(excluded)
+    total_vip_volume = 0.0
+    for df in enriched_books.values():
         if df.empty or "Login" not in df.columns or "Notional volume in USD" not in df.columns:
             continue
-        for _, row in df.iterrows():
-            login = str(int(row["Login"])).strip() if pd.notna(row["Login"]) else ""
-            if login and login in vip_clients and login not in excluded:
-                total_vip_volume += float(row["Notional volume in USD"] or 0)
+        keys, valid = login_keys(df["Login"])
+        mask = valid & isin_logins(keys, vip_logins) & ~isin_logins(keys, excluded_logins)
+        total_vip_volume += float(df.loc[mask, "Notional volume in USD"].astype(float).sum())
     return total_vip_volume
 
-def generate_final_calculations(results: dict, chinese_df: pd.DataFrame, vip_volume: float, date_range: str = "") -> pd.DataFrame:
-    """Generate the final summary calculations table."""
-    def get_sum(book_name, column):
-        if book_name not in results or results[book_name].empty: return 0
-        summary_row = results[book_name][results[book_name]["Login"] == "Summary"]
-        return float(summary_row[column].iloc[0] or 0) if not summary_row.empty else 0
+# ─── Partial Aggregates ──────────────────────────────────────────────────────
 
+PARTIAL_KEYS = ["Book", "Login", "Chinese"]
+PARTIAL_COLUMNS = [*PARTIAL_KEYS, *BOOK_AGGREGATES, "First Row"]
+
+def build_deal_partials(enriched_books: dict, rules=None, fixed_point: bool = False) -> pd.DataFrame:
+    """Collapse sanitized books into per-(Book, Login, Chinese) sums with a single groupby.
+
+    Exclusion and VIP status are not applied here, so the table can be reused when
+    those lists change. 'First Row' is the position of the key's first deal and
+    restores first-appearance ordering after the table is merged or re-sorted.
+    With `fixed_point` the sums are int64 ten-thousandths (see to_fixed).
+    """
+    frames = []
+    for name, df in enriched_books.items():
+        if df.empty:
+            continue
+        keys, valid = login_keys(df["Login"])
+        chinese = chinese_deals(df, rules)
+        frames.append(pd.DataFrame({
+            "Book": pd.Categorical.from_codes(np.full(int(valid.sum()), BOOK_NAMES.index(name)), BOOK_NAMES),
+            "Login": keys[valid],
+            "Chinese": chinese[valid],
+            **{out: _amounts(df, col, fixed_point)[valid] for out, col in BOOK_AGGREGATES.items()},
+        }))
+    if not frames:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+
+    deals = pd.concat(frames, ignore_index=True)
+    deals["First Row"] = np.arange(len(deals))
+    return deals.groupby(PARTIAL_KEYS, sort=False, observed=True).agg(
+        **{col: (col, "sum") for col in BOOK_AGGREGATES},
+        **{"First Row": ("First Row", "min")},
+    ).reset_index()
+
+def report_from_partials(partials: pd.DataFrame, excluded, vip, date_range: str = "", diagnostics: PipelineDiagnostics = None) -> dict:
+    """Derive the book results, Chinese Clients, Client Summary, VIP volume and Final
+    Calculations of run_report_processing from a partial-aggregate table."""
+    diagnostics = diagnostics or PipelineDiagnostics(enabled=False)
+    excluded, vip = as_login_array(excluded), as_login_array(vip)
+    values = list(BOOK_AGGREGATES)
+    fixed_point = is_fixed(partials)
+    logins = partials["Login"].to_numpy(dtype=np.int64)
+    is_excluded = isin_logins(logins, excluded)
+
+    with diagnostics.stage("aggregate", len(partials)) as stage:
+        results = {}
+        for name in BOOK_NAMES:
+            book = partials[(partials["Book"] == name).to_numpy(dtype=bool)]
+            per_login = book.groupby("Login")[values].sum().reset_index()
+            results[name] = _finish_book(per_login, excluded, name, fixed_point) if not book.empty else pd.DataFrame()
+        stage["Rows Out"] = sum(len(df) for df in results.values())
+
+    with diagnostics.stage("segments", len(partials)) as stage:
+        chinese = partials[partials["Chinese"].to_numpy(dtype=bool) & ~is_excluded]
+        chinese = chinese.sort_values("First Row", kind="stable")
+        chinese_clients = _finish_chinese(chinese.groupby("Login", sort=False)[values].sum().reset_index(), fixed_point)
+        client_summary = generate_client_summary(results)
+        vip_volume = float(partials.loc[isin_logins(logins, vip) & ~is_excluded, "Total Volume"].sum())
+        if fixed_point:
+            vip_volume /= MONEY_SCALE
+        stage["Rows Out"] = len(chinese_clients) + len(client_summary)
+
+    with diagnostics.stage("final calcs") as stage:
+        final_calculations = generate_final_calculations(results, chinese_clients, vip_volume, date_range)
+        stage["Rows Out"] = len(final_calculations)
+
+    return {
+        "A Book Result": results["A Book"],
+        "B Book Result": results["B Book"],
+        "Multi Book Result": results["Multi Book"],
+        "Chinese Clients": chinese_clients,
+        "Client Summary": client_summary,
+        "Final Calculations": final_calculations,
+        "VIP Volume": vip_volume,
+    }
+
+def _final_sections(get_sum, vip_volume) -> list:
+    """
+    The Final Calculations as (title, has header row, [(source, description, value), ...]) sections.
+
+    `get_sum(table, column)` returns the Summary value of a book or of the Chinese
+    Clients table; values may be scalars or per-period arrays, since the formulas are
+    plain arithmetic.
+    """
     a_book_commission = get_sum("A Book", "Commission")
     a_book_tp = get_sum("A Book", "TP Profit")
     multi_commission = get_sum("Multi Book", "Commission")
@@ -254,80 +619,437 @@ def generate_final_calculations(results: dict, chinese_df: pd.DataFrame, vip_vol
     a_book_lot = (a_book_volume + multi_volume) / 200000
     b_book_lot = b_book_volume / 200000
 
-    chinese_volume = get_sum("Chinese Clients", "Total Volume") if not chinese_df.empty else 0
-    chinese_lot = chinese_volume / 200000
+    chinese_lot = get_sum("Chinese Clients", "Total Volume") / 200000
     vip_lot = vip_volume / 200000
     retail_lot = a_book_lot + b_book_lot - chinese_lot - vip_lot
     total_lot = a_book_lot + b_book_lot
 
+    return [
+        ("A BOOK SUMMARY", True, [
+            ("A Book Result", "Sum of TP Broker Profit + Commission", a_book_tp + a_book_commission),
+            ("Multi Book Result", "Sum of TP Broker Profit + Commission", multi_tp + multi_commission),
+            ("Total A Book", "Sum of above two values", a_book_total),
+        ]),
+        ("B BOOK SUMMARY", True, [
+            ("B Book Result", "(-1) * Sum of (Trader + Swaps - Commission)", b_book_tsm),
+            ("Multi Book Result", "Total Broker Profit - TP Broker Profit", b_book_extra),
+            ("Total B Book", "Sum of above two values", b_book_total),
+        ]),
+        ("EXTRA SUMMARY DATA", False, [
+            ("A Book", "Client's Spread (TP Broker Profit)", a_book_tp + multi_tp),
+            ("A Book", "Client's Commission", a_book_commission + multi_commission),
+            ("Total Swap", "Sum of all Swaps", total_swaps),
+            ("A Book", "Volume (Lot)", a_book_lot),
+            ("B Book", "Volume (Lot)", b_book_lot),
+            ("Chinese Clients", "Volume (Lot)", chinese_lot),
+            ("VIP Clients", "Volume (Lot)", vip_lot),
+            ("Retail Clients", "Volume (Lot)", retail_lot),
+            ("Total Volume", "A Book + B Book", total_lot),
+        ]),
+    ]
+
+def _final_table(get_sum, vip_volume, date_range: str = "") -> pd.DataFrame:
+    """The Final Calculations table of _final_sections with scalar values."""
     calculations = []
     if date_range:
         calculations.extend([["DATE RANGE", "", date_range], ["", "", ""]])
 
-    calculations.extend([
-        ["A BOOK SUMMARY", "", ""], ["Source", "Description", "Value"],
-        ["A Book Result", "Sum of TP Broker Profit + Commission", round4(a_book_tp + a_book_commission)],
-        ["Multi Book Result", "Sum of TP Broker Profit + Commission", round4(multi_tp + multi_commission)],
-        ["Total A Book", "Sum of above two values", round4(a_book_total)],
-        ["", "", ""],
-        ["B BOOK SUMMARY", "", ""], ["Source", "Description", "Value"],
-        ["B Book Result", "(-1) * Sum of (Trader + Swaps - Commission)", round4(b_book_tsm)],
-        ["Multi Book Result", "Total Broker Profit - TP Broker Profit", round4(b_book_extra)],
-        ["Total B Book", "Sum of above two values", round4(b_book_total)],
-        ["", "", ""],
-        ["EXTRA SUMMARY DATA", "", ""],
-        ["A Book", "Client's Spread (TP Broker Profit)", round4(a_book_tp + multi_tp)],
-        ["A Book", "Client's Commission", round4(a_book_commission + multi_commission)],
-        ["Total Swap", "Sum of all Swaps", round4(total_swaps)],
-        ["A Book", "Volume (Lot)", round4(a_book_lot)],
-        ["B Book", "Volume (Lot)", round4(b_book_lot)],
-        ["Chinese Clients", "Volume (Lot)", round4(chinese_lot)],
-        ["VIP Clients", "Volume (Lot)", round4(vip_lot)],
-        ["Retail Clients", "Volume (Lot)", round4(retail_lot)],
-        ["Total Volume", "A Book + B Book", round4(total_lot)]
-    ])
+    for i, (title, header, lines) in enumerate(_final_sections(get_sum, vip_volume)):
+        if i:
+            calculations.append(["", "", ""])
+        calculations.append([title, "", ""])
+        if header:
+            calculations.append(["Source", "Description", "Value"])
+        calculations.extend([source, description, round4(value)] for source, description, value in lines)
 
     return pd.DataFrame(calculations, columns=["Source", "Description", "Value"])
 
-def run_report_processing(deals_df: pd.DataFrame, excluded_df: pd.DataFrame, vip_df: pd.DataFrame, start_date: str = None, end_date: str = None):
+def generate_final_calculations(results: dict, chinese_df: pd.DataFrame, vip_volume: float, date_range: str = "") -> pd.DataFrame:
+    """Generate the final summary calculations table."""
+    tables = {**results, "Chinese Clients": chinese_df}
+
+    def get_sum(book_name, column):
+        if book_name not in tables or tables[book_name].empty: return 0
+        summary_row = tables[book_name][tables[book_name]["Login"] == "Summary"]
+        return float(summary_row[column].iloc[0] or 0) if not summary_row.empty else 0
+
+    return _final_table(get_sum, vip_volume, date_range)
+
+def build_report_partials(deals_df: pd.DataFrame, start_date: str = None, end_date: str = None, money_columns: list[str] = None,
+                          rules=None, diagnostics: PipelineDiagnostics = None,
+                          fixed_point: bool = False) -> tuple[dict, pd.DataFrame, int]:
     """
-    Main orchestrator function to run the entire report generation process.
+    The deals-only part of run_report_processing: returns the enriched (Raw) books, the
+    pre-exclusion partial aggregates and the number of deals dropped for a malformed Login.
     """
-    # 1. Load sets for excluded and vip clients
-    excluded_logins = set(excluded_df.iloc[:, 0].astype(str).str.strip()) if not excluded_df.empty else set()
-    vip_logins = set(vip_df.iloc[:, 0].astype(str).str.strip()) if not vip_df.empty else set()
+    diag = diagnostics or PipelineDiagnostics(enabled=False)
+    with diag:
+        enriched, malformed_logins = enrich_books(deals_df, start_date, end_date, money_columns, rules, diag)
+        rows = sum(len(df) for df in enriched.values())
 
-    # 2. Process and split the main deals dataframe
-    books = process_and_split(deals_df)
-    enriched = {k: enrich_and_dedupe(v) for k, v in books.items()}
+        # 4. One scan over the filtered deals builds the partial aggregates every analysis derives from
+        with diag.stage("partials", rows) as stage:
+            counters = {}
+            enriched = {k: _sanitize_book(v, counters) if not v.empty else v for k, v in enriched.items()}
+            partials = build_deal_partials(enriched, rules, fixed_point)
+            stage["Rows Out"] = len(partials)
+            stage["Coerced"], stage["Rejected"] = counters.get("coerced", 0), counters.get("rejected", 0)
+            stage["Missing"] = counters.get("missing", 0)
+    return enriched, partials, malformed_logins
 
-    # 3. Apply date filtering if enabled
-    date_range_str = ""
-    if start_date and end_date:
-        date_range_str = f"From {start_date} to {end_date}"
-        for k in enriched:
-            enriched[k] = filter_by_date_range(enriched[k], start_date, end_date)
+def enrich_books(deals_df: pd.DataFrame, start_date: str = None, end_date: str = None, money_columns: list[str] = None,
+                 rules=None, diagnostics: PipelineDiagnostics = None) -> tuple[dict, int]:
+    """
+    The enriched, deduplicated and date-filtered books of build_report_partials, before
+    sanitizing. Returns (books, deals dropped for a malformed Login).
+    """
+    diag = diagnostics or PipelineDiagnostics(enabled=False)
+    with diag:
+        # 1. Canonical int64 logins
+        deals_df, malformed_logins = normalize_logins(deals_df)
 
-    # 4. Generate all analyses
-    results = {
-        book_name: aggregate_book(book_data, excluded_logins, book_name)
-        for book_name, book_data in enriched.items()
-    }
+        # 2. Process and split the main deals dataframe
+        with diag.stage("USC conversion", len(deals_df)) as stage:
+            deals_df = convert_money_columns(deals_df, money_columns)
+            stage["Rows Out"] = len(deals_df)
+        with diag.stage("split", len(deals_df)) as stage:
+            books = split_books(deals_df, rules)
+            stage["Rows Out"] = sum(len(df) for df in books.values())
+        with diag.stage("enrich", stage["Rows Out"]) as stage:
+            enriched = {k: enrich_and_dedupe(v) for k, v in books.items()}
+            stage["Rows Out"] = sum(len(df) for df in enriched.values())
 
-    chinese_clients = generate_chinese_clients(enriched, excluded_logins)
-    client_summary = generate_client_summary(results)
-    vip_volume = calculate_vip_volume(enriched, vip_logins, excluded_logins)
-    final_calculations = generate_final_calculations(results, chinese_clients, vip_volume, date_range_str)
+        # 3. Apply date filtering if enabled
+        with diag.stage("filter", stage["Rows Out"]) as stage:
+            if start_date and end_date:
+                for k in enriched:
+                    enriched[k] = filter_by_date_range(enriched[k], start_date, end_date)
+            stage["Rows Out"] = sum(len(df) for df in enriched.values())
+    return enriched, malformed_logins
 
-    return {
-        "A Book Raw": enriched.get("A Book", pd.DataFrame()),
-        "B Book Raw": enriched.get("B Book", pd.DataFrame()),
-        "Multi Book Raw": enriched.get("Multi Book", pd.DataFrame()),
-        "A Book Result": results.get("A Book", pd.DataFrame()),
-        "B Book Result": results.get("B Book", pd.DataFrame()),
-        "Multi Book Result": results.get("Multi Book", pd.DataFrame()),
-        "Chinese Clients": chinese_clients,
-        "Client Summary": client_summary,
-        "Final Calculations": final_calculations,
-        "VIP Volume": vip_volume
+def date_range_label(start_date=None, end_date=None) -> str:
+    """The 'Date Range' line of the Final Calculations."""
+    return f"From {start_date} to {end_date}" if start_date and end_date else ""
+
+# ─── Time Rollups ────────────────────────────────────────────────────────────
+
+GRANULARITIES = ("daily", "weekly", "monthly")
+DAILY_KEYS = ["Day", *PARTIAL_KEYS]
+ROLLUP_COLUMNS = ["Granularity", "Period", "Source", "Description", "Value"]
+DAY_NS = 86_400 * 10**9
+
+def build_daily_partials(enriched_books: dict, rules=None, fixed_point: bool = False) -> pd.DataFrame:
+    """Per-(Day, Book, Login, Chinese) sums of sanitized books in one groupby.
+
+    Days are UTC calendar days of DEAL_TIME_COL; deals without a deal time belong
+    to no day and are left out. Exclusion and VIP status are not applied here.
+    """
+    frames = []
+    for name, df in enriched_books.items():
+        if df.empty or DEAL_TIME_COL not in df.columns:
+            continue
+        keys, valid = login_keys(df["Login"])
+        stamps = df[DEAL_TIME_COL].array.asi8
+        valid &= stamps != np.iinfo(np.int64).min
+        chinese = chinese_deals(df, rules)
+        frames.append(pd.DataFrame({
+            "Day": (stamps[valid] // DAY_NS * 86_400).astype("datetime64[s]"),
+            "Book": pd.Categorical.from_codes(np.full(int(valid.sum()), BOOK_NAMES.index(name)), BOOK_NAMES),
+            "Login": keys[valid],
+            "Chinese": chinese[valid],
+            **{out: _amounts(df, col, fixed_point)[valid] for out, col in BOOK_AGGREGATES.items()},
+        }))
+    if not frames:
+        return pd.DataFrame(columns=[*DAILY_KEYS, *BOOK_AGGREGATES])
+    return pd.concat(frames, ignore_index=True).groupby(DAILY_KEYS, sort=False, observed=True).sum().reset_index()
+
+def period_labels(days: np.ndarray, granularity: str) -> np.ndarray:
+    """Label datetime64 days with their period: the day, the Monday starting its week, or its month."""
+    days = np.asarray(days).astype("datetime64[D]")
+    if granularity == "daily":
+        return np.datetime_as_string(days, unit="D")
+    if granularity == "weekly":
+        # 1970-01-01 was a Thursday, so weeks start on days where (day + 3) % 7 == 0
+        offsets = (days.astype(np.int64) + 3) % 7
+        return np.datetime_as_string(days - offsets.astype("timedelta64[D]"), unit="D")
+    if granularity == "monthly":
+        return np.datetime_as_string(days.astype("datetime64[M]"), unit="M")
+    raise ValueError(f"Unknown granularity '{granularity}'. Use one of: {', '.join(GRANULARITIES)}.")
+
+def rollup_partials(daily: pd.DataFrame, granularities=GRANULARITIES) -> pd.DataFrame:
+    """Roll per-day partials up to per-(Granularity, Period, Book, Login, Chinese) sums."""
+    frames = []
+    day_codes, days = pd.factorize(daily["Day"])
+    for granularity in granularities:
+        # Label each distinct day once
+        periods = period_labels(np.asarray(days), granularity)[day_codes]
+        rolled = daily.groupby([pd.Series(periods, name="Period"), *(daily[k] for k in PARTIAL_KEYS)],
+                               sort=False, observed=True)[list(BOOK_AGGREGATES)].sum().reset_index()
+        frames.append(rolled.assign(Granularity=granularity))
+    if not frames or daily.empty:
+        return pd.DataFrame(columns=["Granularity", "Period", *PARTIAL_KEYS, *BOOK_AGGREGATES])
+    return pd.concat(frames, ignore_index=True)[["Granularity", "Period", *PARTIAL_KEYS, *BOOK_AGGREGATES]]
+
+def _book_sums(partials: pd.DataFrame, keys: list[str], excluded, vip) -> tuple[pd.DataFrame, pd.Series]:
+    """
+    Per-`keys` sums of each book after the exclusion rules of report_from_partials,
+    with (aggregate or 'Net', book) columns plus the Chinese Clients volume as
+    ('Total Volume', 'Chinese Clients'), and the VIP volume; both are indexed by every
+    key value in `partials`, sorted.
+    """
+    excluded, vip = as_login_array(excluded), as_login_array(vip)
+    logins = partials["Login"].to_numpy(dtype=np.int64)
+    is_excluded = isin_logins(logins, excluded)
+    b_book = (partials["Book"] == "B Book").to_numpy(dtype=bool)
+
+    # _finish_book drops excluded B Book logins and zeroes the broker side of excluded A/Multi Book logins
+    amounts = partials[list(BOOK_AGGREGATES)]
+    amounts = amounts.astype(np.int64 if is_fixed(partials) else float)
+    amounts.loc[is_excluded & ~b_book, ["Commission", "TP Profit", "Broker Profit"]] = 0
+    amounts["Net"] = amounts["Trader Profit"] + amounts["Swaps"] - amounts["Commission"]
+    keep = ~(is_excluded & b_book)
+    if len(keys) > 1:
+        index = pd.MultiIndex.from_frame(partials[keys]).unique().sort_values()
+    else:
+        index = pd.Index(partials[keys[0]].unique(), name=keys[0]).sort_values()
+    groups = [partials[k] for k in keys]
+
+    sums = amounts[keep].groupby([g[keep] for g in groups] + [partials["Book"][keep]], observed=True).sum()
+    sums = sums.unstack("Book").reindex(index, fill_value=0).fillna(0)
+    # Chinese Clients drop excluded logins from every book, as in generate_chinese_clients
+    chinese = partials["Chinese"].to_numpy(dtype=bool) & ~is_excluded
+    chinese_volume = amounts["Total Volume"][chinese].groupby([g[chinese] for g in groups]).sum()
+    sums.columns = sums.columns.set_levels(sums.columns.levels[1].astype(object), level=1)
+    sums[("Total Volume", "Chinese Clients")] = chinese_volume.reindex(index, fill_value=0).to_numpy()
+    vip_mask = isin_logins(logins, vip) & ~is_excluded
+    vip_volume = amounts["Total Volume"][vip_mask].groupby([g[vip_mask] for g in groups]).sum()
+    return sums, vip_volume.reindex(index, fill_value=0)
+
+def period_calculations(period_partials: pd.DataFrame, excluded, vip) -> pd.DataFrame:
+    """
+    Every Final Calculations line for every period of `period_partials`, as a long
+    table of ROLLUP_COLUMNS. Exclusion and VIP rules match report_from_partials.
+    """
+    if period_partials.empty:
+        return pd.DataFrame(columns=ROLLUP_COLUMNS)
+    sums, vip_volume = _book_sums(period_partials, ["Granularity", "Period"], excluded, vip)
+    if is_fixed(period_partials):
+        sums, vip_volume = sums / MONEY_SCALE, vip_volume / MONEY_SCALE
+    # Each book's Summary row is rounded before the Final Calculations use it
+    sums, vip_volume, periods = sums.round(4), vip_volume.to_numpy(dtype=float), sums.index
+
+    def get_sum(book_name, column):
+        if (column, book_name) not in sums.columns:
+            return np.zeros(len(periods))
+        return sums[(column, book_name)].to_numpy()
+
+    frames = [
+        pd.DataFrame({
+            "Granularity": periods.get_level_values(0), "Period": periods.get_level_values(1),
+            "Source": source, "Description": description, "Value": np.round(value, 4), "Line": line,
+        })
+        for line, (source, description, value) in enumerate(
+            line for _, _, lines in _final_sections(get_sum, vip_volume) for line in lines
+        )
+    ]
+    rollups = pd.concat(frames, ignore_index=True)
+    order = {g: i for i, g in enumerate(pd.unique(period_partials["Granularity"]))}
+    rollups = rollups.sort_values(["Granularity", "Period", "Line"], key=lambda c: c.map(order) if c.name == "Granularity" else c)
+    return rollups[ROLLUP_COLUMNS].reset_index(drop=True)
+
+def window_days(start_date, end_date) -> tuple[np.datetime64, np.datetime64]:
+    """First and last UTC day of a window; bounds are 'dd.mm.yyyy' or 'dd.mm.yyyy hh:mm:ss' strings or datetimes."""
+    days = []
+    for value in (start_date, end_date):
+        if isinstance(value, str) and len(value.strip()) == 10:
+            value = value.strip() + " 00:00:00"
+        ts = _as_utc(value)
+        if pd.isna(ts):
+            raise ValueError(f"Invalid window date '{value}'. Please use 'dd.mm.yyyy' or 'dd.mm.yyyy hh:mm:ss'")
+        days.append(np.datetime64(ts.tz_localize(None).date(), "D"))
+    if days[0] > days[1]:
+        raise ValueError(f"Window starts after it ends: {start_date} to {end_date}")
+    return days[0], days[1]
+
+def day_bounds(first, last) -> tuple[str, str]:
+    """'dd.mm.yyyy hh:mm:ss' bounds of the whole UTC days `first` to `last`, as a report over them takes them."""
+    return f"{pd.Timestamp(first):%d.%m.%Y} 00:00:00", f"{pd.Timestamp(last):%d.%m.%Y} 23:59:59"
+
+def window_calculations(daily: pd.DataFrame, windows, excluded, vip) -> list[pd.DataFrame]:
+    """
+    The Final Calculations table of generate_final_calculations for each (start, end)
+    window over per-day partials. Windows cover whole UTC days from the start date to
+    the end date, times of day included, and are labelled with those days (day_bounds),
+    so each table is the report run over its label's bounds.
+
+    Book sums are accumulated over the sorted days once, so each window is the
+    difference of two prefix-sum rows: O(days + windows) whatever the window lengths.
+    Fixed-point partials keep the prefix sums in int64, so the differences are exact.
+    """
+    if daily.empty:
+        sums, vip_volume = pd.DataFrame(), pd.Series(dtype=float)
+    else:
+        sums, vip_volume = _book_sums(daily, ["Day"], excluded, vip)
+    scale, dtype = (MONEY_SCALE, np.int64) if is_fixed(daily) else (1, float)
+    days = sums.index.to_numpy().astype("datetime64[D]")
+    # A leading zero row makes the total of days [lo, hi) totals[hi] - totals[lo]
+    totals = np.vstack([np.zeros((1, sums.shape[1]), dtype=dtype), np.cumsum(sums.to_numpy(dtype=dtype), axis=0)])
+    vip_totals = np.concatenate([[0], np.cumsum(vip_volume.to_numpy(dtype=dtype))]).astype(dtype)
+
+    tables = []
+    for start_date, end_date in windows:
+        first, last = window_days(start_date, end_date)
+        lo, hi = np.searchsorted(days, first, "left"), np.searchsorted(days, last, "right")
+        # Each book's Summary row is rounded before the Final Calculations use it
+        window = pd.Series((totals[hi] - totals[lo]) / scale, index=sums.columns, dtype=float).round(4)
+
+        def get_sum(book_name, column, window=window):
+            return float(window.get((column, book_name), 0.0))
+
+        tables.append(_final_table(get_sum, (vip_totals[hi] - vip_totals[lo]) / scale, date_range_label(*day_bounds(first, last))))
+    return tables
+
+def rollup_tables(rollups: pd.DataFrame) -> dict[str, pd.DataFrame]:
+    """One wide table per granularity ('Daily Rollup', ...): a row per Final Calculations line, a column per period."""
+    tables = {}
+    for granularity, rows in rollups.groupby("Granularity", sort=False):
+        lines = pd.MultiIndex.from_frame(rows[["Source", "Description"]]).unique()
+        table = rows.set_index(["Source", "Description", "Period"])["Value"].unstack("Period").reindex(lines)
+        tables[f"{granularity.title()} Rollup"] = table.reset_index().rename_axis(columns=None)
+    return tables
+
+def build_deal_report(deals, start_date: str = None, end_date: str = None, money_columns: list[str] = None, rules=None,
+                      diagnostics: PipelineDiagnostics = None, workers: int = None, granularities=None,
+                      fixed_point: bool = False, engine: str = "pandas", stream: bool = False,
+                      memory_limit_mb: int = None, chunk_rows: int = None, read_csv_kwargs: dict = None) -> dict:
+    """
+    The deals-only part of run_report_processing, which does not depend on the excluded
+    or VIP list, so it can be kept while only the lists change (see apply_report_lists).
+
+    Returns {"Partials", "Malformed Logins", "Raw", "Daily Partials"}: the pre-exclusion
+    partial aggregates, the enriched books ("Raw", in-memory pandas runs only, else None)
+    and, with `granularities`, the per-day partials the time rollups come from (else None).
+    See run_report_processing for the options.
+    """
+    if engine not in ("pandas", "duckdb"):
+        raise ValueError(f"Unknown engine {engine!r}; use 'pandas' or 'duckdb'.")
+    sharded = engine == "pandas" and not stream and bool(workers and workers > 1)
+    if granularities and (engine == "duckdb" or stream or sharded):
+        raise ValueError("Time rollups need the deals in memory in one process; use the pandas engine "
+                         "with workers=1 on a deals file small enough not to be streamed.")
+
+    diag = diagnostics or PipelineDiagnostics(enabled=False)
+    deal_report = {"Raw": None, "Daily Partials": None}
+    with diag:
+        if engine == "duckdb":
+            from app.duckdb_engine import duckdb_deal_partials
+            with diag.stage("duckdb") as stage:
+                partials, stage["Rows In"], malformed_logins = duckdb_deal_partials(
+                    deals, start_date, end_date, money_columns, rules, workers
+                )
+                stage["Rows Out"] = len(partials)
+        elif stream:
+            from app.streaming import DEFAULT_MEMORY_LIMIT_MB, stream_deal_partials
+            with diag.stage("stream") as stage:
+                partials, stage["Rows In"], malformed_logins = stream_deal_partials(
+                    deals, start_date, end_date, money_columns, rules,
+                    memory_limit_mb or DEFAULT_MEMORY_LIMIT_MB, chunk_rows, fixed_point=fixed_point, **(read_csv_kwargs or {})
+                )
+                stage["Rows Out"] = len(partials)
+        elif sharded:
+            from app.sharding import sharded_deal_partials
+            partials, malformed_logins = sharded_deal_partials(
+                deals, start_date, end_date, money_columns, rules, workers, diag, fixed_point=fixed_point
+            )
+        else:
+            enriched, partials, malformed_logins = build_report_partials(
+                deals, start_date, end_date, money_columns, rules, diag, fixed_point
+            )
+            deal_report["Raw"] = enriched
+            if granularities:
+                with diag.stage("daily partials", len(partials)) as stage:
+                    deal_report["Daily Partials"] = build_daily_partials(enriched, rules, fixed_point)
+                    stage["Rows Out"] = len(deal_report["Daily Partials"])
+    return {"Partials": partials, "Malformed Logins": malformed_logins, **deal_report}
+
+def apply_report_lists(deal_report: dict, excluded, vip, date_range: str = "", granularities=None,
+                       diagnostics: PipelineDiagnostics = None) -> dict:
+    """
+    The report tables of report_from_partials for a build_deal_report result and the
+    excluded and VIP logins, plus the time rollups under "Rollups" when `granularities`
+    are given and the deal report has per-day partials.
+    """
+    diag = diagnostics or PipelineDiagnostics(enabled=False)
+    excluded, vip = as_login_array(excluded), as_login_array(vip)
+    report = report_from_partials(deal_report["Partials"], excluded, vip, date_range, diag)
+    daily = deal_report.get("Daily Partials")
+    if granularities and daily is not None:
+        with diag.stage("rollups", len(daily)) as stage:
+            report["Rollups"] = period_calculations(rollup_partials(daily, granularities), excluded, vip)
+            stage["Rows Out"] = len(report["Rollups"])
+    return report
+
+def run_report_processing(deals_df: pd.DataFrame, excluded_df: pd.DataFrame, vip_df: pd.DataFrame, start_date: str = None, end_date: str = None, money_columns: list[str] = None, rules=None, diagnostics: PipelineDiagnostics = None, workers: int = None, granularities=None,
+                          fixed_point: bool = False, engine: str = "pandas", stream: bool = False, memory_limit_mb: int = None,
+                          chunk_rows: int = None, read_csv_kwargs: dict = None):
+    """
+    Main orchestrator function to run the entire report generation process.
+
+    `rules` (a RuleSet, deal_rules() by default) routes deals to books and marks
+    the Chinese segment.
+
+    Pass a PipelineDiagnostics to record per-stage timings; they are logged and
+    returned under "Diagnostics". With `workers` > 1 the deals are aggregated in
+    that many processes (see app.sharding) and the Raw books are not returned.
+    With `granularities` (e.g. ["daily", "monthly"]) the Final Calculations are also
+    returned per period under "Rollups", as a long table of ROLLUP_COLUMNS.
+    With `fixed_point` amounts are summed as int64 ten-thousandths of a USD, so the
+    totals do not depend on deal order, chunking or sharding.
+
+    engine="duckdb" runs the deals-side work as SQL in DuckDB (see app.duckdb_engine);
+    `deals_df` may then also be a CSV or Parquet path, `workers` sets DuckDB's threads,
+    sums are always fixed-point and the Raw books are not returned.
+
+    With `stream` `deals_df` is a deals CSV that does not fit in memory, read in chunks
+    of `chunk_rows` rows or sized to `memory_limit_mb` (see app.streaming), with
+    `read_csv_kwargs` (e.g. usecols) going to pd.read_csv; the Raw books are not returned.
+    Time rollups need the in-memory pandas path.
+    """
+    diag = diagnostics or PipelineDiagnostics(enabled=False)
+    with diag:
+        deal_report = build_deal_report(deals_df, start_date, end_date, money_columns, rules, diag, workers,
+                                        granularities, fixed_point, engine, stream, memory_limit_mb, chunk_rows, read_csv_kwargs)
+        report = apply_report_lists(deal_report, list_logins(excluded_df), list_logins(vip_df),
+                                    date_range_label(start_date, end_date), granularities, diag)
+
+    raw = deal_report["Raw"]
+    results = {
+        **({f"{name} Raw": raw.get(name, pd.DataFrame()) for name in BOOK_NAMES} if raw is not None else {}),
+        **report,
+        "Malformed Logins": deal_report["Malformed Logins"]
     }
+    if diag.enabled:
+        diag.log()
+        results["Diagnostics"] = diag.stages
+    return results
+
+def run_window_reports(deals_df: pd.DataFrame, excluded_df: pd.DataFrame, vip_df: pd.DataFrame, windows, money_columns: list[str] = None,
+                       rules=None, diagnostics: PipelineDiagnostics = None, fixed_point: bool = False) -> list[pd.DataFrame]:
+    """
+    Final Calculations for each (start, end) window in `windows`, from one pass over
+    the deals instead of one run_report_processing per window (see window_calculations).
+    """
+    diag = diagnostics or PipelineDiagnostics(enabled=False)
+    with diag:
+        excluded_logins, vip_logins = list_logins(excluded_df), list_logins(vip_df)
+        enriched, _ = enrich_books(deals_df, money_columns=money_columns, rules=rules, diagnostics=diag)
+        with diag.stage("daily partials", sum(len(df) for df in enriched.values())) as stage:
+            enriched = {k: _sanitize_book(v) if not v.empty else v for k, v in enriched.items()}
+            daily = build_daily_partials(enriched, rules, fixed_point)
+            stage["Rows Out"] = len(daily)
+        with diag.stage("windows", len(daily)) as stage:
+            tables = window_calculations(daily, windows, excluded_logins, vip_logins)
+            stage["Rows Out"] = len(tables)
+    if diag.enabled:
+        diag.log()
+    return tables
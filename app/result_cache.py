@@ -0,0 +1,102 @@
+"""
+On-disk cache of finished deal reports, shared by every worker process.
+
+Entries are pickles named by the SHA-256 of the report inputs (file contents plus
+parameters). Writes go through a temporary file and an atomic rename, so readers
+in other processes see either the whole entry or none; eviction and the hit/miss
+counters are serialized with an flock on the cache folder's lock file.
+"""
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import pickle
+from contextlib import contextmanager
+
+from app.deal_cache import cache_entries, evict, upload_digest
+from app.file_utils import atomic_write, touch
+
+logger = logging.getLogger(__name__)
+
+# Bump when the report tables change shape so old entries are never served
+REPORT_CACHE_VERSION = 2
+ENTRY_SUFFIX = ".pkl"
+
+def report_key(paths, **params) -> str:
+    """Cache key for a report over the files at `paths` with the given parameters."""
+    digest = hashlib.sha256(f"v{REPORT_CACHE_VERSION}".encode())
+    for path in paths:
+        digest.update(upload_digest(path).encode())
+    digest.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return digest.hexdigest()
+
+class ResultCache:
+    """LRU-by-bytes cache of picklable report results in `folder`."""
+
+    def __init__(self, folder: str, max_mb: int):
+        self.folder = folder
+        self.max_bytes = max_mb * 2**20
+        os.makedirs(folder, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.folder, key + ENTRY_SUFFIX)
+
+    @contextmanager
+    def _locked(self):
+        with open(os.path.join(self.folder, ".lock"), "a+") as fh:
+            fcntl.flock(fh, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(fh, fcntl.LOCK_UN)
+
+    def _count(self, counter: str):
+        with self._locked():
+            stats = self._read_counters()
+            stats[counter] = stats.get(counter, 0) + 1
+            with open(os.path.join(self.folder, "counters.json"), "w") as fh:
+                json.dump(stats, fh)
+
+    def _read_counters(self) -> dict:
+        try:
+            with open(os.path.join(self.folder, "counters.json")) as fh:
+                return json.load(fh)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def get(self, key: str):
+        """The cached value for `key`, or None on a miss."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as fh:
+                value = pickle.load(fh)
+            touch(path)
+        except FileNotFoundError:
+            self._count("misses")
+            return None
+        except Exception as e:  # truncated or stale entry
+            logger.warning("report cache entry %s unreadable: %s", key, e)
+            self._count("misses")
+            return None
+        self._count("hits")
+        return value
+
+    def put(self, key: str, value):
+        """Store `value` under `key`, then evict least recently used entries past the size cap."""
+        with atomic_write(self._path(key)) as fh:
+            pickle.dump(value, fh, protocol=pickle.HIGHEST_PROTOCOL)
+        with self._locked():
+            evict(self.folder, self.max_bytes, ENTRY_SUFFIX)
+
+    def stats(self) -> dict:
+        """Hit/miss counters across all processes plus the current entry count and size."""
+        entries = cache_entries(self.folder, ENTRY_SUFFIX)
+        counters = self._read_counters()
+        return {
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
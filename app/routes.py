@@ -7,7 +7,19 @@ from werkzeug.utils import secure_filename
 from app import db
 from app.models import User, Role, Log, UploadedFiles
 from app.forms import LoginForm, RegistrationForm, DynamicUploadForm, DateRangeForm
-from app.processing import run_report_processing
+from app.processing import (
+    BOOK_NAMES, apply_report_lists, build_deal_report, deal_rules, list_logins, rollup_tables, window_calculations
+)
+from app.rules import load_rules
+from app.diagnostics import PipelineDiagnostics
+from app.deal_cube import build_deal_cube, slice_cube, stream_deal_cube
+from app.deal_loading import REPORT_COLUMNS, csv_report_columns
+from app.deal_cache import cached_deals
+from app.result_cache import ResultCache, report_key
+from app.deal_store import (
+    check_stored_rules, ingest_deals, ingest_deals_csv, store_daily_partials, store_partials, stored_deal_count
+)
+from app.streaming import estimate_chunk_rows
 from app.charts import create_charts, create_stage2_charts
 from app.logger import record_log
 
@@ -20,6 +32,56 @@ from app.stage2_reports_enhanced import generate_final_report, compare_crm_and_c
 
 bp = Blueprint('main', __name__)
 
+def _streams_deals(file_path, file_extension):
+    """Whether a deals upload is too large to load at once and is streamed instead."""
+    return file_extension == 'csv' and \
+        os.path.getsize(file_path) > current_app.config['DEALS_STREAM_THRESHOLD_MB'] * 2**20
+
+def _deal_rules():
+    """The deal rule table: DEAL_RULES_FILE when set, else the built-in rules with CHINESE_GROUP_PREFIXES."""
+    path = current_app.config.get('DEAL_RULES_FILE')
+    if not path:
+        return deal_rules(current_app.config.get('CHINESE_GROUP_PREFIXES'))
+    rules = deal_rules(table=load_rules(path))
+    # Deals are loaded with the report's columns only, so a rule on any other column would never match
+    unloaded = [c for c in rules.columns if c not in REPORT_COLUMNS]
+    if unloaded:
+        raise ValueError(f"DEAL_RULES_FILE rules read columns the deals report does not load: {', '.join(unloaded)}.")
+    return rules
+
+def _store_deals_upload(file_path, file_extension):
+    """Append a deals upload's unseen deals to the current user's deal store; returns the ingest counts."""
+    # The ingest runs inside the upload request, so its size is capped to stay within the request timeout
+    max_mb = current_app.config['DEAL_STORE_MAX_UPLOAD_MB']
+    if os.path.getsize(file_path) > max_mb * 2**20:
+        raise ValueError(f'This deals file is larger than the {max_mb} MB the deal store takes in one upload '
+                         f'(DEAL_STORE_MAX_UPLOAD_MB); upload the export in parts, overlapping deals are stored once.')
+    rules = _deal_rules()
+    index_dir = current_app.config.get('DEAL_INDEX_FOLDER')
+    if _streams_deals(file_path, file_extension):
+        usecols = csv_report_columns(file_path)
+        chunk_rows = estimate_chunk_rows(file_path, current_app.config['DEALS_MEMORY_LIMIT_MB'], usecols=usecols)
+        return ingest_deals_csv(current_user.id, file_path, chunk_rows, rules, index_dir, usecols=usecols)
+    deals_df, _, _ = _load_deals_upload(file_path, file_extension)
+    return ingest_deals(current_user.id, deals_df, rules=rules, index_dir=index_dir)
+
+def _report_cache():
+    """The app's handle on the report cache, which every worker shares on disk."""
+    cache = current_app.extensions.get('report_cache')
+    if cache is None:
+        cache = current_app.extensions['report_cache'] = ResultCache(
+            current_app.config['REPORT_CACHE_FOLDER'], current_app.config['REPORT_CACHE_MAX_MB']
+        )
+    return cache
+
+def _load_deals_upload(file_path, file_extension):
+    """Load a deals upload through the columnar cache; returns (deals, load stats, cache hit)."""
+    return cached_deals(
+        file_path, excel=file_extension == 'xlsx',
+        cache_dir=current_app.config['DEAL_CACHE_FOLDER'],
+        max_mb=current_app.config['DEAL_CACHE_MAX_MB']
+    )
+
 @bp.route('/')
 @bp.route('/index')
 def index():
@@ -131,6 +193,8 @@ def upload_file():
                     file_path=file_path
                 )
                 db.session.add(uploaded_file)
+                # Commit the record first, so a processing step that rolls back keeps the upload
+                db.session.commit()
                 
                 # Process Stage 2 files immediately
                 try:
@@ -159,8 +223,23 @@ def upload_file():
                         processing_results[display_name] = f"Added {result['added_rows']} rows"
                         uploaded_file.processed = True
                         
+                    elif file_type == 'deals':
+                        if current_app.config.get('DEAL_STORE'):
+                            result = _store_deals_upload(file_path, file_extension)
+                            skipped = f", {result['Malformed Logins']} skipped for a missing or malformed Login" \
+                                if result.get('Malformed Logins') else ""
+                            processing_results[display_name] = \
+                                f"Added {result['New Deals']} new deals ({result['Already Stored']} already stored{skipped})"
+                            uploaded_file.processed = True
+                        # Parse once now, so report runs read the columnar cache
+                        elif not _streams_deals(file_path, file_extension):
+                            _load_deals_upload(file_path, file_extension)
+                            processing_results[display_name] = "Uploaded successfully"
+                        else:
+                            processing_results[display_name] = "Uploaded successfully"
+
                     else:
-                        # Original files (deals, excluded, vip) - just mark as uploaded
+                        # Original files (excluded, vip) - just mark as uploaded
                         processing_results[display_name] = "Uploaded successfully"
                         
                 except Exception as e:
@@ -210,49 +289,287 @@ def generate_report():
     excluded_file = UploadedFiles.query.filter_by(user_id=current_user.id, file_type='excluded').first()
     vip_file = UploadedFiles.query.filter_by(user_id=current_user.id, file_type='vip').first()
 
-    try:
-        # Load data based on file extension
-        deals_ext = deals_file.filename.rsplit('.', 1)[1].lower()
-        if deals_ext == 'xlsx':
-            deals_df = pd.read_excel(deals_file.file_path)
-        else:
-            deals_df = pd.read_csv(deals_file.file_path)
-        
-        excluded_ext = excluded_file.filename.rsplit('.', 1)[1].lower()
-        if excluded_ext == 'xlsx':
-            excluded_df = pd.read_excel(excluded_file.file_path, header=None)
-        else:
-            excluded_df = pd.read_csv(excluded_file.file_path, header=None)
-        
-        vip_ext = vip_file.filename.rsplit('.', 1)[1].lower()
-        if vip_ext == 'xlsx':
-            vip_df = pd.read_excel(vip_file.file_path, header=None)
-        else:
-            vip_df = pd.read_csv(vip_file.file_path, header=None)
+    is_owner = current_user.has_role('Owner')
+    diagnostics = PipelineDiagnostics(
+        enabled=is_owner or current_app.config.get('PIPELINE_DIAGNOSTICS', False),
+        trace_memory=current_app.config.get('PIPELINE_TRACE_MEMORY', False)
+    )
 
-        results = run_report_processing(deals_df, excluded_df, vip_df)
+    report_cache = _report_cache()
 
-        # Convert result tables to HTML
-        report_tables = {
-            key: df.to_html(classes='table table-striped table-hover', index=False)
-            for key, df in results.items() if isinstance(df, pd.DataFrame)
-        }
+    try:
+        if current_app.config.get('DEAL_STORE'):
+            report = _store_report(excluded_file, vip_file, report_cache, diagnostics)
+        else:
+            report = _upload_report(deals_file, excluded_file, vip_file, report_cache, diagnostics, is_owner)
 
-        # Generate charts
-        report_charts = create_charts(results)
+        if diagnostics.enabled:
+            diagnostics.log()
+        if report['malformed_logins']:
+            flash(f"Skipped {report['malformed_logins']} deals with a missing or malformed Login.", 'warning')
 
         record_log('report_generated')
 
         return render_template('results.html', 
                              title='Deal Processing Results', 
-                             tables=report_tables, 
-                             charts=report_charts,
+                             tables=report['tables'], 
+                             charts=report['charts'],
+                             diagnostics=diagnostics.stages if is_owner else None,
                              report_type='original')
 
     except Exception as e:
         flash(f'An error occurred during report generation: {e}', 'danger')
         return redirect(url_for('main.dashboard'))
 
+def _store_report(excluded_file, vip_file, report_cache, diagnostics):
+    """Report over every deal in the current user's deal store."""
+    fixed_point = current_app.config.get('FIXED_POINT_MONEY', False)
+    # Stored deals keep the book and Chinese flag they were ingested with
+    check_stored_rules(current_user.id, _deal_rules())
+    # Deals are only ever added, so the stored count identifies the store's contents
+    with diagnostics.stage('cache lookup'):
+        cache_key = report_key(
+            [excluded_file.file_path, vip_file.file_path], kind='deal store', user_id=current_user.id,
+            deals=stored_deal_count(current_user.id),
+            granularities=current_app.config.get('REPORT_GRANULARITIES'), fixed_point=fixed_point
+        )
+        report = report_cache.get(cache_key)
+    if report is None:
+        with diagnostics.stage('store partials') as stage:
+            partials = store_partials(current_user.id, fixed_point=fixed_point)
+            stage['Rows Out'] = len(partials)
+        deal_report = {'Partials': partials, 'Malformed Logins': 0, 'Raw': None, 'Daily Partials': None}
+        if current_app.config.get('REPORT_GRANULARITIES'):
+            deal_report['Daily Partials'] = store_daily_partials(current_user.id, fixed_point)
+        report = _render_report(deal_report, _load_list(excluded_file), _load_list(vip_file),
+                                current_app.config.get('REPORT_GRANULARITIES'), diagnostics)
+        _cache_report(report_cache, cache_key, report)
+    return report
+
+def _upload_report(deals_file, excluded_file, vip_file, report_cache, diagnostics, is_owner):
+    """Report over the deals upload, reusing cached reports and deal partials where the inputs match."""
+    deals_ext = deals_file.filename.rsplit('.', 1)[1].lower()
+    stream_deals = _streams_deals(deals_file.file_path, deals_ext)
+    workers = current_app.config.get('DEALS_WORKERS') or 1
+    engine = current_app.config.get('DEALS_ENGINE', 'pandas')
+    # Streamed, sharded and DuckDB runs never hold the enriched deals, so they have no Raw tables
+    raw_tables = not stream_deals and workers <= 1 and engine == 'pandas'
+    rules = _deal_rules().version
+    granularities = current_app.config.get('REPORT_GRANULARITIES')
+    if granularities and not raw_tables:
+        # Time rollups come from the enriched deals too; the report is still worth showing without them
+        flash('Time rollups are skipped for this report: they need the pandas engine with one worker '
+              'on a deals file small enough not to be streamed.', 'warning')
+        granularities = None
+    fixed_point = current_app.config.get('FIXED_POINT_MONEY', False)
+
+    # Identical inputs render the stored tables instead of recomputing them
+    with diagnostics.stage('cache lookup'):
+        cache_key = report_key(
+            [deals_file.file_path, excluded_file.file_path, vip_file.file_path],
+            start_date=None, end_date=None, rules=rules, raw_tables=raw_tables,
+            granularities=granularities, fixed_point=fixed_point, engine=engine
+        )
+        report = report_cache.get(cache_key)
+
+    if report is None:
+        # The deals-only work (pre-exclusion partials and Raw tables) is stored per deals
+        # upload, so a new excluded or VIP list only reruns the per-login step
+        deals_key = report_key(
+            [deals_file.file_path], kind='deal partials',
+            start_date=None, end_date=None, rules=rules, raw_tables=raw_tables,
+            granularities=granularities, fixed_point=fixed_point, engine=engine
+        )
+        with diagnostics.stage('partials lookup'):
+            deal_report = report_cache.get(deals_key)
+        if deal_report is None:
+            deal_report = _build_deal_report(deals_file, deals_ext, stream_deals, granularities, diagnostics, is_owner)
+            _cache_report(report_cache, deals_key, deal_report)
+
+        report = _render_report(deal_report, _load_list(excluded_file), _load_list(vip_file), granularities, diagnostics)
+        _cache_report(report_cache, cache_key, report)
+    return report
+
+def _cache_report(report_cache, key, value):
+    try:
+        report_cache.put(key, value)
+    except OSError as e:
+        current_app.logger.warning('Could not cache report: %s', e)
+
+def _load_list(file_record):
+    """Read a headerless excluded or VIP login list."""
+    if file_record.filename.rsplit('.', 1)[1].lower() == 'xlsx':
+        return pd.read_excel(file_record.file_path, header=None)
+    return pd.read_csv(file_record.file_path, header=None)
+
+def _build_deal_report(deals_file, deals_ext, stream_deals, granularities, diagnostics, is_owner):
+    """The deals-only part of a report (processing.build_deal_report), with the Raw books rendered as HTML."""
+    config = current_app.config
+    engine = config.get('DEALS_ENGINE', 'pandas')
+    if stream_deals or (engine == 'duckdb' and deals_ext == 'csv'):
+        # Too large to load at once, or a CSV DuckDB reads itself: the engine reads the file
+        deals = deals_file.file_path
+    else:
+        with diagnostics.stage('load') as stage:
+            # Only the report's columns, with compact dtypes, from the columnar cache if present
+            deals, load_stats, _ = _load_deals_upload(deals_file.file_path, deals_ext)
+            stage['Rows Out'] = len(deals)
+        if is_owner:
+            flash(f"Loaded {load_stats['Rows']} deals in {load_stats['Compact MB']} MB "
+                  f"({load_stats['Saved MB']} MB less than a full load).", 'info')
+
+    deal_report = build_deal_report(
+        deals, rules=_deal_rules(), diagnostics=diagnostics,
+        workers=config.get('DEALS_WORKERS'), granularities=granularities,
+        fixed_point=config.get('FIXED_POINT_MONEY', False), engine=engine, stream=stream_deals,
+        memory_limit_mb=config['DEALS_MEMORY_LIMIT_MB'],
+        read_csv_kwargs={'usecols': csv_report_columns(deals_file.file_path)} if stream_deals else None
+    )
+    raw = deal_report.pop('Raw')
+    if raw is not None:
+        with diagnostics.stage('render raw tables'):
+            deal_report['Raw Tables'] = {
+                f"{name} Raw": raw.get(name, pd.DataFrame()).to_html(classes='table table-striped table-hover', index=False)
+                for name in BOOK_NAMES
+            }
+    return deal_report
+
+def _render_report(deal_report, excluded_df, vip_df, granularities, diagnostics):
+    """Apply the excluded and VIP lists to a deal report (see _build_deal_report) and render the report tables and charts."""
+    results = apply_report_lists(deal_report, list_logins(excluded_df), list_logins(vip_df),
+                                 granularities=granularities, diagnostics=diagnostics)
+
+    with diagnostics.stage('render tables'):
+        # Convert result tables to HTML; the long Rollups table is shown as one wide table per granularity
+        tables = {key: df for key, df in results.items() if isinstance(df, pd.DataFrame) and key != 'Rollups'}
+        if 'Rollups' in results:
+            tables.update(rollup_tables(results['Rollups']))
+        report_tables = {**deal_report.get('Raw Tables', {}), **{
+            key: df.to_html(classes='table table-striped table-hover', index=False)
+            for key, df in tables.items()
+        }}
+
+        # Generate charts
+        report_charts = create_charts(results)
+
+    return {
+        'tables': report_tables,
+        'charts': report_charts,
+        'malformed_logins': deal_report['Malformed Logins'],
+    }
+
+@bp.route('/api/report_windows', methods=['POST'])
+@login_required
+def report_windows():
+    """
+    API endpoint with the Final Calculations for many date windows at once.
+
+    Takes {"windows": [[start, end], ...]} with 'dd.mm.yyyy' dates and answers every
+    window from one set of per-day aggregates. Each window covers whole UTC days, so
+    times of day are widened to them; its DATE RANGE line shows the days summed.
+    """
+    windows = (request.get_json(silent=True) or {}).get('windows')
+    if not isinstance(windows, list) or not all(isinstance(w, (list, tuple)) and len(w) == 2 for w in windows):
+        return jsonify({'error': 'Expected {"windows": [[start, end], ...]}'}), 400
+
+    excluded_file = UploadedFiles.query.filter_by(user_id=current_user.id, file_type='excluded').first()
+    vip_file = UploadedFiles.query.filter_by(user_id=current_user.id, file_type='vip').first()
+    deals_file = UploadedFiles.query.filter_by(user_id=current_user.id, file_type='deals').first()
+    if not (deals_file and excluded_file and vip_file):
+        return jsonify({'error': 'Upload the deals, excluded and VIP files first'}), 400
+
+    try:
+        daily = _daily_partials(deals_file)
+        excluded_df, vip_df = _load_list(excluded_file), _load_list(vip_file)
+        tables = window_calculations(daily, windows, list_logins(excluded_df), list_logins(vip_df))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    record_log('report_windows', f"{len(windows)} windows")
+    return jsonify({'windows': [
+        {'start': start, 'end': end, 'final_calculations': table.to_dict(orient='records')}
+        for (start, end), table in zip(windows, tables)
+    ]})
+
+def _daily_partials(deals_file):
+    """Per-day partials of the current user's deals: the deal store's, or the deals upload's (cached per upload)."""
+    fixed_point = current_app.config.get('FIXED_POINT_MONEY', False)
+    if current_app.config.get('DEAL_STORE'):
+        check_stored_rules(current_user.id, _deal_rules())
+        return store_daily_partials(current_user.id, fixed_point)
+
+    deals_ext = deals_file.filename.rsplit('.', 1)[1].lower()
+    if _streams_deals(deals_file.file_path, deals_ext):
+        raise ValueError('This deals file is too large to load at once; enable DEAL_STORE to query date windows.')
+    rules = _deal_rules()
+    report_cache = _report_cache()
+    key = report_key([deals_file.file_path], kind='daily partials', rules=rules.version,
+                     fixed_point=fixed_point)
+    daily = report_cache.get(key)
+    if daily is None:
+        deals_df, _, _ = _load_deals_upload(deals_file.file_path, deals_ext)
+        daily = build_deal_report(deals_df, rules=rules, granularities=['daily'],
+                                  fixed_point=fixed_point)['Daily Partials']
+        _cache_report(report_cache, key, daily)
+    return daily
+
+@bp.route('/api/deal_cube', methods=['POST'])
+@login_required
+def deal_cube():
+    """
+    API endpoint with slices and roll-ups of the deals upload's book × login × symbol × day cube.
+
+    Takes {"filters": {dimension: value or [values]}, "group_by": [dimensions],
+    "order_by": sum, "limit": n}; see app.deal_cube.slice_cube. 'Day' filters take a
+    ['dd.mm.yyyy', 'dd.mm.yyyy'] pair, and 'Week' or 'Month' groups roll days up.
+    """
+    query = request.get_json(silent=True) or {}
+    filters, group_by = query.get('filters') or {}, query.get('group_by') or []
+    if not isinstance(filters, dict) or not isinstance(group_by, list):
+        return jsonify({'error': 'Expected {"filters": {...}, "group_by": [...], "order_by": ..., "limit": ...}'}), 400
+
+    deals_file = UploadedFiles.query.filter_by(user_id=current_user.id, file_type='deals').first()
+    if not deals_file:
+        return jsonify({'error': 'Upload a deals file first'}), 400
+
+    try:
+        cube = _deal_cube(deals_file.file_path, deals_file.filename.rsplit('.', 1)[1].lower())
+        rows = slice_cube(cube, filters, group_by, query.get('order_by'), query.get('limit'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    record_log('deal_cube', f"{len(rows)} rows")
+    # Deals without a deal time have no Day, Week or Month; they are null in the JSON
+    return jsonify({'rows': rows.astype(object).where(rows.notna(), None).to_dict(orient='records')})
+
+def _deal_cube(file_path, file_extension):
+    """The deal cube of a deals upload (app.deal_cube): built on the first query and kept in the report cache."""
+    rules = _deal_rules()
+    fixed_point = current_app.config.get('FIXED_POINT_MONEY', False)
+    report_cache = _report_cache()
+    key = report_key([file_path], kind='deal cube', rules=rules.version, fixed_point=fixed_point)
+    cube = report_cache.get(key)
+    if cube is None:
+        if _streams_deals(file_path, file_extension):
+            usecols = csv_report_columns(file_path)
+            chunk_rows = estimate_chunk_rows(file_path, current_app.config['DEALS_MEMORY_LIMIT_MB'], usecols=usecols)
+            cube = stream_deal_cube(file_path, chunk_rows, rules=rules, fixed_point=fixed_point,
+                                    usecols=usecols)
+        else:
+            deals_df, _, _ = _load_deals_upload(file_path, file_extension)
+            raw = build_deal_report(deals_df, rules=rules)['Raw']
+            cube = build_deal_cube(raw, rules, fixed_point)
+        _cache_report(report_cache, key, cube)
+    return cube
+
+@bp.route('/api/report_cache_stats')
+@login_required
+def report_cache_stats():
+    """API endpoint with the shared report cache's hit/miss counters (Owner only)"""
+    if not current_user.has_role('Owner'):
+        return jsonify({'error': 'forbidden'}), 403
+    return jsonify(_report_cache().stats())
+
 # Stage 2: New Report Generation Routes
 @bp.route('/report/stage2', methods=['GET', 'POST'])
 @login_required
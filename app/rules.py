@@ -0,0 +1,150 @@
+"""
+Compiled deal classification rules.
+
+A rule table is a list of Rule rows. A 'book' rule sends a deal to book `value`
+when its `column` equals ('exact') or starts with ('prefix') `pattern`; the first
+matching book rule in table order wins and unmatched deals go to the default book.
+A 'segment' rule tags a deal with segment `value`; a deal may be in any number of
+segments. Values are compared with surrounding whitespace stripped.
+
+compile_rules turns a table into per-column lookups once per rule-set version: an
+exact-match dict and, for prefixes, one dict per prefix length (a flattened trie).
+apply factorizes each rule column once, matches every distinct value once
+(remembered for later calls) and broadcasts the book and every segment back, so
+more segments cost no extra scan; classify and segment_mask read only the columns
+their rules need. load_rules reads a table from a CSV file (the DEAL_RULES_FILE
+setting).
+"""
+import csv
+import hashlib
+import json
+import os
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+import pandas as pd
+
+Rule = namedtuple("Rule", ["target", "column", "match", "pattern", "value"])
+RULE_TARGETS = ("book", "segment")
+RULE_MATCHES = ("exact", "prefix")
+
+def rules_version(rules) -> str:
+    """Content hash identifying a rule table."""
+    rows = [list(Rule(*rule)) for rule in rules]
+    return hashlib.sha256(json.dumps(rows, ensure_ascii=False).encode()).hexdigest()[:16]
+
+class RuleSet:
+    """A compiled rule table; build it with compile_rules so it is shared per version."""
+
+    def __init__(self, rules, books, default_book):
+        self.rules = tuple(Rule(*rule) for rule in rules)
+        self.version = rules_version(self.rules)
+        self.books = tuple(books)
+        self.default_book = self.books.index(default_book)
+        self.segments = tuple(dict.fromkeys(r.value for r in self.rules if r.target == "segment"))
+
+        self._exact, self._prefix = {}, {}
+        for position, rule in enumerate(self.rules):
+            if rule.target not in RULE_TARGETS or rule.match not in RULE_MATCHES:
+                raise ValueError(f"Invalid rule {tuple(rule)}: target must be one of {RULE_TARGETS}, match one of {RULE_MATCHES}.")
+            if rule.target == "book" and rule.value not in self.books:
+                raise ValueError(f"Invalid rule {tuple(rule)}: unknown book {rule.value!r}.")
+            pattern = str(rule.pattern).strip()
+            if rule.match == "exact":
+                table = self._exact.setdefault(rule.column, {})
+            else:
+                table = self._prefix.setdefault(rule.column, {}).setdefault(len(pattern), {})
+            table.setdefault(pattern, []).append(position)
+        self.columns = tuple(dict.fromkeys(rule.column for rule in self.rules))
+        self._book_columns = [c for c in self.columns if any(r.column == c and r.target == "book" for r in self.rules)]
+        self._segment_columns = {
+            segment: [c for c in self.columns if any(r.column == c and r.value == segment for r in self.rules if r.target == "segment")]
+            for segment in self.segments
+        }
+        # column -> {stripped value: (first book rule position, book code, segments)}
+        self._memo = {column: {} for column in self.columns}
+
+    def _match(self, column: str, text: str) -> tuple[int, int, frozenset]:
+        hits = list(self._exact.get(column, {}).get(text, ()))
+        for length, table in self._prefix.get(column, {}).items():
+            hits.extend(table.get(text[:length], ()) if len(text) >= length else ())
+        first, book, segments = len(self.rules), -1, set()
+        for position in sorted(hits):
+            rule = self.rules[position]
+            if rule.target == "segment":
+                segments.add(rule.value)
+            elif position < first:
+                first, book = position, self.books.index(rule.value)
+        return first, book, frozenset(segments)
+
+    def _lookup(self, sr: pd.Series, column: str) -> tuple[np.ndarray, list]:
+        """Factorize codes of `sr` and the (first book rule, book, segments) of each distinct value."""
+        codes, uniques = pd.factorize(sr, use_na_sentinel=False)
+        memo = self._memo[column]
+        matched = []
+        for value in uniques:
+            text = str(value).strip()
+            if text not in memo:
+                memo[text] = self._match(column, text)
+            matched.append(memo[text])
+        return codes, matched
+
+    def _evaluate(self, df: pd.DataFrame, columns, segments) -> tuple[np.ndarray, dict]:
+        """Book codes and `segments` masks over `columns` of `df`, one factorize per column."""
+        books, first = np.full(len(df), self.default_book, dtype=np.int8), None
+        masks = {segment: np.zeros(len(df), dtype=bool) for segment in segments}
+        for column in columns:
+            if column not in df.columns:
+                continue
+            codes, matched = self._lookup(df[column], column)
+            for segment, mask in masks.items():
+                mask |= np.array([segment in m[2] for m in matched], dtype=bool)[codes]
+            if column not in self._book_columns:
+                continue
+            positions = np.array([m[0] for m in matched], dtype=np.int64)[codes]
+            lookup = np.array([m[1] if m[1] >= 0 else self.default_book for m in matched], dtype=np.int8)[codes]
+            if first is None:
+                books, first = lookup, positions
+            else:
+                # A later column's rule only wins where it comes first in the table
+                earlier = positions < first
+                first[earlier], books[earlier] = positions[earlier], lookup[earlier]
+        return books, masks
+
+    def apply(self, df: pd.DataFrame) -> tuple[np.ndarray, dict]:
+        """Book code (position in `books`) and a mask per segment for every row of `df`, in one pass."""
+        return self._evaluate(df, self.columns, self.segments)
+
+    def classify(self, df: pd.DataFrame) -> np.ndarray:
+        """Book code (position in `books`) for every row of `df`; only book rule columns are read."""
+        return self._evaluate(df, self._book_columns, ())[0]
+
+    def segment_mask(self, df: pd.DataFrame, segment: str) -> np.ndarray:
+        """Boolean mask of the rows of `df` in `segment`; only the columns it has rules for are read."""
+        return self._evaluate(df, self._segment_columns.get(segment, ()), [segment])[1][segment]
+
+@lru_cache(maxsize=32)
+def _compiled(version: str, rules: tuple, books: tuple, default_book: str) -> RuleSet:
+    return RuleSet(rules, books, default_book)
+
+def compile_rules(rules, books, default_book) -> RuleSet:
+    """The RuleSet for a rule table, compiled once per rule-set version and then reused."""
+    rules = tuple(Rule(*rule) for rule in rules)
+    return _compiled(rules_version(rules), rules, tuple(books), default_book)
+
+def load_rules(path: str) -> tuple:
+    """
+    Rule table from a CSV file with a header row of Rule's fields
+    (target, column, match, pattern, value), in table order.
+    """
+    return _load_rules(path, os.path.getmtime(path))
+
+@lru_cache(maxsize=8)
+def _load_rules(path: str, mtime: float) -> tuple:
+    with open(path, newline="", encoding="utf-8") as fh:
+        reader = csv.DictReader(fh)
+        missing = set(Rule._fields) - set(reader.fieldnames or ())
+        if missing:
+            raise ValueError(f"Rule file {path} is missing the columns {sorted(missing)}.")
+        return tuple(Rule(**{field: row[field] for field in Rule._fields}) for row in reader)
@@ -0,0 +1,96 @@
+"""
+Multi-process deal reports.
+
+Deals are deduplicated once in the parent, since a deal id may repeat under
+different logins, and then hash-partitioned by Login across a ProcessPoolExecutor.
+Each worker parses, filters and sanitizes its shard into per-(Book, Login, Chinese)
+partials; the parent merges them (every login lives in one shard, so the merge is
+exact) and derives the report with report_from_partials.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from app.diagnostics import PipelineDiagnostics
+from app.processing import (
+    BOOK_AGGREGATES, BOOK_NAMES, classify_deals, convert_money_columns, detect_money_columns, first_deals,
+    normalize_logins, run_report_processing
+)
+from app.streaming import date_window, deal_partial_rows, merge_partials, rank_partials
+
+def shard_ids(logins: np.ndarray, shards: int) -> np.ndarray:
+    """Shard number for each int64 login (hashed, so sequential logins spread evenly)."""
+    return (pd.util.hash_array(np.asarray(logins, dtype=np.int64)) % shards).astype(np.intp)
+
+def _shard_partials(shard: pd.DataFrame, money_columns, window, datetime_col, fixed_point=False):
+    """Worker: partials for one shard of deduplicated deals carrying 'Book Code' and 'Chinese' columns."""
+    shard = convert_money_columns(shard, money_columns)
+    codes = shard["Book Code"].to_numpy()
+    chinese = shard["Chinese"].to_numpy()
+    frames = []
+    for code in range(len(BOOK_NAMES)):
+        in_book = codes == code
+        rows = deal_partial_rows(shard[in_book], code, window, datetime_col=datetime_col, fixed_point=fixed_point,
+                                 chinese=chinese[in_book])
+        if rows is not None:
+            frames.append(rows)
+    return merge_partials(frames) if frames else None
+
+def sharded_deal_partials(deals_df: pd.DataFrame, start_date: str = None, end_date: str = None, money_columns: list[str] = None,
+                          rules=None, workers: int = None, diagnostics: PipelineDiagnostics = None,
+                          datetime_col="Date & Time (UTC)", fixed_point: bool = False) -> tuple[pd.DataFrame, int]:
+    """
+    Pre-exclusion partials of build_report_partials computed in `workers` processes
+    (all cores by default). Returns (partials, malformed logins).
+    """
+    diag = diagnostics or PipelineDiagnostics(enabled=False)
+    workers = workers or os.cpu_count() or 1
+    window = date_window(start_date, end_date)
+    with diag:
+        deals_df, malformed_logins = normalize_logins(deals_df)
+
+        # Split and dedupe need every row of a book, so they run here on the id column only
+        with diag.stage("split", len(deals_df)) as stage:
+            if "Processing rule" not in deals_df:
+                raise ValueError("Missing 'Processing rule' column in the deals CSV.")
+            if money_columns is None:
+                money_columns = detect_money_columns(deals_df)
+            # Books and the Chinese segment come from one pass over the rule columns, so
+            # workers need neither the rules nor the columns they read
+            codes, chinese = classify_deals(deals_df, rules)
+            keep = np.zeros(len(deals_df), dtype=bool)
+            for code in range(len(BOOK_NAMES)):
+                positions = np.flatnonzero(codes == code)
+                keep[positions[first_deals(deals_df.iloc[positions, :1])]] = True
+
+            # Workers only receive the columns they aggregate; the index is the row order
+            columns = [c for c in ["Login", datetime_col, *BOOK_AGGREGATES.values()] if c in deals_df.columns]
+            deals = deals_df[columns].set_axis(pd.RangeIndex(len(deals_df))).assign(**{"Book Code": codes, "Chinese": chinese})[keep]
+            shard_of = shard_ids(deals["Login"].to_numpy(), workers)
+            stage["Rows Out"] = len(deals)
+
+        with diag.stage("shards", len(deals)) as stage:
+            shards = [deals[shard_of == i] for i in range(workers)]
+            args = (repeat(money_columns), repeat(window), repeat(datetime_col), repeat(fixed_point))
+            if workers == 1:
+                parts = list(map(_shard_partials, shards, *args))
+            else:
+                with ProcessPoolExecutor(max_workers=workers) as pool:
+                    parts = list(pool.map(_shard_partials, shards, *args))
+            parts = [p for p in parts if p is not None]
+            stage["Rows Out"] = sum(len(p) for p in parts)
+
+        with diag.stage("partials", stage["Rows Out"]) as stage:
+            partials = rank_partials(parts)
+            stage["Rows Out"] = len(partials)
+    return partials, malformed_logins
+
+def sharded_report_processing(deals_df: pd.DataFrame, excluded_df: pd.DataFrame, vip_df: pd.DataFrame, start_date: str = None, end_date: str = None,
+                              money_columns: list[str] = None, rules=None, workers: int = None,
+                              diagnostics: PipelineDiagnostics = None, fixed_point: bool = False):
+    """run_report_processing spread over `workers` processes (all cores by default)."""
+    return run_report_processing(deals_df, excluded_df, vip_df, start_date, end_date, money_columns, rules, diagnostics,
+                                 workers=workers or os.cpu_count() or 1, fixed_point=fixed_point)
@@ -0,0 +1,211 @@
+"""
+Out-of-core deal reports.
+
+The deals file is read in chunks; each chunk is deduplicated against the deal ids
+seen so far, filtered, and folded into running per-(Book, Login, Chinese) partial
+aggregates, so memory is bounded by the chunk size plus the distinct keys instead
+of the file size. The partials feed the same report_from_partials as the
+in-memory pipeline (run_report_processing with stream=True).
+"""
+import numpy as np
+import pandas as pd
+
+from app.diagnostics import PipelineDiagnostics
+from app.processing import (
+    BOOK_AGGREGATES, BOOK_NAMES, PARTIAL_COLUMNS, PARTIAL_KEYS, _as_utc, _sanitize_book,
+    chinese_deals, classify_deals, convert_money_columns, detect_money_columns,
+    _amounts, normalize_logins, parse_deal_times, run_report_processing
+)
+
+DEFAULT_MEMORY_LIMIT_MB = 512
+# A chunk is copied a few times on its way to the partials (money parsing, book split,
+# sanitizing), so it may only take a fraction of the memory ceiling
+CHUNK_WORKING_SET = 8
+MIN_CHUNK_ROWS = 1_000
+
+class DealIdSet:
+    """
+    Set of int64 deal keys stored as a few sorted runs that are merged as they grow,
+    so membership is a binary search per run and inserts never re-sort the whole set.
+    Costs 8 bytes per distinct deal.
+    """
+
+    def __init__(self):
+        self._runs = []
+
+    def __len__(self):
+        return sum(len(run) for run in self._runs)
+
+    @property
+    def nbytes(self):
+        return sum(run.nbytes for run in self._runs)
+
+    def add(self, keys: np.ndarray) -> np.ndarray:
+        """Add `keys` and return a mask of the ones not seen before (first occurrence wins)."""
+        keys = np.asarray(keys, dtype=np.int64)
+        fresh = np.zeros(len(keys), dtype=bool)
+        fresh[np.unique(keys, return_index=True)[1]] = True
+        for run in self._runs:
+            candidates = np.flatnonzero(fresh)
+            if candidates.size == 0:
+                break
+            pos = np.minimum(np.searchsorted(run, keys[candidates]), len(run) - 1)
+            fresh[candidates[run[pos] == keys[candidates]]] = False
+
+        added = np.sort(keys[fresh])
+        if added.size:
+            self._runs.append(added)
+            # Merge while the newest run is at least half the size of the one before it
+            while len(self._runs) > 1 and len(self._runs[-2]) <= 2 * len(self._runs[-1]):
+                newer, older = self._runs.pop(), self._runs.pop()
+                self._runs.append(np.sort(np.concatenate([older, newer]), kind="mergesort"))
+        return fresh
+
+def deal_keys(sr: pd.Series) -> np.ndarray:
+    """
+    Canonical int64 key per deal id: integral ids map to themselves, anything else to a
+    hash of its stripped text, so ids compare the same whichever dtype a chunk was read as.
+    """
+    if pd.api.types.is_integer_dtype(sr) and not sr.hasnans:
+        return sr.to_numpy(dtype=np.int64)
+    text = sr.map(str).str.strip()
+    numbers = pd.to_numeric(text, errors="coerce").to_numpy(dtype=float, na_value=np.nan)
+    integral = np.isfinite(numbers) & (numbers == np.floor(numbers)) & (np.abs(numbers) < 2**63)
+    keys = pd.util.hash_array(text.to_numpy(dtype=object)).view(np.int64)
+    keys[integral] = numbers[integral].astype(np.int64)
+    return keys
+
+def estimate_chunk_rows(source, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, sample_rows=10_000, **read_csv_kwargs) -> int:
+    """Rows per chunk that keep one chunk's working set within `memory_limit_mb`."""
+    sample = pd.read_csv(source, nrows=sample_rows, **read_csv_kwargs)
+    if hasattr(source, "seek"):
+        source.seek(0)
+    row_bytes = sample.memory_usage(deep=True).sum() / max(len(sample), 1)
+    return max(MIN_CHUNK_ROWS, int(memory_limit_mb * 2**20 / (CHUNK_WORKING_SET * row_bytes)))
+
+def merge_partials(frames: list) -> pd.DataFrame:
+    """Fold per-deal rows and earlier partials into one row per key, keeping the earliest deal's row."""
+    d = pd.concat(frames, ignore_index=True)
+    return d.groupby(PARTIAL_KEYS, sort=False, observed=True).agg(
+        **{col: (col, "sum") for col in BOOK_AGGREGATES},
+        **{"First Row": ("First Row", "min")},
+    ).reset_index()
+
+def deal_partial_rows(book: pd.DataFrame, code: int, window=None, rules=None, datetime_col="Date & Time (UTC)",
+                      fixed_point: bool = False, chinese: np.ndarray = None):
+    """
+    Per-deal partial rows for deduplicated deals of book BOOK_NAMES[code], or None when
+    no deal falls in `window` (int64 UTC ns bounds). The frame index becomes 'First Row'.
+    With `fixed_point` amounts are int64 ten-thousandths (see processing.to_fixed).
+    `chinese` is the Chinese segment mask of `book` when the caller already has it
+    (processing.classify_deals); otherwise it comes from `rules`.
+    """
+    if datetime_col in book.columns:
+        stamps = parse_deal_times(book[datetime_col]).array.asi8
+    else:
+        stamps = np.full(len(book), np.iinfo(np.int64).min)
+    if window is not None:
+        # NaT is the smallest int64, so it always falls outside the window
+        keep = (stamps >= window[0]) & (stamps <= window[1])
+        book, stamps = book[keep], stamps[keep]
+        chinese = chinese[keep] if chinese is not None else None
+    if book.empty:
+        return None
+    book = _sanitize_book(book)
+    if chinese is None:
+        chinese = chinese_deals(book, rules)
+    return pd.DataFrame({
+        "Book": pd.Categorical.from_codes(np.full(len(book), code), BOOK_NAMES),
+        "Login": book["Login"].to_numpy(dtype=np.int64),
+        "Chinese": chinese,
+        **{out: _amounts(book, col, fixed_point) for out, col in BOOK_AGGREGATES.items()},
+        "First Time": stamps,
+        "First Row": book.index.to_numpy(dtype=np.int64),
+    })
+
+def rank_partials(partials: list) -> pd.DataFrame:
+    """Merge partial tables and turn 'First Row' into the in-memory rank (book, file row)."""
+    if not partials:
+        return pd.DataFrame(columns=PARTIAL_COLUMNS)
+    partials = merge_partials(partials)
+    partials = partials.sort_values(["Book", "First Row"], kind="stable").reset_index(drop=True)
+    partials["First Row"] = np.arange(len(partials))
+    return partials[PARTIAL_COLUMNS]
+
+def date_window(start_date, end_date):
+    """int64 UTC ns bounds for a report window, or None when no window is set."""
+    if not (start_date and end_date):
+        return None
+    start_dt, end_dt = _as_utc(start_date), _as_utc(end_date)
+    if pd.isna(start_dt) or pd.isna(end_dt):
+        raise ValueError("Invalid start or end date format. Please use 'dd.mm.yyyy hh:mm:ss'")
+    return start_dt.value, end_dt.value
+
+def _chunk_deals(chunk, seen, window, money_columns, rules, datetime_col, fixed_point=False):
+    """Dedupe, filter and sanitize one chunk into per-deal partial rows.
+
+    The chunk index is the row number in the file, which becomes 'First Row'.
+    """
+    chunk = convert_money_columns(chunk, money_columns)
+    if "Processing rule" not in chunk:
+        raise ValueError("Missing 'Processing rule' column in the deals CSV.")
+    book_codes, chinese = classify_deals(chunk, rules)
+
+    frames = []
+    for code, name in enumerate(BOOK_NAMES):
+        positions = np.flatnonzero(book_codes == code)
+        if positions.size == 0:
+            continue
+        book = chunk.take(positions)
+        fresh = seen[name].add(deal_keys(book.iloc[:, 0]))
+        rows = deal_partial_rows(book[fresh], code, window, rules, datetime_col, fixed_point, chinese[positions][fresh])
+        if rows is not None:
+            frames.append(rows)
+    return frames
+
+def stream_deal_partials(source, start_date=None, end_date=None, money_columns: list[str] = None, rules=None,
+                         memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB, chunk_rows: int = None,
+                         datetime_col="Date & Time (UTC)", fixed_point: bool = False,
+                         **read_csv_kwargs) -> tuple[pd.DataFrame, int, int]:
+    """
+    Build the partial-aggregate table of build_deal_partials from a deals CSV read in chunks.
+
+    Deals are deduplicated per book on the first column before the date window is
+    applied, as enrich_and_dedupe and filter_by_date_range do in memory, and
+    'First Row' ranks keys by book and file position like the in-memory table. With `fixed_point` the sums are int64 ten-thousandths, so they do not depend
+    on the chunk size. Returns (partials, rows read, malformed logins).
+    """
+    window = date_window(start_date, end_date)
+    chunk_rows = chunk_rows or estimate_chunk_rows(source, memory_limit_mb, **read_csv_kwargs)
+    seen = {name: DealIdSet() for name in BOOK_NAMES}
+    partials, pending = [], []
+    rows_read = malformed = 0
+    with pd.read_csv(source, chunksize=chunk_rows, **read_csv_kwargs) as reader:
+        for chunk in reader:
+            rows_read += len(chunk)
+            if money_columns is None:
+                # Detected once, on the first chunk, like the in-memory sample
+                money_columns = detect_money_columns(chunk)
+            chunk, dropped = normalize_logins(chunk)
+            malformed += dropped
+            frames = _chunk_deals(chunk, seen, window, money_columns, rules, datetime_col, fixed_point)
+            if frames:
+                pending.append(merge_partials(frames))
+            # Fold pending chunks in once they are as large as the running table, so rewriting
+            # the table never costs more than the rows being folded into it
+            if pending and sum(map(len, pending)) >= max(sum(map(len, partials)), chunk_rows):
+                partials, pending = [merge_partials(partials + pending)], []
+
+    return rank_partials(partials + pending), rows_read, malformed
+
+def stream_report_processing(source, excluded_df: pd.DataFrame, vip_df: pd.DataFrame, start_date: str = None, end_date: str = None,
+                             money_columns: list[str] = None, rules=None, memory_limit_mb=DEFAULT_MEMORY_LIMIT_MB,
+                             chunk_rows: int = None, diagnostics: PipelineDiagnostics = None, fixed_point: bool = False,
+                             **read_csv_kwargs):
+    """
+    run_report_processing with stream=True, for a deals CSV that does not fit in memory.
+    Extra keyword arguments (e.g. usecols) go to pd.read_csv.
+    """
+    return run_report_processing(source, excluded_df, vip_df, start_date, end_date, money_columns, rules, diagnostics,
+                                 fixed_point=fixed_point, stream=True, memory_limit_mb=memory_limit_mb, chunk_rows=chunk_rows,
+                                 read_csv_kwargs=read_csv_kwargs)
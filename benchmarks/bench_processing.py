@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmarks for the deal pipeline in app/processing.py.
+
+Usage:
+    python benchmarks/bench_processing.py                      # every stage at 100k, 1M and 5M rows
+    python benchmarks/bench_processing.py --stage split --rows 100000 --legacy
+    python benchmarks/bench_processing.py --stage report --rows 1000000 --workers 1 2 4 8 16
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import processing, sharding  # noqa: E402
+from tests import legacy_processing  # noqa: E402
+from tests.synthetic_deals import make_deals  # noqa: E402
+
+
+def bench_money(deals):
+    return processing.convert_money_columns(deals)
+
+
+def bench_split(deals):
+    return processing.process_and_split(deals)
+
+
+def legacy_split(deals):
+    return legacy_processing.process_and_split(deals)
+
+
+def bench_enrich(deals):
+    return processing.enrich_and_dedupe(deals)
+
+
+def legacy_enrich(deals):
+    return legacy_processing.enrich_and_dedupe(deals)
+
+
+def bench_filter(deals, windows=100):
+    """Time `windows` daily range queries against one enriched book."""
+    book = processing.enrich_and_dedupe(deals)
+    days = pd.date_range("2025-01-01", periods=windows, freq="D", tz="UTC")
+    start = time.perf_counter()
+    for day in days:
+        processing.filter_by_date_range(book, day, day + pd.Timedelta(hours=23, minutes=59, seconds=59))
+    return time.perf_counter() - start
+
+
+def legacy_filter(deals, windows=100):
+    book = legacy_processing.enrich_and_dedupe(deals)
+    days = pd.date_range("2025-01-01", periods=windows, freq="D", tz="UTC")
+    start = time.perf_counter()
+    for day in days:
+        legacy_processing.filter_by_date_range(book, day, day + pd.Timedelta(hours=23, minutes=59, seconds=59))
+    return time.perf_counter() - start
+
+
+def _prepared_book(deals):
+    return processing.enrich_and_dedupe(processing.convert_money_columns(deals))
+
+
+def bench_aggregate(deals):
+    book = _prepared_book(deals)
+    excluded = set(book["Login"].drop_duplicates().iloc[::10].astype(str))
+    start = time.perf_counter()
+    processing.aggregate_book(book, excluded, "A Book")
+    return time.perf_counter() - start
+
+
+def legacy_aggregate(deals):
+    book = _prepared_book(deals)
+    excluded = set(book["Login"].drop_duplicates().iloc[::10].astype(str))
+    start = time.perf_counter()
+    legacy_processing.aggregate_book(book, excluded, "A Book")
+    return time.perf_counter() - start
+
+
+def _sanitized_books(deals):
+    books = {k: processing.enrich_and_dedupe(v) for k, v in processing.process_and_split(deals).items()}
+    for name, book in books.items():
+        for col in processing.BOOK_AGGREGATES.values():
+            book[col] = book[col].astype(float).fillna(0.0)
+    return books
+
+
+def bench_segments(deals):
+    books = _sanitized_books(deals)
+    start = time.perf_counter()
+    processing.generate_chinese_clients(books, set())
+    return time.perf_counter() - start
+
+
+def legacy_segments(deals):
+    books = _sanitized_books(deals)
+    start = time.perf_counter()
+    legacy_processing.generate_chinese_clients(books, set())
+    return time.perf_counter() - start
+
+
+def _rollup_inputs(deals):
+    books = _sanitized_books(deals)
+    logins = deals["Login"].drop_duplicates()
+    excluded, vip = set(logins.iloc[::10].astype(str)), set(logins.iloc[::7].astype(str))
+    results = {name: processing.aggregate_book(book, excluded, name) for name, book in books.items()}
+    return books, results, excluded, vip
+
+
+def bench_rollups(deals):
+    books, results, excluded, vip = _rollup_inputs(deals)
+    start = time.perf_counter()
+    processing.generate_client_summary(results)
+    processing.calculate_vip_volume(books, vip, excluded)
+    return time.perf_counter() - start
+
+
+def legacy_rollups(deals):
+    books, results, excluded, vip = _rollup_inputs(deals)
+    start = time.perf_counter()
+    legacy_processing.generate_client_summary(results)
+    legacy_processing.calculate_vip_volume(books, vip, excluded)
+    return time.perf_counter() - start
+
+
+def _lists(deals):
+    logins = deals["Login"].drop_duplicates()
+    return pd.DataFrame(logins.iloc[::10].to_numpy()), pd.DataFrame(logins.iloc[::7].to_numpy())
+
+
+def bench_report(deals):
+    return processing.run_report_processing(deals, *_lists(deals))
+
+
+def legacy_report(deals):
+    return legacy_processing.run_report_processing(deals, *_lists(deals))
+
+
+def bench_sharded(deals, workers):
+    return sharding.sharded_report_processing(deals, *_lists(deals), workers=workers)
+
+
+# stage name -> (vectorized implementation, row-by-row reference)
+STAGES = {
+    "money": (bench_money, None),
+    "split": (bench_split, legacy_split),
+    "enrich": (bench_enrich, legacy_enrich),
+    "filter": (bench_filter, legacy_filter),
+    "aggregate": (bench_aggregate, legacy_aggregate),
+    "segments": (bench_segments, legacy_segments),
+    "rollups": (bench_rollups, legacy_rollups),
+    "report": (bench_report, legacy_report),
+}
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    # Stages that need setup time themselves and return the measured seconds
+    return result if isinstance(result, float) else time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, nargs="+", default=[100_000, 1_000_000, 5_000_000])
+    parser.add_argument("--stage", choices=sorted(STAGES), nargs="+", default=list(STAGES))
+    parser.add_argument("--logins", type=int, default=None, help="distinct logins (default rows / 20)")
+    parser.add_argument("--legacy", action="store_true", help="also time the row-by-row reference (slow)")
+    parser.add_argument("--workers", type=int, nargs="+", help="time the sharded report with these worker counts")
+    args = parser.parse_args()
+
+    if args.workers:
+        print(f"{'workers':<12}{'rows':>12}{'seconds':>12}{'speedup':>10}")
+        for rows in args.rows:
+            deals = make_deals(rows, logins=args.logins)
+            baseline = None
+            for workers in args.workers:
+                elapsed = timed(bench_sharded, deals, workers)
+                baseline = baseline or elapsed
+                print(f"{workers:<12}{rows:>12,}{elapsed:>12.3f}{baseline / elapsed:>9.1f}x")
+        return
+
+    print(f"{'stage':<12}{'rows':>12}{'seconds':>12}{'legacy s':>12}{'speedup':>10}")
+    for rows in args.rows:
+        deals = make_deals(rows, logins=args.logins)
+        for stage in args.stage:
+            fast, slow = STAGES[stage]
+            elapsed = timed(fast, deals)
+            legacy = timed(slow, deals) if args.legacy and slow else None
+            speedup = f"{legacy / elapsed:.1f}x" if legacy else "-"
+            legacy_col = f"{legacy:.3f}" if legacy else "-"
+            print(f"{stage:<12}{rows:>12,}{elapsed:>12.3f}{legacy_col:>12}{speedup:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,6 +9,55 @@ class Config:
         'sqlite:///' + os.path.join(basedir, 'instance', 'app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     UPLOAD_FOLDER = os.path.join(basedir, 'instance', 'uploads')
+
+    # Deal report: Group prefixes that mark a Chinese client (comma separated in the environment)
+    CHINESE_GROUP_PREFIXES = tuple(
+        os.environ.get('CHINESE_GROUP_PREFIXES', 'real\\Chines,BBOOK\\Chines').split(',')
+    )
+    # Deal report: CSV rule table (target,column,match,pattern,value; see app.rules) that
+    # replaces the built-in book routing and Chinese prefixes. Rules may only read the
+    # report's columns (app.deal_loading.REPORT_COLUMNS).
+    DEAL_RULES_FILE = os.environ.get('DEAL_RULES_FILE')
+
+    # Deal report diagnostics: per-stage timings are always recorded for Owners; these turn
+    # them on for everyone (logged only) and add tracemalloc peak memory, which slows the run
+    PIPELINE_DIAGNOSTICS = os.environ.get('PIPELINE_DIAGNOSTICS', '').lower() in ('1', 'true', 'yes')
+    PIPELINE_TRACE_MEMORY = os.environ.get('PIPELINE_TRACE_MEMORY', '').lower() in ('1', 'true', 'yes')
+    LOG_FILE = os.environ.get('LOG_FILE') or os.path.join(basedir, 'app.log')
+
+    # Deal report: CSV deals files larger than the threshold are streamed in chunks sized
+    # to stay within the memory ceiling (seen deal ids add 8 bytes per deal on top)
+    DEALS_STREAM_THRESHOLD_MB = int(os.environ.get('DEALS_STREAM_THRESHOLD_MB', 256))
+    DEALS_MEMORY_LIMIT_MB = int(os.environ.get('DEALS_MEMORY_LIMIT_MB', 512))
+    # Deal report: typed Parquet copies of deals uploads, least recently used evicted past the cap
+    DEAL_CACHE_FOLDER = os.environ.get('DEAL_CACHE_FOLDER') or os.path.join(basedir, 'instance', 'deal_cache')
+    DEAL_CACHE_MAX_MB = int(os.environ.get('DEAL_CACHE_MAX_MB', 2048))
+    # Deal report: finished reports shared by all workers, least recently used evicted past the cap
+    REPORT_CACHE_FOLDER = os.environ.get('REPORT_CACHE_FOLDER') or os.path.join(basedir, 'instance', 'report_cache')
+    REPORT_CACHE_MAX_MB = int(os.environ.get('REPORT_CACHE_MAX_MB', 1024))
+    # Deal report: processes used to aggregate an in-memory deals file (1 keeps it in the request)
+    DEALS_WORKERS = int(os.environ.get('DEALS_WORKERS', 1))
+    # Deal report: keep every uploaded deal in the database (deduplicated by Deal id) and
+    # report over all of them instead of the last deals upload; reports then have no Raw tables
+    DEAL_STORE = os.environ.get('DEAL_STORE', '').lower() in ('1', 'true', 'yes')
+    # Deal store: memory-mapped per-user deal-id indexes that uploads are checked against
+    # (rebuilt from the database when missing or out of date)
+    DEAL_INDEX_FOLDER = os.environ.get('DEAL_INDEX_FOLDER') or os.path.join(basedir, 'instance', 'deal_index')
+    # Deal store: largest deals upload ingested, which happens inside the upload request;
+    # keep it within what the server's request timeout allows (larger exports are split,
+    # and deals in overlapping parts are stored once)
+    DEAL_STORE_MAX_UPLOAD_MB = int(os.environ.get('DEAL_STORE_MAX_UPLOAD_MB', 256))
+    # Deal report: periods the Final Calculations are also broken down by (comma separated,
+    # any of daily, weekly, monthly); off unless set, since the rollups need in-memory deals
+    REPORT_GRANULARITIES = tuple(
+        g for g in os.environ.get('REPORT_GRANULARITIES', '').split(',') if g
+    )
+    # Deal report: sum amounts as integer ten-thousandths of a USD, so totals are exact and
+    # do not change with deal order, streaming chunk size or worker count
+    FIXED_POINT_MONEY = os.environ.get('FIXED_POINT_MONEY', '').lower() in ('1', 'true', 'yes')
+    # Deal report: 'pandas', or 'duckdb' to aggregate the deals in DuckDB (needs the duckdb
+    # package; reports then have no Raw tables and always use fixed-point sums)
+    DEALS_ENGINE = os.environ.get('DEALS_ENGINE', 'pandas')
     
     # Session configuration
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
@@ -0,0 +1,37 @@
+"""Store deal amounts as fixed point
+
+Revision ID: 9b7d3c51a6f2
+Revises: 4c1f8e2a9d37
+Create Date: 2026-10-16 18:40:12.503117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9b7d3c51a6f2'
+down_revision = '4c1f8e2a9d37'
+branch_labels = None
+depends_on = None
+
+MONEY_COLUMNS = ['total_volume', 'trader_profit', 'swaps', 'commission', 'tp_profit', 'broker_profit']
+# Amounts become integer ten-thousandths of a USD (app.processing.MONEY_SCALE)
+MONEY_SCALE = 10000
+
+
+def upgrade():
+    for table in ['stored_deals', 'deal_daily_aggregates']:
+        # Scale while the columns are still Float, so the type change keeps every digit
+        op.execute(f"UPDATE {table} SET " + ", ".join(f"{c} = ROUND({c} * {MONEY_SCALE})" for c in MONEY_COLUMNS))
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in MONEY_COLUMNS:
+                batch_op.alter_column(column, existing_type=sa.Float(), type_=sa.BigInteger(), existing_nullable=True)
+
+
+def downgrade():
+    for table in ['stored_deals', 'deal_daily_aggregates']:
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            for column in MONEY_COLUMNS:
+                batch_op.alter_column(column, existing_type=sa.BigInteger(), type_=sa.Float(), existing_nullable=True)
+        op.execute(f"UPDATE {table} SET " + ", ".join(f"{c} = {c} / {float(MONEY_SCALE)}" for c in MONEY_COLUMNS))
@@ -0,0 +1,38 @@
+"""Synthetic MT5 deal exports shared by the parity tests and the benchmarks."""
+import numpy as np
+import pandas as pd
+
+RULES = ["Pipwise", "Retail B-book", "Multi", " Pipwise ", "Retail B-book ", None]
+GROUPS = ["real\\Chines-1", "BBOOK\\Chines", "real\\Retail", "BBOOK\\Retail", "Multi\\Mixed", "real\\VIP"]
+SYMBOLS = ["EURUSD", "GBPUSD", "USDJPY", "XAUUSD", "AUDUSD", "BTCUSD"]
+
+
+def _money(rng, n, scale):
+    amounts = np.round(rng.normal(0, scale, n), 2)
+    units = np.where(rng.random(n) < 0.2, " USC", " USD")
+    return pd.Series(amounts).map("{:.2f}".format).str.cat(units)
+
+
+def make_deals(n: int, seed: int = 0, logins: int = None, duplicate_ratio: float = 0.01) -> pd.DataFrame:
+    """Build an `n`-row deals frame laid out like the MT5 "All Pages Deals" export."""
+    rng = np.random.default_rng(seed)
+    logins = logins or max(n // 20, 1)
+    deal_ids = np.arange(1, n + 1)
+    dupes = rng.random(n) < duplicate_ratio
+    deal_ids[dupes] = rng.integers(1, n + 1, dupes.sum())
+    start = pd.Timestamp("2025-01-01")
+    times = start + pd.to_timedelta(rng.integers(0, 31 * 86400, n), unit="s")
+    return pd.DataFrame({
+        "Deal": deal_ids,
+        "Symbol": rng.choice(SYMBOLS, n),
+        "Login": rng.integers(100000, 100000 + logins, n),
+        "Notional volume in USD": np.round(rng.uniform(1000, 500000, n), 2),
+        "Trader profit": _money(rng, n, 200),
+        "Swaps": _money(rng, n, 10),
+        "Commission": _money(rng, n, 5),
+        "TP broker profit": _money(rng, n, 30),
+        "Total broker profit": _money(rng, n, 60),
+        "Processing rule": rng.choice(np.array(RULES, dtype=object), n),
+        "Group": rng.choice(GROUPS, n),
+        "Date & Time (UTC)": pd.Series(times).dt.strftime("%d.%m.%Y %H:%M:%S"),
+    })
@@ -0,0 +1,52 @@
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from app.deal_cache import cache_entry, cached_deals, evict, file_digest
+from app.deal_loading import load_deals
+from tests.synthetic_deals import make_deals
+
+class TestDealCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache_dir = os.path.join(self.folder, "cache")
+        self.deals_path = os.path.join(self.folder, "deals.csv")
+        make_deals(3000, seed=61).to_csv(self.deals_path, index=False)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_second_load_reads_cache(self):
+        first, stats, hit = cached_deals(self.deals_path, False, self.cache_dir, 100)
+        self.assertFalse(hit)
+        second, cached_stats, hit = cached_deals(self.deals_path, False, self.cache_dir, 100)
+        self.assertTrue(hit)
+        pd.testing.assert_frame_equal(second, first)
+        self.assertEqual(second.attrs, first.attrs)
+        self.assertEqual(cached_stats, stats)
+        pd.testing.assert_frame_equal(second, load_deals(self.deals_path)[0])
+
+    def test_corrupt_entry_falls_back_to_file(self):
+        cached_deals(self.deals_path, False, self.cache_dir, 100)
+        with open(cache_entry(self.cache_dir, file_digest(self.deals_path)), "wb") as fh:
+            fh.write(b"not parquet")
+        df, _, hit = cached_deals(self.deals_path, False, self.cache_dir, 100)
+        self.assertFalse(hit)
+        self.assertEqual(len(df), 3000)
+        self.assertTrue(cached_deals(self.deals_path, False, self.cache_dir, 100)[2])
+
+    def test_evicts_least_recently_used(self):
+        os.makedirs(self.cache_dir)
+        for i, name in enumerate(["old", "mid", "new"]):
+            path = cache_entry(self.cache_dir, name)
+            with open(path, "wb") as fh:
+                fh.write(b"x" * 1000)
+            os.utime(path, (i, i))
+        self.assertEqual(evict(self.cache_dir, 2000), 1000)
+        self.assertFalse(os.path.exists(cache_entry(self.cache_dir, "old")))
+        self.assertTrue(os.path.exists(cache_entry(self.cache_dir, "new")))
+
+if __name__ == '__main__':
+    unittest.main()
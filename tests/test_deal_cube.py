@@ -0,0 +1,61 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from app.deal_cube import CUBE_DIMENSIONS, build_deal_cube, slice_cube, stream_deal_cube
+from app.processing import BOOK_AGGREGATES, DEAL_TIME_COL, build_report_partials
+from tests.synthetic_deals import make_deals
+
+def sorted_cube(cube):
+    return cube.sort_values(CUBE_DIMENSIONS, key=lambda c: c.astype(str) if c.name == "Symbol" else c).reset_index(drop=True)
+
+class TestDealCube(unittest.TestCase):
+
+    def setUp(self):
+        self.deals = make_deals(8000, seed=71, duplicate_ratio=0.05)
+        self.deals.loc[::89, "Date & Time (UTC)"] = "not a date"
+        self.enriched, self.partials, _ = build_report_partials(self.deals, fixed_point=True)
+        self.cube = build_deal_cube(self.enriched, fixed_point=True)
+        self.books = pd.concat([df.assign(Book=name) for name, df in self.enriched.items()], ignore_index=True)
+
+    def test_cube_sums_match_partials_and_streaming(self):
+        keys = ["Book", "Login", "Chinese"]
+        by_key = self.cube.groupby(keys, observed=True)[list(BOOK_AGGREGATES)].sum()
+        expected = self.partials.set_index(keys)[list(BOOK_AGGREGATES)].reindex(by_key.index)
+        pd.testing.assert_frame_equal(by_key, expected, check_exact=True)
+
+        with tempfile.TemporaryDirectory() as folder:
+            path = os.path.join(folder, "deals.csv")
+            self.deals.to_csv(path, index=False)
+            streamed = stream_deal_cube(path, 1500, fixed_point=True)
+        pd.testing.assert_frame_equal(sorted_cube(streamed).astype({"Symbol": str}),
+                                      sorted_cube(self.cube).astype({"Symbol": str}), check_exact=True)
+
+    def test_slices_and_rollups(self):
+        rows = slice_cube(self.cube, {"Book": "B Book", "Symbol": ["EURUSD"], "Day": ["06.01.2025", "12.01.2025"]})
+        deals = self.books[(self.books["Book"] == "B Book") & (self.books["Symbol"] == "EURUSD")]
+        days = deals[DEAL_TIME_COL].dt.tz_localize(None).dt.normalize()
+        deals = deals[(days >= "2025-01-06") & (days <= "2025-01-12")]
+        self.assertEqual(len(rows), 1)
+        self.assertAlmostEqual(rows.loc[0, "Total Volume"], deals["Notional volume in USD"].sum(), places=4)
+
+        top = slice_cube(self.cube, {"Chinese": True}, ["Symbol"], order_by="Total Volume", limit=2)
+        self.assertEqual(len(top), 2)
+        self.assertGreaterEqual(top.loc[0, "Total Volume"], top.loc[1, "Total Volume"])
+
+        weekly = slice_cube(self.cube, group_by=["Week", "Book"])
+        self.assertTrue(weekly["Week"].dropna().isin(["2024-12-30", "2025-01-06", "2025-01-13", "2025-01-20", "2025-01-27"]).all())
+        # Deals without a deal time form their own null period, so the roll-up keeps every deal
+        self.assertTrue(weekly["Week"].isna().any())
+        total = slice_cube(self.cube)
+        self.assertAlmostEqual(weekly["Total Volume"].sum(), total.loc[0, "Total Volume"], places=2)
+        self.assertAlmostEqual(total.loc[0, "Total Volume"], self.books["Notional volume in USD"].sum(), places=2)
+
+    def test_rejects_invalid_slices(self):
+        for kwargs in [dict(filters={"Desk": "x"}), dict(filters={"Day": ["01.01.2025"]}), dict(filters={"Chinese": "yes"}),
+                       dict(group_by=["Day", "Week"]), dict(group_by=["Desk"]), dict(order_by="Net"), dict(limit=-1)]:
+            with self.assertRaises(ValueError, msg=str(kwargs)):
+                slice_cube(self.cube, **kwargs)
+
+if __name__ == '__main__':
+    unittest.main()
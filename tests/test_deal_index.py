@@ -0,0 +1,39 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from app.deal_index import DealIdIndex, deal_index_path
+
+class TestDealIdIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.TemporaryDirectory()
+        self.index = DealIdIndex(deal_index_path(self.folder.name, 7, "A Book"))
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def test_missing_file_is_empty(self):
+        self.assertEqual(len(self.index), 0)
+        self.assertFalse(self.index.contains([1, 2]).any())
+
+    def test_merged_batches_stay_sorted_and_unique(self):
+        rng = np.random.default_rng(3)
+        batches = [rng.integers(-10**12, 10**12, 2000) for _ in range(5)] + [np.arange(50)]
+        for batch in batches:
+            self.index.add(batch)
+        expected = np.unique(np.concatenate(batches))
+        np.testing.assert_array_equal(self.index.keys(), expected)
+        self.assertIsInstance(self.index.keys(), np.memmap)
+
+        probe = np.concatenate([expected[::7], rng.integers(10**13, 10**14, 500)])
+        np.testing.assert_array_equal(self.index.contains(probe), np.isin(probe, expected))
+
+    def test_rebuild_replaces_keys_without_leftovers(self):
+        self.index.add([5, 1, 3])
+        self.index.rebuild([9, 9, 2])
+        self.assertEqual(self.index.keys().tolist(), [2, 9])
+        self.assertEqual([n for n in os.listdir(self.folder.name) if n.endswith(".tmp")], [])
+
+if __name__ == '__main__':
+    unittest.main()
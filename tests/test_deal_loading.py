@@ -0,0 +1,54 @@
+import io
+import unittest
+import pandas as pd
+from app.deal_loading import SAMPLE_ROWS, load_deals, report_columns
+from app.processing import run_report_processing
+from tests.synthetic_deals import make_deals
+from tests.test_processing import assert_reports_match
+
+class TestCompactLoading(unittest.TestCase):
+
+    def setUp(self):
+        deals = make_deals(4000, seed=51)
+        deals.insert(3, "Comment", [f"note {i}" for i in range(len(deals))])
+        deals["Reason"] = "Client"
+        self.csv = deals.to_csv(index=False)
+
+    def test_projects_and_compacts_columns(self):
+        df, stats = load_deals(io.StringIO(self.csv))
+        self.assertNotIn("Reason", df.columns)
+        self.assertIn("Comment", df.columns)  # within the positional columns
+        self.assertEqual(df["Login"].dtype, "int64")
+        self.assertEqual(df["Deal"].dtype, "int64")
+        self.assertIsInstance(df["Group"].dtype, pd.CategoricalDtype)
+        self.assertEqual(df["Trader profit"].dtype, "float64")
+        self.assertEqual(stats["Columns Skipped"], 1)
+        self.assertGreater(stats["Saved MB"], 0)
+
+    def test_report_matches_default_load(self):
+        default = pd.read_csv(io.StringIO(self.csv))
+        compact, _ = load_deals(io.StringIO(self.csv))
+        logins = default["Login"].drop_duplicates()
+        lists = pd.DataFrame(logins.iloc[::6].to_numpy()), pd.DataFrame(logins.iloc[1::5].to_numpy())
+        result = run_report_processing(compact, *lists)
+        expected = run_report_processing(default, *lists)
+        assert_reports_match(self, result, expected)
+        self.assertEqual(result["A Book Raw"]["Profit Unit"].tolist(), expected["A Book Raw"]["Profit Unit"].tolist())
+
+    def test_text_amount_after_the_sample_still_loads(self):
+        deals = make_deals(SAMPLE_ROWS + 500, seed=52)
+        deals["Notional volume in USD"] = deals["Notional volume in USD"].astype(object)
+        deals.loc[SAMPLE_ROWS + 10, "Notional volume in USD"] = "1,250.00"
+        csv = deals.to_csv(index=False)
+        compact, _ = load_deals(io.StringIO(csv))
+        logins = deals["Login"].drop_duplicates()
+        lists = pd.DataFrame(logins.iloc[::6].to_numpy()), pd.DataFrame(logins.iloc[1::5].to_numpy())
+        assert_reports_match(self, run_report_processing(compact, *lists),
+                             run_report_processing(pd.read_csv(io.StringIO(csv)), *lists))
+
+    def test_report_columns_keep_positional_prefix(self):
+        header = ["Deal", "Time", "Symbol", "Login", "Type", "Entry", "Profit", "Date & Time (UTC)", "Reason", "Group"]
+        self.assertEqual(report_columns(header), header[:8] + ["Group"])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,121 @@
+import os
+import tempfile
+import unittest
+import pandas as pd
+from app import create_app, db
+from app.models import DealDailyAggregate, User
+from app.deal_index import DealIdIndex, deal_index_path
+from app.deal_store import check_stored_rules, ingest_deals, store_daily_partials, store_partials, stored_deal_count
+from app.processing import (
+    BOOK_NAMES, build_daily_partials, build_report_partials, deal_rules, is_fixed, period_calculations,
+    report_from_partials, rollup_partials
+)
+from config import TestConfig
+from tests.synthetic_deals import make_deals
+
+class TestDealStore(unittest.TestCase):
+
+    def setUp(self):
+        self.app = create_app(TestConfig)
+        self.context = self.app.app_context()
+        self.context.push()
+        db.create_all()
+        user = User(username='trader', email='trader@example.com')
+        db.session.add(user)
+        db.session.commit()
+        self.user_id = user.id
+        self.deals = make_deals(4000, seed=71)
+
+    def tearDown(self):
+        db.session.remove()
+        db.drop_all()
+        self.context.pop()
+
+    def assert_same_report(self, partials, expected):
+        got, want = report_from_partials(partials, [100001], [100002]), report_from_partials(expected, [100001], [100002])
+        for key, table in want.items():
+            if isinstance(table, pd.DataFrame):
+                pd.testing.assert_frame_equal(got[key], table, check_dtype=False, atol=1e-6)
+            else:
+                self.assertAlmostEqual(got[key], table)
+
+    def test_overlapping_uploads_store_each_deal_once(self):
+        first = ingest_deals(self.user_id, self.deals.iloc[:2500])
+        second = ingest_deals(self.user_id, self.deals.iloc[1500:])
+        self.assertGreater(second["Already Stored"], 0)
+        self.assertEqual(ingest_deals(self.user_id, self.deals)["New Deals"], 0)
+
+        _, expected, _ = build_report_partials(self.deals)
+        self.assertEqual(stored_deal_count(self.user_id), first["New Deals"] + second["New Deals"])
+        self.assertEqual(
+            db.session.query(db.func.sum(DealDailyAggregate.deals)).scalar(), stored_deal_count(self.user_id)
+        )
+        self.assert_same_report(store_partials(self.user_id), expected)
+
+    def test_day_range_reads_only_those_days(self):
+        ingest_deals(self.user_id, self.deals)
+        _, expected, _ = build_report_partials(self.deals, "05.01.2025 00:00:00", "12.01.2025 23:59:59")
+        partials = store_partials(self.user_id, pd.Timestamp("2025-01-05").date(), pd.Timestamp("2025-01-12").date())
+        self.assert_same_report(partials, expected)
+
+    def test_daily_rows_feed_time_rollups(self):
+        ingest_deals(self.user_id, self.deals.iloc[:3000])
+        ingest_deals(self.user_id, self.deals.iloc[2000:])
+        enriched, _, _ = build_report_partials(self.deals)
+        expected = period_calculations(rollup_partials(build_daily_partials(enriched)), [100001], [100002])
+        got = period_calculations(rollup_partials(store_daily_partials(self.user_id)), [100001], [100002])
+        pd.testing.assert_frame_equal(got, expected, atol=2e-4)
+
+    def test_deal_id_index_dedupes_like_the_table(self):
+        with tempfile.TemporaryDirectory() as index_dir:
+            ingest_deals(self.user_id, self.deals.iloc[:2500], index_dir=index_dir)
+            second = ingest_deals(self.user_id, self.deals.iloc[1500:], index_dir=index_dir)
+            self.assertGreater(second["Already Stored"], 0)
+            counts = {book: len(DealIdIndex(deal_index_path(index_dir, self.user_id, book))) for book in BOOK_NAMES}
+            self.assertEqual(sum(counts.values()), stored_deal_count(self.user_id))
+
+            # A lost or stale index is rebuilt from the table before it is trusted
+            os.remove(deal_index_path(index_dir, self.user_id, "A Book"))
+            DealIdIndex(deal_index_path(index_dir, self.user_id, "B Book")).rebuild([])
+            self.assertEqual(ingest_deals(self.user_id, self.deals, index_dir=index_dir)["New Deals"], 0)
+            self.assertEqual(len(DealIdIndex(deal_index_path(index_dir, self.user_id, "A Book"))), counts["A Book"])
+
+        _, expected, _ = build_report_partials(self.deals)
+        self.assert_same_report(store_partials(self.user_id), expected)
+
+    def test_fixed_point_reads_match_fixed_point_reports_exactly(self):
+        ingest_deals(self.user_id, self.deals.iloc[:3000])
+        ingest_deals(self.user_id, self.deals.iloc[2000:])
+        enriched, expected, _ = build_report_partials(self.deals, fixed_point=True)
+        partials = store_partials(self.user_id, fixed_point=True)
+        self.assertTrue(is_fixed(partials))
+        got, want = report_from_partials(partials, [100001], [100002]), report_from_partials(expected, [100001], [100002])
+        for key in ["A Book Result", "B Book Result", "Multi Book Result", "Final Calculations"]:
+            pd.testing.assert_frame_equal(got[key], want[key], check_exact=True, check_dtype=False, obj=key)
+        expected_daily = build_daily_partials(enriched, fixed_point=True)
+        pd.testing.assert_frame_equal(
+            period_calculations(rollup_partials(store_daily_partials(self.user_id, fixed_point=True)), [100001], [100002]),
+            period_calculations(rollup_partials(expected_daily), [100001], [100002]), check_exact=True
+        )
+
+    def test_deals_stay_under_the_rules_they_were_stored_with(self):
+        ingest_deals(self.user_id, self.deals.iloc[:2000])
+        check_stored_rules(self.user_id)
+        stored = stored_deal_count(self.user_id)
+        other_rules = deal_rules(["real\\"])
+        with self.assertRaises(ValueError):
+            check_stored_rules(self.user_id, other_rules)
+        with self.assertRaises(ValueError):
+            ingest_deals(self.user_id, self.deals.iloc[2000:], rules=other_rules)
+        self.assertEqual(stored_deal_count(self.user_id), stored)
+
+    def test_store_is_per_user(self):
+        other = User(username='other', email='other@example.com')
+        db.session.add(other)
+        db.session.commit()
+        ingest_deals(self.user_id, self.deals)
+        self.assertEqual(ingest_deals(other.id, self.deals.iloc[:100])["Already Stored"], 0)
+        self.assertTrue(store_partials(other.id)["Login"].isin(self.deals["Login"].iloc[:100]).all())
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import importlib.util
+import os
+import tempfile
+import unittest
+import pandas as pd
+from app.processing import run_report_processing
+from tests.synthetic_deals import make_deals
+from tests.test_processing import assert_reports_match
+
+EXACT_KEYS = ["A Book Result", "B Book Result", "Multi Book Result", "Chinese Clients", "Client Summary", "Final Calculations"]
+
+@unittest.skipIf(importlib.util.find_spec("duckdb") is None, "duckdb is not installed")
+class TestDuckDBEngine(unittest.TestCase):
+
+    def setUp(self):
+        deals = make_deals(6000, seed=51, duplicate_ratio=0.05)
+        deals["Login"] = deals["Login"].astype(object)
+        deals.loc[::97, "Login"] = "bad"
+        deals.loc[::53, "Date & Time (UTC)"] = "not a date"
+        self.folder = tempfile.TemporaryDirectory()
+        self.csv_path = os.path.join(self.folder.name, "deals.csv")
+        deals.to_csv(self.csv_path, index=False)
+        self.deals_df = pd.read_csv(self.csv_path)
+        logins = self.deals_df["Login"].drop_duplicates()
+        self.excluded_df = pd.DataFrame(logins.iloc[::6].to_numpy())
+        self.vip_df = pd.DataFrame(logins.iloc[1::5].to_numpy())
+
+    def tearDown(self):
+        self.folder.cleanup()
+
+    def assert_matches_pandas(self, source, *window):
+        expected = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, *window, fixed_point=True)
+        result = run_report_processing(source, self.excluded_df, self.vip_df, *window, engine="duckdb")
+        for key in EXACT_KEYS:
+            pd.testing.assert_frame_equal(result[key], expected[key], check_exact=True, check_dtype=False, obj=key)
+        self.assertEqual(result["VIP Volume"], expected["VIP Volume"])
+        self.assertEqual(result["Malformed Logins"], expected["Malformed Logins"])
+        self.assertNotIn("A Book Raw", result)
+        # Fixed-point sums also agree with the float pipeline to the reported precision
+        assert_reports_match(self, result, run_report_processing(self.deals_df, self.excluded_df, self.vip_df, *window))
+
+    def test_dataframe_matches_pandas_engine(self):
+        self.assert_matches_pandas(self.deals_df)
+
+    def test_csv_matches_pandas_engine_with_dates(self):
+        self.assert_matches_pandas(self.csv_path, "03.01.2025 00:00:00", "17.01.2025 12:00:00")
+
+    def test_parquet_matches_pandas_engine(self):
+        parquet_path = os.path.join(self.folder.name, "deals.parquet")
+        self.deals_df.to_parquet(parquet_path)
+        self.assert_matches_pandas(parquet_path)
+
+    def test_rejects_rollups_and_unknown_engines(self):
+        with self.assertRaises(ValueError):
+            run_report_processing(self.deals_df, self.excluded_df, self.vip_df, engine="duckdb", granularities=["daily"])
+        with self.assertRaises(ValueError):
+            run_report_processing(self.deals_df, self.excluded_df, self.vip_df, engine="polars")
+
+if __name__ == '__main__':
+    unittest.main()
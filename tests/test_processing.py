@@ -1,6 +1,18 @@
 import unittest
+import numpy as np
 import pandas as pd
-from app.processing import run_report_processing, aggregate_book, generate_final_calculations
+from app.processing import (
+    run_report_processing, aggregate_book, generate_final_calculations, process_and_split,
+    detect_money_columns, parse_money_series, enrich_and_dedupe, filter_by_date_range,
+    parse_deal_times, DEAL_TIME_COL, generate_chinese_clients, generate_client_summary,
+    calculate_vip_volume, normalize_logins, as_login_array, isin_logins, build_deal_partials,
+    BOOK_AGGREGATES, PARTIAL_COLUMNS, PARTIAL_KEYS, build_report_partials, report_from_partials,
+    period_labels, rollup_tables, ROLLUP_COLUMNS, run_window_reports, window_days, sanitize_numeric_series,
+    to_fixed, MONEY_SCALE, deal_rules
+)
+from app.diagnostics import PipelineDiagnostics
+from tests import legacy_processing
+from tests.synthetic_deals import make_deals
 
 class TestReportProcessing(unittest.TestCase):
 
@@ -60,6 +72,19 @@ class TestReportProcessing(unittest.TestCase):
         # (88000 + 40000 + 5000) / 200000 = 133000 / 200000 = 0.665
         self.assertAlmostEqual(float(final_calcs['Total Volume']), 0.665)
 
+    def test_chinese_and_retail_lots(self):
+        """The Chinese lot is the Chinese Clients' volume; the Retail lot is what the Chinese and VIP lots leave."""
+        lots = run_report_processing(self.deals_df, self.excluded_df, self.vip_df)['Final Calculations']
+        lots = lots[lots['Description'] == 'Volume (Lot)'].set_index('Source')['Value']
+
+        # Chinese groups: Login 1002 (Deals 102, 107, A Book) and 1004 (Deal 105, B Book)
+        #   - Vol: 20000 + 8000 + 25000 = 53000 -> 0.265 lot
+        self.assertAlmostEqual(float(lots['Chinese Clients']), 0.265)
+        # VIP: Login 1002, Vol 28000 -> 0.14 lot
+        self.assertAlmostEqual(float(lots['VIP Clients']), 0.14)
+        # Retail = A Book (with Multi Book) + B Book - Chinese - VIP = 0.465 + 0.2 - 0.265 - 0.14 = 0.26
+        self.assertAlmostEqual(float(lots['Retail Clients']), 0.26)
+
     def test_a_book_exclusion(self):
         """Test that excluded accounts in A-Book have their profits/commissions zeroed out."""
         a_book_data = {
@@ -110,5 +135,417 @@ class TestReportProcessing(unittest.TestCase):
         # There should be 2 rows: user 1003 and the Summary row
         self.assertEqual(len(agg_result), 2)
 
+class TestLoginKeys(unittest.TestCase):
+
+    def test_normalize_logins_counts_malformed_rows(self):
+        df = pd.DataFrame({"Login": [1001, " 1002 ", "12a", None, 1003.0, 1004.5], "Deal": range(6)})
+        normalized, malformed = normalize_logins(df)
+        self.assertEqual(malformed, 3)
+        self.assertEqual(normalized["Login"].dtype, np.int64)
+        self.assertEqual(normalized["Login"].tolist(), [1001, 1002, 1003])
+
+    def test_login_arrays_and_membership(self):
+        logins = as_login_array({"1005", " 1001", "bad", 1003})
+        self.assertEqual(logins.tolist(), [1001, 1003, 1005])
+        keys = np.array([1000, 1001, 1002, 1005, 9999], dtype=np.int64)
+        self.assertEqual(isin_logins(keys, logins).tolist(), [False, True, False, True, False])
+        self.assertFalse(isin_logins(keys, as_login_array([])).any())
+
+    def test_malformed_logins_are_reported_not_fatal(self):
+        deals = make_deals(200, seed=2)
+        deals["Login"] = deals["Login"].astype(object)
+        deals.loc[[3, 17, 40], "Login"] = ["n/a", None, "1e"]
+        results = run_report_processing(deals, pd.DataFrame(), pd.DataFrame())
+        self.assertEqual(results["Malformed Logins"], 3)
+        self.assertFalse(results["Final Calculations"].empty)
+
+class TestMoneyParsing(unittest.TestCase):
+
+    def test_parse_money_series_converts_usc(self):
+        sr = pd.Series(['105.00 USD', '-55.00 USC', ' 12 usc ', '1,250.50 USD', None, '7'])
+        parsed = parse_money_series(sr)
+        self.assertEqual(parsed.iloc[:4].tolist(), [105.0, -0.55, 0.12, 1250.5])
+        self.assertTrue(pd.isna(parsed.iloc[4]))
+        self.assertEqual(parsed.iloc[5], 7.0)
+
+    def test_mixed_column_still_converts_usc(self):
+        df = make_deals(50, seed=4)
+        df["Trader profit"] = ["1 234.50 USD"] + ["10.00 USC"] * 49
+        self.assertIn("Trader profit", detect_money_columns(df))
+        parsed = parse_money_series(df["Trader profit"])
+        self.assertEqual(parsed.iloc[0], 1234.5)
+        self.assertTrue((parsed.iloc[1:] == 0.1).all())
+
+    def test_only_money_columns_are_touched(self):
+        df = make_deals(50, seed=3)
+        df["Comment"] = "bonus 5 usc"
+        self.assertEqual(
+            detect_money_columns(df),
+            ["Trader profit", "Swaps", "Commission", "TP broker profit", "Total broker profit"]
+        )
+        books = process_and_split(df)
+        a_book = books["A Book"]
+        self.assertEqual(a_book["Trader profit"].dtype, float)
+        self.assertTrue((a_book["Comment"] == "bonus 5 usc").all())
+        self.assertEqual(a_book["Group"].tolist(), df.loc[a_book.index, "Group"].tolist())
+
+    def test_parsed_values_match_reference_conversion(self):
+        df = make_deals(500, seed=5)
+        books = process_and_split(df)
+        expected = legacy_processing.process_and_split(df)
+        for name in expected:
+            for col in ["Trader profit", "Commission", "Total broker profit"]:
+                reference = expected[name][col].str.replace(r"[^\d\.\-]", "", regex=True).astype(float)
+                self.assertEqual(books[name][col].round(4).tolist(), reference.round(4).tolist())
+
+class TestVectorizedParity(unittest.TestCase):
+    """Compare the vectorized pipeline stages against the row-by-row reference."""
+
+    def setUp(self):
+        self.deals_df = make_deals(2000, seed=7)
+
+    def test_split_matches_reference(self):
+        books = process_and_split(self.deals_df)
+        expected = legacy_processing.process_and_split(self.deals_df)
+        self.assertEqual(list(books), list(expected))
+        for name in expected:
+            self.assertEqual(books[name]["Deal"].tolist(), expected[name]["Deal"].tolist(), name)
+            self.assertEqual(books[name].index.tolist(), expected[name].index.tolist(), name)
+
+    def test_split_handles_missing_and_padded_rules(self):
+        df = pd.DataFrame({"Processing rule": [" Pipwise", None, "Retail B-book ", "pipwise"], "Deal": [1, 2, 3, 4]})
+        books = process_and_split(df)
+        self.assertEqual(books["A Book"]["Deal"].tolist(), [1])
+        self.assertEqual(books["B Book"]["Deal"].tolist(), [3])
+        self.assertEqual(books["Multi Book"]["Deal"].tolist(), [2, 4])
+
+    def assert_enrich_matches_reference(self, df):
+        result = enrich_and_dedupe(df)
+        expected = legacy_processing.enrich_and_dedupe(df)
+        # Enriched books keep the deal order and carry the parsed deal time
+        pd.testing.assert_series_equal(result[DEAL_TIME_COL], parse_deal_times(expected["Date & Time (UTC)"]),
+                                       check_names=False)
+        pd.testing.assert_frame_equal(result.drop(columns=[DEAL_TIME_COL]), expected, check_dtype=False)
+
+    def test_enrich_matches_reference_on_split_books(self):
+        for name, book in process_and_split(self.deals_df).items():
+            with self.subTest(book=name):
+                self.assert_enrich_matches_reference(book)
+
+    def test_enrich_matches_reference_with_text_profit_and_dates(self):
+        df = self.deals_df.iloc[:300].copy()
+        df["Commission"] = ["12.50 usd", "-3.1 USC", None, "n/a", "7"] * 60
+        order = ["Deal", "Symbol", "Login", "Notional volume in USD", "Trader profit", "Swaps",
+                 "Commission", "Date & Time (UTC)", "Group", "Processing rule"]
+        df = df[order]
+        df.iloc[::7, 7] = "31.02.2025 10:00:00"
+        self.assert_enrich_matches_reference(df)
+
+    def test_aggregate_book_matches_reference(self):
+        books = {k: enrich_and_dedupe(v) for k, v in process_and_split(self.deals_df).items()}
+        logins = self.deals_df["Login"].drop_duplicates()
+        excluded = set(logins.sample(frac=0.2, random_state=1).astype(str))
+        for name, book in books.items():
+            with self.subTest(book=name):
+                result = aggregate_book(book.copy(), excluded, name)
+                expected = legacy_processing.aggregate_book(book.copy(), excluded, name)
+                pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    def test_chinese_clients_match_reference(self):
+        books = {k: enrich_and_dedupe(v) for k, v in process_and_split(self.deals_df).items()}
+        excluded = set(self.deals_df["Login"].drop_duplicates().iloc[::4].astype(str))
+        for name, book in books.items():
+            aggregate_book(book, excluded, name)  # sanitizes the numeric columns in place, as in the pipeline
+        result = generate_chinese_clients(books, excluded)
+        expected = legacy_processing.generate_chinese_clients(books, excluded)
+        self.assertGreater(len(result), 1)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False)
+
+    def test_chinese_prefixes_are_configurable(self):
+        books = {k: enrich_and_dedupe(v) for k, v in process_and_split(self.deals_df).items()}
+        for name, book in books.items():
+            aggregate_book(book, set(), name)
+        retail = generate_chinese_clients(books, set(), rules=deal_rules(["real\\Retail"]))
+        retail_logins = set(self.deals_df.loc[self.deals_df["Group"] == "real\\Retail", "Login"].astype(str))
+        self.assertEqual(set(retail["Login"]) - {"Summary"}, retail_logins)
+
+    def test_client_summary_and_vip_volume_match_reference(self):
+        books = {k: enrich_and_dedupe(v) for k, v in process_and_split(self.deals_df).items()}
+        logins = self.deals_df["Login"].drop_duplicates()
+        excluded = set(logins.iloc[::5].astype(str))
+        vip = set(logins.iloc[::3].astype(str))
+        results = {name: aggregate_book(book, excluded, name) for name, book in books.items()}
+
+        pd.testing.assert_frame_equal(
+            generate_client_summary(results), legacy_processing.generate_client_summary(results), check_dtype=False
+        )
+        self.assertAlmostEqual(
+            calculate_vip_volume(books, vip, excluded),
+            legacy_processing.calculate_vip_volume(books, vip, excluded),
+            places=4
+        )
+
+# The reference's Chinese lot is always 0 (it looks the Chinese Clients up among the
+# books), and its Retail lot is derived from it; the report reads the Chinese Clients
+CORRECTED_LOTS = ["Chinese Clients", "Retail Clients"]
+
+def assert_matches_reference(test, result, expected):
+    """assert_reports_match against a legacy_processing result, apart from its CORRECTED_LOTS lines."""
+    def baseline_lines(report):
+        final = report["Final Calculations"]
+        corrected = (final["Description"] == "Volume (Lot)") & final["Source"].isin(CORRECTED_LOTS)
+        return {**report, "Final Calculations": final[~corrected].reset_index(drop=True)}
+    assert_reports_match(test, baseline_lines(result), baseline_lines(expected))
+
+def assert_reports_match(test, result, expected):
+    """Compare the aggregate tables of two run_report_processing results."""
+    for key in ["A Book Result", "B Book Result", "Multi Book Result", "Client Summary", "Final Calculations"]:
+        pd.testing.assert_frame_equal(result[key], expected[key], check_dtype=False, obj=key)
+    # Chinese Clients are listed in order of first appearance, which depends on row order
+    by_login = lambda df: df.sort_values("Login", kind="stable").reset_index(drop=True)
+    pd.testing.assert_frame_equal(by_login(result["Chinese Clients"]), by_login(expected["Chinese Clients"]), check_dtype=False)
+    test.assertAlmostEqual(result["VIP Volume"], expected["VIP Volume"], places=4)
+
+class TestFusedEngine(unittest.TestCase):
+
+    def setUp(self):
+        self.deals_df = make_deals(3000, seed=21)
+        logins = self.deals_df["Login"].drop_duplicates()
+        self.excluded_df = pd.DataFrame(logins.iloc[::6].to_numpy())
+        self.vip_df = pd.DataFrame(logins.iloc[1::5].astype(str).to_numpy())
+
+    def test_report_matches_reference_pipeline(self):
+        result = run_report_processing(self.deals_df, self.excluded_df, self.vip_df)
+        expected = legacy_processing.run_report_processing(self.deals_df, self.excluded_df, self.vip_df)
+        self.assertEqual([k for k in result if k != "Malformed Logins"], list(expected))
+        assert_matches_reference(self, result, expected)
+
+    def test_report_matches_reference_pipeline_with_dates(self):
+        window = ("03.01.2025 00:00:00", "17.01.2025 12:00:00")
+        result = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, *window)
+        expected = legacy_processing.run_report_processing(self.deals_df, self.excluded_df, self.vip_df, *window)
+        assert_matches_reference(self, result, expected)
+
+    def test_partials_are_small_and_unflagged(self):
+        books = {k: enrich_and_dedupe(v) for k, v in process_and_split(self.deals_df).items()}
+        partials = build_deal_partials({k: v.assign(**{c: v[c].astype(float) for c in BOOK_AGGREGATES.values()}) for k, v in books.items()})
+        self.assertEqual(list(partials.columns), PARTIAL_COLUMNS)
+        self.assertFalse(partials.duplicated(PARTIAL_KEYS).any())
+        self.assertLess(len(partials), len(self.deals_df))
+
+    def test_new_lists_recompute_from_stored_partials(self):
+        _, partials, _ = build_report_partials(self.deals_df)
+        logins = self.deals_df["Login"].drop_duplicates()
+        for excluded, vip in [(logins.iloc[::3], logins.iloc[::4]), (logins.iloc[:0], logins.iloc[2::9])]:
+            with self.subTest(excluded=len(excluded)):
+                result = report_from_partials(partials, excluded, vip)
+                expected = run_report_processing(self.deals_df, pd.DataFrame(excluded.to_numpy()), pd.DataFrame(vip.to_numpy()))
+                assert_reports_match(self, result, expected)
+
+    def test_diagnostics_record_every_stage(self):
+        plain = run_report_processing(self.deals_df, self.excluded_df, self.vip_df)
+        self.assertNotIn("Diagnostics", plain)
+        result = run_report_processing(self.deals_df, self.excluded_df, self.vip_df,
+                                       diagnostics=PipelineDiagnostics(trace_memory=True))
+        assert_reports_match(self, result, plain)
+        stages = result["Diagnostics"]
+        self.assertEqual([s["Stage"] for s in stages],
+                         ["USC conversion", "split", "enrich", "filter", "partials", "aggregate", "segments", "final calcs"])
+        self.assertEqual(stages[0]["Rows In"], len(self.deals_df))
+        self.assertTrue(all(s["Seconds"] >= 0 and s["Peak MB"] is not None for s in stages))
+
+class TestDateFiltering(unittest.TestCase):
+
+    def setUp(self):
+        self.deals_df = make_deals(3000, seed=11)
+        self.deals_df.loc[::50, "Date & Time (UTC)"] = "not a date"
+        self.book = enrich_and_dedupe(self.deals_df)
+
+    def test_parsed_times_match_mask_filter(self):
+        start, end = "05.01.2025 00:00:00", "12.01.2025 23:59:59"
+        parsed = filter_by_date_range(self.book, start, end)
+        masked = filter_by_date_range(self.book.drop(columns=[DEAL_TIME_COL]), start, end)
+        self.assertGreater(len(parsed), 0)
+        self.assertEqual(parsed["Deal"].tolist(), masked["Deal"].tolist())
+        self.assertTrue(parsed[DEAL_TIME_COL].notna().all())
+
+    def test_time_sorted_book_is_sliced_like_the_mask(self):
+        start, end = "05.01.2025 00:00:00", "12.01.2025 23:59:59"
+        self.assertFalse(self.book.attrs["deal_times_sorted"])
+        in_time_order = self.deals_df.iloc[np.argsort(parse_deal_times(self.deals_df["Date & Time (UTC)"]).array.asi8,
+                                                      kind="stable")]
+        by_time = enrich_and_dedupe(in_time_order)
+        self.assertTrue(by_time.attrs["deal_times_sorted"])
+        sliced = filter_by_date_range(by_time, start, end)
+        masked = filter_by_date_range(by_time.drop(columns=[DEAL_TIME_COL]), start, end)
+        self.assertGreater(len(sliced), 0)
+        self.assertEqual(sliced["Deal"].tolist(), masked["Deal"].tolist())
+        # The mark survives filtering, so a narrower window slices the window again
+        narrower = filter_by_date_range(sliced, "07.01.2025 00:00:00", "08.01.2025 23:59:59")
+        self.assertTrue(narrower.attrs["deal_times_sorted"])
+        self.assertEqual(narrower["Deal"].tolist(),
+                         filter_by_date_range(masked, "07.01.2025 00:00:00", "08.01.2025 23:59:59")["Deal"].tolist())
+        # Rows reordered after enrich fall back to the mask
+        by_login = filter_by_date_range(by_time.sort_values("Login", kind="stable"), start, end)
+        self.assertEqual(sorted(by_login["Deal"]), sorted(masked["Deal"]))
+
+    def test_resorted_book_and_other_columns_use_the_mask(self):
+        start, end = "05.01.2025 00:00:00", "12.01.2025 23:59:59"
+        expected = filter_by_date_range(self.book.drop(columns=[DEAL_TIME_COL]), start, end)
+        by_login = filter_by_date_range(self.book.sort_values("Login", kind="stable"), start, end)
+        self.assertEqual(sorted(by_login["Deal"]), sorted(expected["Deal"]))
+        # A different datetime column is filtered on its own values, not the parsed default one
+        shifted = self.book.assign(**{"Settled": "01.02.2025 00:00:00"})
+        self.assertTrue(filter_by_date_range(shifted, start, end, datetime_col="Settled").empty)
+
+    def test_accepts_timestamps_and_rejects_bad_dates(self):
+        by_string = filter_by_date_range(self.book, "10.01.2025 00:00:00", "10.01.2025 23:59:59")
+        by_timestamp = filter_by_date_range(self.book, pd.Timestamp("2025-01-10"), pd.Timestamp("2025-01-10 23:59:59"))
+        self.assertEqual(by_string["Deal"].tolist(), by_timestamp["Deal"].tolist())
+        with self.assertRaises(ValueError):
+            filter_by_date_range(self.book, "2025-01-10", "10.01.2025 23:59:59")
+
+class TestSanitizeNumeric(unittest.TestCase):
+
+    def test_tiers_and_counters(self):
+        counters = {}
+        sr = pd.Series(["12.5", " 7 ", "5.05 USD", "1,234.50", "", None, "n/a", "1.2.3"], index=range(10, 18))
+        result = sanitize_numeric_series(sr, counters)
+        self.assertEqual(result.tolist(), [12.5, 7.0, 5.05, 1234.5, 0.0, 0.0, 0.0, 0.0])
+        self.assertEqual(result.index.tolist(), sr.index.tolist())
+        self.assertEqual(counters, {"numeric": 0, "parsed": 2, "coerced": 2, "rejected": 1, "missing": 3})
+
+    def test_numeric_and_categorical_columns(self):
+        counters = {}
+        numbers = sanitize_numeric_series(pd.Series([1, None, 2.5e-05]), counters)
+        self.assertEqual(numbers.tolist(), [1.0, 0.0, 2.5e-05])
+        labels = sanitize_numeric_series(pd.Series(["3 USD", "4", None, "3 USD"], dtype="category"), counters)
+        self.assertEqual(labels.tolist(), [3.0, 4.0, 0.0, 3.0])
+        self.assertEqual(counters, {"numeric": 2, "parsed": 1, "coerced": 2, "rejected": 0, "missing": 2})
+
+    def test_missing_and_blank_values_share_a_bucket(self):
+        for dtype in [object, "category"]:
+            with self.subTest(dtype=dtype):
+                counters = {}
+                result = sanitize_numeric_series(pd.Series([None, "", "  ", "n/a", "-"], dtype=dtype), counters)
+                self.assertEqual(result.tolist(), [0.0] * 5)
+                self.assertEqual(counters, {"numeric": 0, "parsed": 0, "coerced": 0, "rejected": 1, "missing": 4})
+        counters = {}
+        sanitize_numeric_series(pd.Series([1.5, np.nan]), counters)
+        self.assertEqual(counters["missing"], 1)
+
+    def test_matches_legacy_cleanup_on_deal_columns(self):
+        def legacy(sr):
+            return sr.astype(str).str.replace(r"[^\d\.\-]", "", regex=True).replace(r"^\s*$", "0", regex=True).astype(float).fillna(0.0)
+        deals = make_deals(2000, seed=19)
+        for col in BOOK_AGGREGATES.values():
+            np.testing.assert_allclose(sanitize_numeric_series(deals[col]), legacy(deals[col]))
+
+class TestTimeRollups(unittest.TestCase):
+
+    def setUp(self):
+        self.deals_df = make_deals(6000, seed=13)
+        self.excluded_df, self.vip_df = pd.DataFrame([100001, 100004]), pd.DataFrame([100002, 100003])
+        self.result = run_report_processing(self.deals_df, self.excluded_df, self.vip_df,
+                                            granularities=["daily", "weekly", "monthly"])
+
+    def final_lines(self, final_calculations):
+        lines = final_calculations[final_calculations["Description"].isin(self.result["Rollups"]["Description"])]
+        return lines[lines["Source"] != "Source"].reset_index(drop=True)
+
+    def test_each_period_matches_a_report_over_its_window(self):
+        rollups = self.result["Rollups"]
+        self.assertEqual(list(rollups.columns), ROLLUP_COLUMNS)
+        for granularity, period, start, end in [("daily", "2025-01-07", "07.01.2025", "07.01.2025"),
+                                                ("weekly", "2025-01-06", "06.01.2025", "12.01.2025")]:
+            window = run_report_processing(self.deals_df, self.excluded_df, self.vip_df,
+                                           f"{start} 00:00:00", f"{end} 23:59:59")
+            expected = self.final_lines(window["Final Calculations"])
+            rows = rollups[(rollups["Granularity"] == granularity) & (rollups["Period"] == period)]
+            chinese_lot = rows.loc[(rows["Source"] == "Chinese Clients") & (rows["Description"] == "Volume (Lot)"), "Value"]
+            self.assertGreater(float(chinese_lot.iloc[0]), 0)
+            self.assertEqual(rows["Source"].tolist(), expected["Source"].tolist())
+            np.testing.assert_allclose(rows["Value"].to_numpy(dtype=float), expected["Value"].to_numpy(dtype=float), atol=2e-4)
+
+    def test_whole_month_matches_the_full_report(self):
+        rollups = self.result["Rollups"]
+        monthly = rollups[rollups["Granularity"] == "monthly"]
+        self.assertEqual(monthly["Period"].unique().tolist(), ["2025-01"])
+        expected = self.final_lines(self.result["Final Calculations"])
+        np.testing.assert_allclose(monthly["Value"].to_numpy(dtype=float), expected["Value"].to_numpy(dtype=float), atol=2e-4)
+
+    def test_wide_tables_and_period_labels(self):
+        tables = rollup_tables(self.result["Rollups"])
+        self.assertEqual(list(tables), ["Daily Rollup", "Weekly Rollup", "Monthly Rollup"])
+        self.assertEqual(list(tables["Weekly Rollup"].columns[:2]), ["Source", "Description"])
+        days = np.array(["2025-01-05", "2025-01-06", "2025-01-12", "2025-01-13"], dtype="datetime64[D]")
+        self.assertEqual(period_labels(days, "weekly").tolist(), ["2024-12-30", "2025-01-06", "2025-01-06", "2025-01-13"])
+        self.assertEqual(period_labels(days, "monthly").tolist(), ["2025-01"] * 4)
+        with self.assertRaises(ValueError):
+            period_labels(days, "hourly")
+
+class TestWindowReports(unittest.TestCase):
+
+    def test_each_window_matches_its_own_report(self):
+        deals_df = make_deals(5000, seed=17)
+        excluded_df, vip_df = pd.DataFrame([100001, 100004]), pd.DataFrame([100002])
+        windows = [("03.01.2025 00:00:00", "03.01.2025 23:59:59"), ("06.01.2025 00:00:00", "12.01.2025 23:59:59"),
+                   ("01.01.2025 00:00:00", "31.01.2025 23:59:59"), ("01.02.2025 00:00:00", "05.02.2025 23:59:59")]
+        for fixed_point in (False, True):
+            tables = run_window_reports(deals_df, excluded_df, vip_df, windows, fixed_point=fixed_point)
+            self.assertEqual(len(tables), len(windows))
+            for (start, end), table in zip(windows, tables):
+                with self.subTest(start=start, end=end, fixed_point=fixed_point):
+                    report = run_report_processing(deals_df, excluded_df, vip_df, start, end, fixed_point=fixed_point)
+                    pd.testing.assert_frame_equal(table, report["Final Calculations"])
+
+    def test_window_label_shows_the_days_summed(self):
+        deals_df = make_deals(500, seed=17)
+        table, = run_window_reports(deals_df, pd.DataFrame(), pd.DataFrame(), [("06.01.2025", "12.01.2025")])
+        self.assertEqual(table["Value"].iloc[0], "From 06.01.2025 00:00:00 to 12.01.2025 23:59:59")
+
+    def test_sub_day_bounds_match_a_report_over_their_days(self):
+        deals_df = make_deals(5000, seed=17)
+        excluded_df, vip_df = pd.DataFrame([100001, 100004]), pd.DataFrame([100002])
+        windows = {("03.01.2025 12:00:00", "03.01.2025 13:00:00"): ("03.01.2025 00:00:00", "03.01.2025 23:59:59"),
+                   ("02.01.2025 18:30:00", "03.01.2025 00:00:00"): ("02.01.2025 00:00:00", "03.01.2025 23:59:59")}
+        tables = run_window_reports(deals_df, excluded_df, vip_df, list(windows))
+        for table, (start, end) in zip(tables, windows.values()):
+            with self.subTest(start=start, end=end):
+                report = run_report_processing(deals_df, excluded_df, vip_df, start, end)
+                pd.testing.assert_frame_equal(table, report["Final Calculations"])
+
+    def test_window_days_validate_bounds(self):
+        with self.assertRaises(ValueError):
+            window_days("12.01.2025", "06.01.2025")
+        with self.assertRaises(ValueError):
+            window_days("2025-01-06", "12.01.2025")
+
+class TestFixedPointMoney(unittest.TestCase):
+
+    def setUp(self):
+        # No duplicate deal ids, so shuffling the rows keeps the same deals
+        self.deals_df = make_deals(4000, seed=23, duplicate_ratio=0)
+        self.excluded_df, self.vip_df = pd.DataFrame([100001, 100004]), pd.DataFrame([100002, 100003])
+
+    def test_to_fixed_rounds_to_ten_thousandths(self):
+        np.testing.assert_array_equal(to_fixed([0.285, -1.2345, 12.3456, 0.1 + 0.2]), [2850, -12345, 123456, 3000])
+        self.assertEqual(to_fixed([1.0])[0], MONEY_SCALE)
+
+    def test_matches_float_report(self):
+        result = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, fixed_point=True)
+        assert_reports_match(self, result, run_report_processing(self.deals_df, self.excluded_df, self.vip_df))
+
+    def test_totals_do_not_depend_on_deal_order(self):
+        shuffled = self.deals_df.sample(frac=1, random_state=3).reset_index(drop=True)
+        kwargs = dict(fixed_point=True, granularities=["daily", "monthly"])
+        result = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, **kwargs)
+        other = run_report_processing(shuffled, self.excluded_df, self.vip_df, **kwargs)
+        for key in ["Final Calculations", "Rollups"]:
+            pd.testing.assert_frame_equal(other[key], result[key], check_exact=True, obj=key)
+        for key in ["A Book Result", "B Book Result", "Multi Book Result"]:
+            pd.testing.assert_series_equal(other[key].iloc[-1], result[key].iloc[-1], check_exact=True, obj=key)
+        self.assertEqual(other["VIP Volume"], result["VIP Volume"])
+
 if __name__ == '__main__':
     unittest.main()
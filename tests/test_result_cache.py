@@ -0,0 +1,70 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from app.result_cache import ResultCache, report_key
+
+def _hit_cache(folder, key, rounds):
+    cache = ResultCache(folder, 10)
+    for _ in range(rounds):
+        if cache.get(key) is None:
+            cache.put(key, {"tables": {"A Book Result": "<table></table>"}})
+
+class TestResultCache(unittest.TestCase):
+
+    def setUp(self):
+        self.folder = tempfile.mkdtemp()
+        self.cache = ResultCache(os.path.join(self.folder, "reports"), 10)
+        self.inputs = []
+        for name, text in [("deals.csv", "Deal,Login\n1,100\n"), ("excluded.csv", "100\n"), ("vip.csv", "")]:
+            path = os.path.join(self.folder, name)
+            with open(path, "w") as fh:
+                fh.write(text)
+            self.inputs.append(path)
+
+    def tearDown(self):
+        shutil.rmtree(self.folder)
+
+    def test_round_trip_and_counters(self):
+        key = report_key(self.inputs, start_date=None)
+        self.assertIsNone(self.cache.get(key))
+        self.cache.put(key, {"Final Calculations": pd.DataFrame({"Metric": ["x"], "Value": [1.0]})})
+        value = self.cache.get(key)
+        pd.testing.assert_frame_equal(value["Final Calculations"], pd.DataFrame({"Metric": ["x"], "Value": [1.0]}))
+        stats = ResultCache(self.cache.folder, 10).stats()
+        self.assertEqual((stats["hits"], stats["misses"], stats["entries"]), (1, 1, 1))
+
+    def test_key_follows_content_and_parameters(self):
+        key = report_key(self.inputs, start_date=None)
+        self.assertNotEqual(key, report_key(self.inputs, start_date="01.01.2025 00:00:00"))
+        with open(self.inputs[1], "a") as fh:
+            fh.write("101\n")
+        os.utime(self.inputs[1], ns=(0, 1))  # a new mtime invalidates the remembered digest
+        self.assertNotEqual(key, report_key(self.inputs, start_date=None))
+
+    def test_evicts_least_recently_used_by_bytes(self):
+        cache = ResultCache(os.path.join(self.folder, "small"), 1)
+        blob = b"x" * 400_000
+        for name in ["a", "b", "c"]:
+            cache.put(name, blob)
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.get("c"), blob)
+        self.assertLessEqual(cache.stats()["bytes"], 2**20)
+
+    def test_shared_between_processes(self):
+        key = report_key(self.inputs)
+        ctx = multiprocessing.get_context("fork")
+        workers = [ctx.Process(target=_hit_cache, args=(self.cache.folder, key, 20)) for _ in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        stats = self.cache.stats()
+        self.assertEqual(stats["hits"] + stats["misses"], 80)
+        self.assertEqual(stats["entries"], 1)
+        self.assertGreaterEqual(stats["hits"], 76)
+
+if __name__ == '__main__':
+    unittest.main()
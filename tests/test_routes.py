@@ -0,0 +1,77 @@
+import importlib.util
+import io
+import os
+import shutil
+import tempfile
+import unittest
+import pandas as pd
+from app import create_app, db
+from app.deal_store import stored_deal_count
+from app.models import Role, User
+from config import TestConfig
+from tests.synthetic_deals import make_deals
+
+class TestReportRoute(unittest.TestCase):
+
+    def make_client(self, **settings):
+        folder = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, folder, ignore_errors=True)
+        config = type('Config', (TestConfig,), {
+            'UPLOAD_FOLDER': os.path.join(folder, 'uploads'), 'DEAL_CACHE_FOLDER': os.path.join(folder, 'deals'),
+            'REPORT_CACHE_FOLDER': os.path.join(folder, 'reports'), 'DEAL_INDEX_FOLDER': os.path.join(folder, 'index'),
+            **settings,
+        })
+        app = create_app(config)
+        context = app.app_context()
+        context.push()
+        self.addCleanup(context.pop)
+        db.create_all()
+        self.addCleanup(db.drop_all)
+        self.addCleanup(db.session.remove)
+        user = User(username='owner', email='owner@example.com', role=Role(name='Owner'))
+        user.set_password('secret')
+        db.session.add(user)
+        db.session.commit()
+
+        client = app.test_client()
+        client.post('/login', data={'username': 'owner', 'password': 'secret'})
+        deals = make_deals(2000, seed=81)
+        logins = pd.DataFrame(deals['Login'].drop_duplicates())
+        self.upload = client.post('/upload', content_type='multipart/form-data', follow_redirects=True, data={
+            'deals_csv': (io.BytesIO(deals.to_csv(index=False).encode()), 'deals.csv'),
+            'excluded_csv': (io.BytesIO(logins.iloc[::6].to_csv(index=False, header=False).encode()), 'excluded.csv'),
+            'vip_csv': (io.BytesIO(logins.iloc[1::5].to_csv(index=False, header=False).encode()), 'vip.csv'),
+        }).get_data(as_text=True)
+        self.user_id = user.id
+        return client
+
+    def test_rollups_are_skipped_where_the_engine_cannot_build_them(self):
+        runs = {'workers': {'DEALS_WORKERS': 2}, 'stream': {'DEALS_STREAM_THRESHOLD_MB': 0}}
+        if importlib.util.find_spec('duckdb') is not None:
+            runs['duckdb'] = {'DEALS_ENGINE': 'duckdb'}
+        for name, settings in runs.items():
+            with self.subTest(engine=name):
+                client = self.make_client(REPORT_GRANULARITIES=('daily', 'monthly'), **settings)
+                html = client.get('/report/generate', follow_redirects=True).get_data(as_text=True)
+                self.assertIn('Time rollups are skipped', html)
+                self.assertIn('Final Calculations', html)
+                self.assertNotIn('Monthly Rollup', html)
+
+    def test_rollups_render_on_the_pandas_engine(self):
+        client = self.make_client(REPORT_GRANULARITIES=('daily', 'monthly'))
+        html = client.get('/report/generate', follow_redirects=True).get_data(as_text=True)
+        self.assertIn('Monthly Rollup', html)
+        self.assertNotIn('Time rollups are skipped', html)
+
+    def test_deal_store_refuses_uploads_over_its_size_cap(self):
+        self.make_client(DEAL_STORE=True, DEAL_STORE_MAX_UPLOAD_MB=0)
+        self.assertIn('DEAL_STORE_MAX_UPLOAD_MB', self.upload)
+        self.assertEqual(stored_deal_count(self.user_id), 0)
+
+    def test_deal_store_ingests_uploads_under_its_size_cap(self):
+        self.make_client(DEAL_STORE=True)
+        self.assertIn('new deals', self.upload)
+        self.assertGreater(stored_deal_count(self.user_id), 0)
+
+if __name__ == '__main__':
+    unittest.main()
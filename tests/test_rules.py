@@ -0,0 +1,108 @@
+import io
+import os
+import tempfile
+import unittest
+import numpy as np
+import pandas as pd
+from app.processing import (
+    BOOK_NAMES, BOOK_RULES, CHINESE_GROUP_PREFIXES, DEAL_RULES, classify_books, deal_rules, is_chinese_group,
+    run_report_processing
+)
+from app.rules import Rule, compile_rules, load_rules
+from tests.synthetic_deals import make_deals
+from tests.test_processing import assert_reports_match
+
+RULES = [
+    Rule("book", "Processing rule", "exact", "Pipwise", "A Book"),
+    Rule("book", "Group", "prefix", "BBOOK\\", "B Book"),
+    Rule("book", "Processing rule", "prefix", "Pip", "Multi Book"),
+    Rule("segment", "Group", "prefix", "real\\Chines", "Chinese"),
+    Rule("segment", "Group", "exact", "BBOOK\\Chines", "Chinese"),
+    Rule("segment", "Group", "prefix", "real\\", "Real"),
+]
+
+class TestRuleSet(unittest.TestCase):
+
+    def test_default_rules_match_book_and_prefix_lookups(self):
+        deals = make_deals(5000, seed=61)
+        expected_books = [BOOK_NAMES.index(BOOK_RULES.get(str(rule).strip(), "Multi Book")) for rule in deals["Processing rule"]]
+        np.testing.assert_array_equal(classify_books(deals), expected_books)
+        groups = deals["Group"].map(str).str.strip()
+        np.testing.assert_array_equal(is_chinese_group(deals["Group"]), groups.str.startswith(CHINESE_GROUP_PREFIXES))
+        np.testing.assert_array_equal(is_chinese_group(deals["Group"], deal_rules(["real\\"])), groups.str.startswith("real\\"))
+
+    def test_first_book_rule_wins_and_segments_combine(self):
+        rules = compile_rules(RULES, BOOK_NAMES, "Multi Book")
+        deals = pd.DataFrame({
+            "Processing rule": [" Pipwise ", "Pipwise", "Pipsqueak", "Pipsqueak", None, "Retail"],
+            "Group": ["real\\Chines-1", "BBOOK\\Chines", "BBOOK\\Chines-2", "real\\Retail", "real\\Retail", None],
+        })
+        books = rules.classify(deals)
+        self.assertEqual([BOOK_NAMES[b] for b in books], ["A Book", "A Book", "B Book", "Multi Book", "Multi Book", "Multi Book"])
+        self.assertEqual(rules.segment_mask(deals, "Chinese").tolist(), [True, True, False, False, False, False])
+        self.assertEqual(rules.segment_mask(deals, "Real").tolist(), [True, False, False, True, True, False])
+        self.assertFalse(rules.segment_mask(deals, "Unknown").any())
+
+    def test_apply_matches_classify_and_segment_mask(self):
+        rules = compile_rules(RULES, BOOK_NAMES, "Multi Book")
+        deals = make_deals(5000, seed=62)
+        books, segments = rules.apply(deals)
+        np.testing.assert_array_equal(books, rules.classify(deals))
+        self.assertEqual(set(segments), {"Chinese", "Real"})
+        for segment, mask in segments.items():
+            np.testing.assert_array_equal(mask, rules.segment_mask(deals, segment))
+
+    def test_load_rules_reads_a_csv_table(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "rules.csv")
+            pd.DataFrame(RULES).to_csv(path, index=False)
+            self.assertEqual(load_rules(path), tuple(RULES))
+            self.assertIs(deal_rules(table=load_rules(path)), compile_rules(RULES, BOOK_NAMES, "Multi Book"))
+            pd.DataFrame(RULES).drop(columns="match").to_csv(path, index=False)
+            os.utime(path, (0, 0))
+            with self.assertRaises(ValueError):
+                load_rules(path)
+
+    def test_compiled_once_per_version(self):
+        rules = compile_rules(RULES, BOOK_NAMES, "Multi Book")
+        self.assertIs(compile_rules(list(RULES), BOOK_NAMES, "Multi Book"), rules)
+        changed = compile_rules(RULES[:-1], BOOK_NAMES, "Multi Book")
+        self.assertIsNot(changed, rules)
+        self.assertNotEqual(changed.version, rules.version)
+        self.assertIs(deal_rules(), deal_rules(None))
+        with self.assertRaises(ValueError):
+            compile_rules([Rule("book", "Group", "regex", "x", "A Book")], BOOK_NAMES, "Multi Book")
+        with self.assertRaises(ValueError):
+            compile_rules([Rule("book", "Group", "exact", "x", "C Book")], BOOK_NAMES, "Multi Book")
+
+if __name__ == '__main__':
+    unittest.main()
+
+class TestRuleTableReports(unittest.TestCase):
+
+    def setUp(self):
+        self.deals_df = make_deals(4000, seed=63)
+        logins = self.deals_df["Login"].drop_duplicates()
+        self.excluded_df = pd.DataFrame(logins.iloc[::6].to_numpy())
+        self.vip_df = pd.DataFrame(logins.iloc[1::5].to_numpy())
+        # BBOOK groups go to B Book whatever their processing rule, and VIP groups are the Chinese segment
+        self.rules = deal_rules(table=(
+            Rule("book", "Group", "prefix", "BBOOK\\", "B Book"),
+            *(rule for rule in DEAL_RULES if rule.target == "book"),
+            Rule("segment", "Group", "prefix", "real\\VIP", "Chinese"),
+        ))
+        rerouted = self.deals_df.copy()
+        rerouted.loc[rerouted["Group"].str.startswith("BBOOK\\"), "Processing rule"] = "Retail B-book"
+        self.expected = run_report_processing(rerouted, self.excluded_df, self.vip_df, rules=deal_rules(["real\\VIP"]))
+
+    def test_every_engine_follows_the_rule_table(self):
+        runs = {
+            "pandas": dict(),
+            "workers": dict(workers=2),
+            "stream": dict(stream=True, chunk_rows=700),
+        }
+        for name, kwargs in runs.items():
+            with self.subTest(engine=name):
+                deals = io.StringIO(self.deals_df.to_csv(index=False)) if kwargs.get("stream") else self.deals_df
+                result = run_report_processing(deals, self.excluded_df, self.vip_df, rules=self.rules, **kwargs)
+                assert_reports_match(self, result, self.expected)
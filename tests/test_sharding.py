@@ -0,0 +1,45 @@
+import unittest
+import numpy as np
+import pandas as pd
+from app.processing import run_report_processing
+from app.sharding import shard_ids, sharded_report_processing
+from tests.synthetic_deals import make_deals
+from tests.test_processing import assert_reports_match
+
+class TestShardedReport(unittest.TestCase):
+
+    def setUp(self):
+        self.deals_df = make_deals(6000, seed=41, duplicate_ratio=0.05)
+        # A deal id repeated under another login must still be dropped globally
+        self.deals_df.loc[10, ["Deal", "Processing rule"]] = [self.deals_df.loc[5, "Deal"], self.deals_df.loc[5, "Processing rule"]]
+        logins = self.deals_df["Login"].drop_duplicates()
+        self.excluded_df = pd.DataFrame(logins.iloc[::6].to_numpy())
+        self.vip_df = pd.DataFrame(logins.iloc[1::5].to_numpy())
+
+    def assert_shards_like_memory(self, workers, *window):
+        expected = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, *window)
+        result = sharded_report_processing(self.deals_df, self.excluded_df, self.vip_df, *window, workers=workers)
+        assert_reports_match(self, result, expected)
+        pd.testing.assert_frame_equal(result["Chinese Clients"], expected["Chinese Clients"], check_dtype=False)
+
+    def test_matches_in_memory_report(self):
+        for workers in [1, 3]:
+            with self.subTest(workers=workers):
+                self.assert_shards_like_memory(workers)
+
+    def test_matches_in_memory_report_with_dates(self):
+        self.assert_shards_like_memory(2, "03.01.2025 00:00:00", "17.01.2025 12:00:00")
+
+    def test_run_report_processing_delegates(self):
+        result = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, workers=2)
+        self.assertNotIn("A Book Raw", result)
+        assert_reports_match(self, result, run_report_processing(self.deals_df, self.excluded_df, self.vip_df))
+
+    def test_shards_keep_logins_together(self):
+        logins = self.deals_df["Login"].to_numpy()
+        shards = pd.Series(shard_ids(logins, 4)).groupby(logins).nunique()
+        self.assertTrue((shards == 1).all())
+        self.assertEqual(set(np.unique(shard_ids(logins, 4))), {0, 1, 2, 3})
+
+if __name__ == '__main__':
+    unittest.main()
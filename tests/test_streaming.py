@@ -0,0 +1,69 @@
+import io
+import unittest
+import numpy as np
+import pandas as pd
+from app.processing import run_report_processing
+from app.streaming import DealIdSet, deal_keys, stream_report_processing
+from tests.synthetic_deals import make_deals
+from tests.test_processing import assert_reports_match
+
+class TestDealIdSet(unittest.TestCase):
+
+    def test_marks_first_occurrences_across_batches(self):
+        seen = DealIdSet()
+        rng = np.random.default_rng(5)
+        batches = [rng.integers(0, 5000, 700) for _ in range(12)]
+        fresh = np.concatenate([seen.add(batch) for batch in batches])
+        expected = ~pd.Series(np.concatenate(batches)).duplicated().to_numpy()
+        np.testing.assert_array_equal(fresh, expected)
+        self.assertEqual(len(seen), int(expected.sum()))
+
+    def test_deal_keys_ignore_read_dtype(self):
+        as_numbers = deal_keys(pd.Series([1001, 1002]))
+        as_text = deal_keys(pd.Series([" 1001", "1002 "], dtype=object))
+        np.testing.assert_array_equal(as_numbers, as_text)
+        self.assertNotEqual(*deal_keys(pd.Series(["A-1", "A-2"])))
+
+class TestStreamingReport(unittest.TestCase):
+
+    def setUp(self):
+        deals = make_deals(6000, seed=31, duplicate_ratio=0.05)
+        deals["Login"] = deals["Login"].astype(object)
+        deals.loc[::97, "Login"] = "bad"
+        deals.loc[::53, "Date & Time (UTC)"] = "not a date"
+        self.csv = deals.to_csv(index=False)
+        self.deals_df = pd.read_csv(io.StringIO(self.csv))
+        logins = deals["Login"].drop_duplicates()
+        self.excluded_df = pd.DataFrame(logins.iloc[::6].to_numpy())
+        self.vip_df = pd.DataFrame(logins.iloc[1::5].to_numpy())
+
+    def assert_streams_like_memory(self, *window):
+        expected = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, *window)
+        result = stream_report_processing(io.StringIO(self.csv), self.excluded_df, self.vip_df, *window, chunk_rows=700)
+        assert_reports_match(self, result, expected)
+        # Duplicates span chunks, so first-appearance order must survive the merges
+        pd.testing.assert_frame_equal(result["Chinese Clients"], expected["Chinese Clients"], check_dtype=False)
+        self.assertEqual(result["Malformed Logins"], expected["Malformed Logins"])
+        self.assertNotIn("A Book Raw", result)
+
+    def test_matches_in_memory_report(self):
+        self.assert_streams_like_memory()
+
+    def test_matches_in_memory_report_with_dates(self):
+        self.assert_streams_like_memory("03.01.2025 00:00:00", "17.01.2025 12:00:00")
+
+    def test_fixed_point_totals_do_not_depend_on_chunk_size(self):
+        expected = run_report_processing(self.deals_df, self.excluded_df, self.vip_df, fixed_point=True)
+        for chunk_rows in [700, 2500]:
+            with self.subTest(chunk_rows=chunk_rows):
+                result = stream_report_processing(io.StringIO(self.csv), self.excluded_df, self.vip_df,
+                                                  chunk_rows=chunk_rows, fixed_point=True)
+                for key in ["Final Calculations", "Client Summary", "Chinese Clients"]:
+                    pd.testing.assert_frame_equal(result[key], expected[key], check_exact=True, check_dtype=False, obj=key)
+
+    def test_rollups_are_refused_rather_than_skipped(self):
+        with self.assertRaises(ValueError):
+            run_report_processing(io.StringIO(self.csv), self.excluded_df, self.vip_df, stream=True, granularities=["daily"])
+
+if __name__ == '__main__':
+    unittest.main()